@@ -1,6 +1,6 @@
 {
     'name': 'ManicTime',
-    'version': '18.0.0.1.1',
+    'version': '18.0.0.2.0',
     'category': 'Productivity',
     'summary': 'Integrate ManicTime with Odoo - Time tracking and activity sync',
     'sequence': 10,
@@ -19,7 +19,7 @@ Features:
     """,
     'author': 'Harrison Consulting',
     'website': 'https://www.example.com',
-    'depends': ['base', 'project', 'timesheet_grid', 'mail'],
+    'depends': ['base', 'bus', 'project', 'timesheet_grid', 'mail'],
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
@@ -31,6 +31,11 @@ Features:
         'views/manictime_user_timeline_views.xml',
         'views/manictime_activity_views.xml',
         'views/manictime_tag_views.xml',
+        'views/manictime_sync_policy_views.xml',
+        'views/manictime_sync_job_views.xml',
+        'views/manictime_sync_plan_views.xml',
+        'views/manictime_dead_letter_views.xml',
+        'views/manictime_server_capability_views.xml',
         'views/res_users_views.xml',
         'views/menus.xml',  # Menu definitions must be loaded after the views they reference
         'data/manictime_cron.xml',
@@ -0,0 +1 @@
+from . import manictime_sync
@@ -0,0 +1,126 @@
+"""Standalone ManicTime sync runner
+
+Runs the user syncs (or the historical backfill) in a pool of processes,
+outside the HTTP and cron workers, e.g. for a nightly catch-up on a separate
+machine against the same database:
+
+    odoo-bin manictime_sync -c odoo.conf -d mydb --processes 4
+    odoo-bin manictime_sync -c odoo.conf -d mydb --backfill --time-budget 3600
+
+Every process opens its own registry cursors and runs the same synchronous
+sync as _manictime_sync_data, so advisory locks keep it from syncing a user
+or timeline that a cron or another runner is syncing.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import odoo
+from odoo import api, fields, SUPERUSER_ID
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+from ..tools.http_pool import close_shared_sessions
+
+_logger = logging.getLogger(__name__)
+
+
+def _sync_user(task):
+    """Sync one user in a pool process
+
+    Args:
+        task: (database name, user id, backfill, wall clock end or None)
+
+    Returns:
+        tuple: (user id, success, message)
+    """
+    dbname, user_id, backfill, end_time = task
+    try:
+        registry = Registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            user = env['res.users'].browse(user_id)
+            user = user.with_user(user).with_context(from_cron=True)
+            # Users not started within the budget are left to the next run, for syncs and backfills alike
+            deadline = time.monotonic() + (end_time - time.time()) if end_time else None
+            if deadline is not None and deadline <= time.monotonic():
+                return user_id, True, "time budget used up, skipped"
+            if backfill:
+                count = user.with_context(manictime_deadline=deadline).manictime_backfill()
+                return user_id, True, f"{count} activities backfilled"
+
+            result = user._manictime_sync_data()
+            params = (result or {}).get('params', {})
+            return user_id, params.get('type') == 'success', params.get('message', '')
+    except Exception as e:
+        _logger.exception(f"ManicTime sync of user {user_id} failed")
+        return user_id, False, str(e)
+
+
+class ManicTimeSync(Command):
+    """Sync ManicTime users with a pool of processes, outside the HTTP and cron workers"""
+    name = 'manictime_sync'
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog=f'{Path(sys.argv[0]).name} {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="number of sync processes (default: number of CPUs)")
+        parser.add_argument('--user', dest='logins', action='append', default=[],
+                            help="only sync this login (repeatable)")
+        parser.add_argument('--backfill', action='store_true',
+                            help="continue the pending historical backfills instead of syncing")
+        parser.add_argument('--time-budget', type=int, default=0,
+                            help="seconds after which no new user sync or backfill slice is started, "
+                                 "a user sync in progress is finished (0: no limit)")
+        args, odoo_args = parser.parse_known_args(cmdargs)
+
+        config.parse_config(odoo_args, setup_logging=True)
+        dbnames = config['db_name']
+        if not dbnames:
+            sys.exit("No database given, use -d")
+        dbname = dbnames[0] if isinstance(dbnames, list) else dbnames.split(',')[0]
+
+        user_ids = self._get_user_ids(dbname, args.logins)
+        if not user_ids:
+            _logger.info("No ManicTime user with a valid token to sync")
+            return
+
+        # Pool processes open their own connections, none may be inherited
+        odoo.sql_db.close_all()
+        close_shared_sessions()
+
+        end_time = time.time() + args.time_budget if args.time_budget > 0 else None
+        tasks = [(dbname, user_id, args.backfill, end_time) for user_id in user_ids]
+        processes = max(1, min(args.processes, len(tasks)))
+        _logger.info(f"Syncing {len(tasks)} ManicTime users with {processes} processes")
+
+        failed = 0
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            for user_id, success, message in pool.imap_unordered(_sync_user, tasks):
+                if success:
+                    _logger.info(f"User {user_id}: {message}")
+                else:
+                    failed += 1
+                    _logger.error(f"User {user_id}: {message}")
+
+        _logger.info(f"ManicTime sync finished: {len(tasks) - failed} users synced, {failed} failed")
+        if failed:
+            sys.exit(1)
+
+    def _get_user_ids(self, dbname, logins):
+        """Users with a ManicTime configuration and a valid token"""
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            configs = env['manictime.config'].search([('token_expiry', '>', fields.Datetime.now())])
+            users = configs.mapped('user_id').filtered('manictime_enabled')
+            if logins:
+                users = users.filtered(lambda user: user.login in logins)
+            return users.ids
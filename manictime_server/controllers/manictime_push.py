@@ -0,0 +1,79 @@
+import logging
+
+from odoo import http
+from odoo.http import request
+from ..tools.activity_stream import iter_json_array, iter_ndjson
+
+_logger = logging.getLogger(__name__)
+
+# Bytes read from the request body at a time
+READ_SIZE = 64 * 1024
+
+
+class ManicTimePushController(http.Controller):
+
+    def _iter_body(self):
+        stream = request.httprequest.stream
+        return iter(lambda: stream.read(READ_SIZE), b'')
+
+    def _retry_later(self, error):
+        response = request.make_json_response({'error': error}, status=409)
+        response.headers['Retry-After'] = '30'
+        return response
+
+    def _get_timeline(self, timeline_key):
+        """Timeline of the pushing user with this key; managers may push to any user's timeline"""
+        Timeline = request.env['manictime.user.timeline'].sudo()
+        domain = [('timeline_key', '=', timeline_key)]
+        if not request.env.user.has_group('manictime_server.group_manictime_manager'):
+            domain.append(('user_id', '=', request.env.uid))
+        return Timeline.search(domain, limit=2)
+
+    @http.route('/manictime/push/<string:timeline_key>', type='http', auth='bearer',
+                methods=['POST'], csrf=False, save_session=False)
+    def push_activities(self, timeline_key, **kwargs):
+        """Ingest a batch of activities pushed for a timeline, e.g. by a relay or webhook
+
+        The body is NDJSON (Content-Type application/x-ndjson), one raw API
+        activity per line, or a JSON array of them (or an object holding the
+        array, like the activities endpoint returns). It is read and ingested
+        as a stream. The Idempotency-Key header is required: a batch pushed
+        again with the same key is answered with the first result (200), or
+        with 409 while the first push is not committed yet.
+
+        Authentication is an API key as bearer token.
+        """
+        idempotency_key = (request.httprequest.headers.get('Idempotency-Key') or '').strip()
+        if not idempotency_key:
+            return request.make_json_response({'error': 'Idempotency-Key header is required'}, status=400)
+
+        timeline = self._get_timeline(timeline_key)
+        if not timeline:
+            return request.make_json_response({'error': f'Unknown timeline {timeline_key}'}, status=404)
+        if len(timeline) > 1:
+            return request.make_json_response(
+                {'error': f'Timeline key {timeline_key} is ambiguous, push as the timeline owner'}, status=409)
+
+        # Held until the batch is committed, pushes and syncs of the timeline never overlap
+        if not request.env['manictime.sync.lock'].try_lock_timeline(timeline.id):
+            return self._retry_later('Timeline is being synced, retry later')
+
+        content_type = request.httprequest.mimetype or ''
+        if 'ndjson' in content_type or 'jsonl' in content_type:
+            raw_activities = iter_ndjson(self._iter_body())
+        else:
+            raw_activities = iter_json_array(self._iter_body())
+
+        try:
+            result = request.env['manictime.push.batch'].sudo().ingest_push(
+                timeline, idempotency_key, raw_activities)
+        except ValueError as e:
+            # Malformed body: nothing of the batch is kept, it can be pushed again
+            request.env.cr.rollback()
+            _logger.warning(f"Rejected activity push for timeline {timeline_key}: {str(e)}")
+            return request.make_json_response({'error': str(e)}, status=400)
+
+        if result is None:
+            # The same key was pushed concurrently, retrying is answered with its result
+            return self._retry_later(f'Batch {idempotency_key} is being pushed, retry later')
+        return request.make_json_response(result, status=200 if result['replayed'] else 201)
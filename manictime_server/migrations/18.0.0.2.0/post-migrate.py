@@ -0,0 +1,21 @@
+import logging
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Run the poll cron every 15 minutes, adaptive polling decides which users are due
+
+    The cron record is noupdate, so databases installed with the former
+    2-hour interval keep it on upgrade. Intervals changed by an administrator
+    are left alone.
+    """
+    if not version:
+        return
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cron = env.ref('manictime_server.ir_cron_sync_manictime_user_data', raise_if_not_found=False)
+    if cron and (cron.interval_number, cron.interval_type) == (2, 'hours'):
+        cron.write({'interval_number': 15, 'interval_type': 'minutes'})
+        _logger.info("ManicTime poll cron now runs every 15 minutes")
@@ -4,6 +4,16 @@ from . import manictime_environment
 from . import manictime_link
 from . import manictime_user_timeline
 from . import manictime_activity
+from . import manictime_activity_ingest
+from . import manictime_dead_letter
+from . import manictime_push_batch
+from . import manictime_http_validator
+from . import manictime_server_capability
+from . import manictime_sync_policy
+from . import manictime_sync_lock
+from . import manictime_sync_job
+from . import manictime_sync_planner
+from . import manictime_sync_plan
 from . import manictime_tag
 from . import res_config_settings
 from . import res_users
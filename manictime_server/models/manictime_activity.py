@@ -30,6 +30,8 @@ class ManicTimeActivity(models.Model):
                             help='Application used during this activity')
     notes = fields.Text(string='Notes', 
                        help='Additional notes for this activity')
+    content_hash = fields.Char(string='Content Hash', readonly=True,
+                               help='Hash of the synced content, used to skip unchanged activities during sync')
 
     _sql_constraints = [
         ('user_timeline_entity_uniq', 'unique(user_id, timeline_id, entity_id)', 
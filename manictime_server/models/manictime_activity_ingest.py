@@ -0,0 +1,436 @@
+from odoo import models, api
+import hashlib
+import io
+import logging
+from datetime import datetime
+from ..tools.activity_stream import record_to_payload
+from ..tools.timestamps import INVALID, api_window, to_naive_utc_batch
+
+_logger = logging.getLogger(__name__)
+
+# Columns loaded into the staging table, in COPY order
+STAGING_COLUMNS = ('seq', 'entity_id', 'name', 'start_time', 'end_time', 'application', 'tags', 'notes',
+                   'content_hash')
+
+
+def content_hash(row):
+    """Compute the compact content hash of a prepared activity row
+
+    Covers name, start/end times, application, tags and notes (everything but
+    the entity id), so equal hashes mean a write would be a no-op.
+    """
+    payload = '\x1f'.join(
+        value.isoformat() if isinstance(value, datetime) else str(value or '')
+        for value in row[1:]
+    )
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _copy_value(value):
+    """Format a Python value for PostgreSQL COPY text format"""
+    if value is None or value is False:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class ManicTimeActivityIngest(models.AbstractModel):
+    _name = 'manictime.activity.ingest'
+    _description = 'ManicTime Activity Ingest Engine'
+
+    @api.model
+    def _prepare_row(self, activity, start_time, end_time):
+        """Turn an Activity object into a staging row tuple (without seq)
+
+        Args:
+            activity: Activity object
+            start_time, end_time: its start and end converted to naive UTC
+                                  (INVALID when they could not be parsed)
+
+        Returns:
+            tuple: (entity_id, name, start_time, end_time, application, tags, notes)
+                   or None if the activity cannot be stored
+        """
+        entity_id = getattr(activity, 'id', None)
+        if not entity_id:
+            _logger.warning(f"Activity missing ID, skipping. Activity attrs: {dir(activity)}")
+            return None
+
+        if not hasattr(activity, 'start') or not hasattr(activity, 'end'):
+            _logger.warning(f"Activity {entity_id} missing start/end time, skipping")
+            return None
+
+        # Process tags into a clean, comma-separated string
+        activity_tags = []
+        raw_tags = getattr(activity, 'tags', None)
+        if isinstance(raw_tags, list):
+            activity_tags = raw_tags
+        elif isinstance(raw_tags, str):
+            activity_tags = [tag.strip() for tag in raw_tags.split(',') if tag.strip()]
+        elif raw_tags:
+            activity_tags = [str(raw_tags)]
+        tags_string = ','.join(tag for tag in activity_tags if tag)
+
+        # Add application to title if it's not already included
+        title = getattr(activity, 'title', '') or 'Untitled'
+        application = getattr(activity, 'application', '') or ''
+        if application and application not in title:
+            title = f"{application} - {title}"
+
+        if start_time is INVALID or end_time is INVALID:
+            _logger.warning(f"Activity {entity_id} has unparseable start/end time, skipping: "
+                            f"{activity.start!r} - {activity.end!r}")
+            return None
+
+        return (
+            str(entity_id),
+            title,
+            start_time,
+            end_time,
+            application,
+            tags_string,
+            getattr(activity, 'notes', '') or '',
+        )
+
+    @api.model
+    def _create_staging_table(self):
+        """Create (or empty) the per-transaction staging table"""
+        self.env.cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS manictime_activity_staging (
+                seq integer NOT NULL,
+                entity_id varchar NOT NULL,
+                name varchar,
+                start_time timestamp,
+                end_time timestamp,
+                application varchar,
+                tags varchar,
+                notes text,
+                content_hash varchar
+            ) ON COMMIT DROP
+        """)
+        self.env.cr.execute("TRUNCATE manictime_activity_staging")
+
+    @api.model
+    def _copy_rows(self, rows):
+        """Bulk load staging rows with COPY"""
+        buffer = io.StringIO()
+        for seq, row in enumerate(rows):
+            buffer.write('\t'.join(_copy_value(value) for value in (seq,) + row + (content_hash(row),)))
+            buffer.write('\n')
+        buffer.seek(0)
+        self.env.cr.copy_expert(
+            f"COPY manictime_activity_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+            buffer,
+        )
+
+    @api.model
+    def _discard_unchanged(self, user_id, timeline_id):
+        """Drop staged rows whose content hash matches the stored activity
+
+        Those rows would be no-op writes, skipping them avoids the tuple
+        rewrite, WAL and write_date churn of an update.
+
+        Returns:
+            int: number of discarded staging rows
+        """
+        self.env.cr.execute("""
+            DELETE FROM manictime_activity_staging s
+             USING manictime_activity a
+             WHERE a.user_id = %s
+               AND a.timeline_id = %s
+               AND a.entity_id = s.entity_id
+               AND a.content_hash = s.content_hash
+        """, (user_id, timeline_id))
+        return self.env.cr.rowcount
+
+    @api.model
+    def _merge_staging(self, user_id, timeline_id):
+        """Merge the staging table into manictime_activity
+
+        Rows are upserted on the user_timeline_entity_uniq key. Existing rows
+        are only rewritten when their content hash differs.
+
+        Returns:
+            list: one boolean per inserted or updated row, True if inserted
+        """
+        self.env.cr.execute("""
+            INSERT INTO manictime_activity (
+                user_id, timeline_id, entity_id, name, start_time, end_time, duration,
+                application, tags, notes, content_hash, create_uid, create_date, write_uid, write_date
+            )
+            SELECT DISTINCT ON (s.entity_id)
+                   %(user_id)s, %(timeline_id)s, s.entity_id, COALESCE(s.name, 'Untitled'),
+                   s.start_time, s.end_time,
+                   CASE WHEN s.start_time IS NOT NULL AND s.end_time IS NOT NULL
+                        THEN round((extract(epoch FROM s.end_time - s.start_time) / 3600)::numeric, 2)
+                        ELSE 0 END,
+                   s.application, s.tags, s.notes, s.content_hash,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM manictime_activity_staging s
+          ORDER BY s.entity_id, s.seq DESC
+            ON CONFLICT ON CONSTRAINT manictime_activity_user_timeline_entity_uniq DO UPDATE SET
+                name = EXCLUDED.name,
+                start_time = EXCLUDED.start_time,
+                end_time = EXCLUDED.end_time,
+                duration = EXCLUDED.duration,
+                application = EXCLUDED.application,
+                tags = EXCLUDED.tags,
+                notes = EXCLUDED.notes,
+                content_hash = EXCLUDED.content_hash,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+             WHERE manictime_activity.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+         RETURNING (xmax = 0)
+        """, {
+            'user_id': user_id,
+            'timeline_id': timeline_id,
+            'uid': self.env.uid,
+        })
+        return [inserted for (inserted,) in self.env.cr.fetchall()]
+
+    @api.model
+    def ingest(self, timeline, activities, rejected=None):
+        """Create or update a batch of activities for a timeline in one merge
+
+        The batch is COPY'd into a temporary staging table and merged into
+        manictime_activity with a single INSERT ... ON CONFLICT DO UPDATE.
+
+        Args:
+            timeline: manictime.user.timeline record the activities belong to
+            activities: iterable of Activity objects
+            rejected: optional list, the activities that cannot be stored are
+                      appended to it as {'record': payload, 'error': reason} dicts
+
+        Returns:
+            dict: counts of 'received', 'invalid', 'inserted', 'updated' and
+                  'skipped' (unchanged content hash) activities, plus
+                  'newest_start', the latest start time in the batch (None for
+                  an empty batch)
+        """
+        timeline.ensure_one()
+        stats = {'received': 0, 'invalid': 0, 'inserted': 0, 'updated': 0, 'skipped': 0,
+                 'newest_start': None}
+
+        activities = list(activities)
+        stats['received'] = len(activities)
+
+        # Convert all start and end times to naive UTC in one pass each
+        start_times = to_naive_utc_batch([getattr(activity, 'start', None) for activity in activities])
+        end_times = to_naive_utc_batch([getattr(activity, 'end', None) for activity in activities])
+
+        rows = []
+        for activity, start_time, end_time in zip(activities, start_times, end_times):
+            row = self._prepare_row(activity, start_time, end_time)
+            if row is None:
+                stats['invalid'] += 1
+                if rejected is not None:
+                    rejected.append({
+                        'record': record_to_payload(activity),
+                        'error': "missing id or invalid start/end time",
+                    })
+                continue
+            rows.append(row)
+
+        if not rows:
+            return stats
+
+        Activity = self.env['manictime.activity']
+        # Pending ORM writes must reach the table before we merge behind its back
+        Activity.flush_model()
+
+        self._create_staging_table()
+        self._copy_rows(rows)
+        self._discard_unchanged(timeline.user_id.id, timeline.id)
+        results = self._merge_staging(timeline.user_id.id, timeline.id)
+
+        # The merge bypasses the ORM, so cached values may be stale
+        Activity.invalidate_model()
+
+        distinct = len({row[0] for row in rows})
+        stats['newest_start'] = max((row[2] for row in rows if row[2]), default=None)
+        stats['inserted'] = sum(1 for inserted in results if inserted)
+        stats['updated'] = len(results) - stats['inserted']
+        stats['skipped'] = distinct - len(results)
+
+        _logger.info(
+            f"Ingested {len(rows)} activities for timeline {timeline.name}: "
+            f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['skipped']} skipped"
+        )
+        return stats
+
+    @api.model
+    def ingest_chunks(self, timeline, chunks, window=None, rejected=None):
+        """Ingest a stream of activity chunks, merging one chunk at a time
+
+        Every chunk is merged in its own savepoint. A chunk that fails is
+        rolled back and kept in the dead-letter store, as are the activities
+        that cannot be stored, so the rest of the stream is still ingested.
+
+        With a window, the entity ids of the stream are recorded and, once it
+        has been fully consumed, stored activities of that window which the
+        server did not return are deleted (see _reconcile_window).
+
+        Args:
+            timeline: manictime.user.timeline record the activities belong to
+            chunks: iterable of activity lists
+            window: optional (date_from, date_to) the chunks are the complete
+                    server content of
+            rejected: optional list of the activities the producer of the
+                      chunks could not normalize (see normalize_activities),
+                      read once the chunks are exhausted
+
+        Returns:
+            dict: the ingest stats summed over all chunks, plus 'deleted' and
+                  'failed' (activities of failed chunks)
+        """
+        totals = {'received': 0, 'invalid': 0, 'inserted': 0, 'updated': 0, 'skipped': 0,
+                  'deleted': 0, 'failed': 0, 'newest_start': None}
+        DeadLetter = self.env['manictime.dead.letter'].sudo()
+        letters = DeadLetter
+        if window:
+            self._create_seen_table()
+        complete = True
+        rejected_rows = []
+
+        for index, chunk in enumerate(chunks):
+            if window:
+                entity_ids = [getattr(activity, 'id', None) for activity in chunk]
+                if not all(entity_ids):
+                    # An activity we cannot identify could be any stored row
+                    complete = False
+                self._copy_seen([str(entity_id) for entity_id in entity_ids if entity_id])
+
+            savepoint_chunk = f"ingest_chunk_{index}"
+            self.env.cr.execute(f"SAVEPOINT {savepoint_chunk}")
+            rejected_mark = len(rejected_rows)
+            try:
+                stats = self.ingest(timeline, chunk, rejected=rejected_rows)
+                self.env.cr.execute(f"RELEASE SAVEPOINT {savepoint_chunk}")
+            except Exception as chunk_error:
+                _logger.error(f"Timeline {timeline.name}: failed to merge a chunk of {len(chunk)} activities: "
+                              f"{str(chunk_error)}")
+                self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_chunk}")
+                self.env['manictime.activity'].invalidate_model()
+                # The whole chunk is dead-lettered, including its rejected activities
+                del rejected_rows[rejected_mark:]
+                letters |= DeadLetter.record_batch(timeline, chunk, str(chunk_error), window=window)
+                totals['received'] += len(chunk)
+                totals['failed'] += len(chunk)
+                continue
+
+            for key in ('received', 'invalid', 'inserted', 'updated', 'skipped'):
+                totals[key] += stats[key]
+            if stats['newest_start'] and (not totals['newest_start'] or stats['newest_start'] > totals['newest_start']):
+                totals['newest_start'] = stats['newest_start']
+
+        if rejected:
+            totals['invalid'] += len(rejected)
+            if window:
+                # Rejected activities are still on the server, they must not be reconciled away
+                entity_ids = [item['raw'].get('entityId') if isinstance(item['raw'], dict) else None
+                              for item in rejected]
+                if not all(entity_ids):
+                    complete = False
+                self._copy_seen([str(entity_id) for entity_id in entity_ids if entity_id])
+        if rejected or rejected_rows:
+            letters |= DeadLetter.record_items(timeline, list(rejected or []) + rejected_rows, window=window)
+
+        if window:
+            if not totals['received']:
+                # An empty response is more likely a server hiccup than every activity being deleted
+                _logger.info(f"Timeline {timeline.name}: empty window, skipping deletion reconciliation")
+            elif not complete:
+                _logger.warning(f"Timeline {timeline.name}: activities without id in window, "
+                                f"skipping deletion reconciliation")
+            else:
+                totals['deleted'] = self._reconcile_window(timeline, *window)
+                # Letters of earlier fetches of the window are outdated by this one
+                DeadLetter._resolve_covered(timeline, *window, exclude=letters)
+        return totals
+
+    @api.model
+    def _create_seen_table(self):
+        """Create (or empty) the per-transaction table of fetched entity ids"""
+        self.env.cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS manictime_activity_seen (
+                entity_id varchar NOT NULL
+            ) ON COMMIT DROP
+        """)
+        self.env.cr.execute("TRUNCATE manictime_activity_seen")
+
+    @api.model
+    def _copy_seen(self, entity_ids):
+        """Bulk load fetched entity ids with COPY"""
+        if not entity_ids:
+            return
+        buffer = io.StringIO(''.join(f"{_copy_value(entity_id)}\n" for entity_id in entity_ids))
+        self.env.cr.copy_expert("COPY manictime_activity_seen (entity_id) FROM STDIN", buffer)
+
+    @api.model
+    def _reconcile_window(self, timeline, date_from, date_to):
+        """Delete the stored activities of a fully fetched window the server no longer returns
+
+        Only activities lying entirely inside the window are considered, so
+        ones straddling its edges (which the server may or may not return)
+        are never removed. The window is the one the server applied to the
+        request (see api_window). Must only be called once the whole window
+        has been fetched and recorded in manictime_activity_seen.
+
+        Returns:
+            int: number of deleted activities
+        """
+        if not date_from or not date_to:
+            return 0
+        date_from, date_to = api_window(date_from, date_to)
+
+        Activity = self.env['manictime.activity']
+        Activity.flush_model()
+        self.env.cr.execute("ANALYZE manictime_activity_seen")
+        self.env.cr.execute("""
+            DELETE FROM manictime_activity a
+             WHERE a.user_id = %s
+               AND a.timeline_id = %s
+               AND a.start_time >= %s
+               AND a.end_time <= %s
+               AND NOT EXISTS (
+                   SELECT 1 FROM manictime_activity_seen s WHERE s.entity_id = a.entity_id
+               )
+         RETURNING a.entity_id
+        """, (timeline.user_id.id, timeline.id, date_from, date_to))
+        deleted_ids = [entity_id for (entity_id,) in self.env.cr.fetchall()]
+        deleted = len(deleted_ids)
+        Activity.invalidate_model()
+        self.env['manictime.dead.letter'].sudo()._forget_entities(timeline, deleted_ids)
+
+        if deleted:
+            _logger.info(f"Timeline {timeline.name}: deleted {deleted} activities no longer on the server "
+                         f"between {date_from} and {date_to}")
+        return deleted
+
+    @api.model
+    def delete_entities(self, timeline, entity_ids):
+        """Delete the activities of a timeline with the given entity ids in bulk
+
+        Returns:
+            int: number of deleted activities
+        """
+        timeline.ensure_one()
+        if not entity_ids:
+            return 0
+
+        Activity = self.env['manictime.activity']
+        Activity.flush_model()
+        self.env.cr.execute("""
+            DELETE FROM manictime_activity
+             WHERE user_id = %s AND timeline_id = %s AND entity_id = ANY(%s)
+        """, (timeline.user_id.id, timeline.id, list(entity_ids)))
+        deleted = self.env.cr.rowcount
+        Activity.invalidate_model()
+        # Also the ones never stored, e.g. still waiting in a failed batch
+        self.env['manictime.dead.letter'].sudo()._forget_entities(timeline, entity_ids)
+        return deleted
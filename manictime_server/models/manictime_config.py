@@ -1,6 +1,7 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import logging
+from datetime import datetime, time, timedelta
 
 _logger = logging.getLogger(__name__)
 
@@ -60,6 +61,23 @@ class ManicTimeConfig(models.Model):
         help='When new timelines are discovered, automatically mark them for synchronization'
     )
     
+    backfill_from = fields.Date(
+        string='Backfill From',
+        help='Import the history of the selected timelines back to this date'
+    )
+
+    poll_interval = fields.Integer(
+        string='Poll Interval (minutes)',
+        readonly=True,
+        help='Current interval between scheduled syncs. Shrinks while the timelines change '
+             'and grows while they are idle'
+    )
+    next_poll = fields.Datetime(
+        string='Next Poll',
+        readonly=True,
+        help='When the scheduled sync checks this user for changes next'
+    )
+
     _sql_constraints = [
         ('user_uniq', 'unique(user_id)', 'A user can only have one ManicTime configuration!')
     ]
@@ -179,10 +197,57 @@ class ManicTimeConfig(models.Model):
         return self.user_id.manictime_revoke_auth()
     
     def action_sync_data(self):
-        """Sync data for the user"""
+        """Queue a sync of the user's data"""
         self.ensure_one()
-        return self.user_id.manictime_sync_data()
+        return self.user_id.action_manictime_sync_data()
     
+    def action_start_backfill(self):
+        """Schedule a historical backfill of the selected timelines"""
+        self.ensure_one()
+        if not self.backfill_from:
+            raise UserError(_("Please set the date to backfill from first."))
+
+        timelines = self.env['manictime.user.timeline'].search([
+            ('user_id', '=', self.user_id.id),
+            ('is_selected', '=', True),
+        ])
+        timelines.write({
+            'backfill_target': datetime.combine(self.backfill_from, time.min),
+            'backfill_cursor': False,
+        })
+        self.env.ref('manictime_server.ir_cron_manictime_backfill')._trigger()
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Backfill Scheduled'),
+                'message': _('History of %s timelines will be imported back to %s, newest days first.') %
+                           (len(timelines), self.backfill_from),
+                'type': 'info',
+            }
+        }
+
+    def _schedule_next_poll(self, changed):
+        """Adapt the poll interval to the activity of the user and schedule the next poll
+
+        Users whose timelines changed are polled again after the minimum
+        interval, idle users back off by doubling their interval up to the
+        maximum (manictime_server.poll_min_interval / poll_max_interval).
+        """
+        param = self.env['ir.config_parameter'].sudo()
+        min_interval = max(1, int(param.get_param('manictime_server.poll_min_interval', default='15')))
+        max_interval = max(min_interval, int(param.get_param('manictime_server.poll_max_interval', default='1440')))
+        for config in self:
+            if changed:
+                interval = min_interval
+            else:
+                interval = min(max((config.poll_interval or min_interval) * 2, min_interval), max_interval)
+            config.write({
+                'poll_interval': interval,
+                'next_poll': fields.Datetime.now() + timedelta(minutes=interval),
+            })
+
     @api.model
     def cron_check_auth_status(self):
         """Cron job to check authentication status and refresh if needed"""
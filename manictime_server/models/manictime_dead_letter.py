@@ -0,0 +1,262 @@
+from odoo import models, fields, api, _
+import json
+import logging
+from ..tools.activity_stream import normalize_activities, record_from_payload, record_to_payload
+from ..tools.timestamps import api_window
+
+_logger = logging.getLogger(__name__)
+
+
+def _item_entity_id(item):
+    """Entity id of a dead-lettered activity, or None"""
+    payload = item.get('raw') if 'raw' in item else item.get('record')
+    if not isinstance(payload, dict):
+        return None
+    entity_id = payload.get('entityId') if 'raw' in item else payload.get('id')
+    return str(entity_id) if entity_id else None
+
+
+class ManicTimeDeadLetter(models.Model):
+    _name = 'manictime.dead.letter'
+    _description = 'ManicTime Dead Letter'
+    _order = 'create_date desc, id desc'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        related='timeline_id.user_id',
+        store=True,
+        index=True
+    )
+    timeline_id = fields.Many2one(
+        'manictime.user.timeline',
+        string='Timeline',
+        required=True,
+        index=True,
+        ondelete='cascade',
+        help='Timeline the activities belong to'
+    )
+    kind = fields.Selection(
+        [
+            ('batch', 'Failed Batch'),
+            ('activity', 'Rejected Activities'),
+        ],
+        string='Kind',
+        required=True,
+        help='Failed Batch: a chunk whose merge failed. '
+             'Rejected Activities: activities that could not be converted or stored'
+    )
+    state = fields.Selection(
+        [
+            ('pending', 'Pending'),
+            ('resolved', 'Resolved'),
+            ('failed', 'Failed'),
+        ],
+        string='State',
+        default='pending',
+        required=True,
+        index=True
+    )
+    payload = fields.Text(
+        string='Payload',
+        readonly=True,
+        help='JSON list of the activities, each one with its raw API payload or its normalized record'
+    )
+    item_count = fields.Integer(string='Activities', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+    window_from = fields.Datetime(string='Window From', readonly=True, help='Start of the sync window they were fetched in')
+    window_to = fields.Datetime(string='Window To', readonly=True, help='End of the sync window they were fetched in')
+    attempts = fields.Integer(string='Retries', default=0, readonly=True)
+    last_retry = fields.Datetime(string='Last Retry', readonly=True)
+
+    @api.model
+    def _record(self, timeline, kind, items, error, window=None):
+        window_from, window_to = window or (False, False)
+        letter = self.create({
+            'timeline_id': timeline.id,
+            'kind': kind,
+            'payload': json.dumps(items, default=str),
+            'item_count': len(items),
+            'error': error,
+            'window_from': window_from,
+            'window_to': window_to,
+        })
+        _logger.warning(f"Timeline {timeline.name}: {len(items)} activities kept in dead letter {letter.id}: {error}")
+        return letter
+
+    @api.model
+    def record_batch(self, timeline, activities, error, window=None):
+        """Keep the activities of a chunk whose merge failed
+
+        Args:
+            timeline: manictime.user.timeline record
+            activities: the Activity objects of the chunk
+            error: error message of the failed merge
+            window: optional (date_from, date_to) the chunk was fetched in
+        """
+        items = [{'record': record_to_payload(activity)} for activity in activities]
+        return self._record(timeline, 'batch', items, error, window=window)
+
+    @api.model
+    def record_items(self, timeline, items, window=None):
+        """Keep individually rejected activities
+
+        Args:
+            items: {'raw': api payload, 'error': reason} or
+                   {'record': record payload, 'error': reason} dicts
+        """
+        errors = sorted({item.get('error') or '' for item in items})
+        error = '\n'.join(errors[:10])
+        if len(errors) > 10:
+            error += '\n' + _('(%s more errors)') % (len(errors) - 10)
+        return self._record(timeline, 'activity', items, error, window=window)
+
+    @api.model
+    def _resolve_covered(self, timeline, date_from, date_to, exclude=None):
+        """Resolve the open letters of a window fetched again in full, without replaying them
+
+        The fetch stored the current server content of the window, the kept
+        activities would only bring back older values or deleted entities.
+
+        Args:
+            exclude: letters recorded by that fetch itself
+        """
+        date_from, date_to = api_window(date_from, date_to)
+        letters = self.search([
+            ('timeline_id', '=', timeline.id),
+            ('state', 'in', ('pending', 'failed')),
+            ('window_from', '>=', date_from),
+            ('window_to', '<=', date_to),
+            ('id', 'not in', (exclude or self).ids),
+        ])
+        if letters:
+            letters.write({'state': 'resolved', 'error': _('Superseded by a later fetch of the window')})
+            _logger.info(f"Timeline {timeline.name}: {len(letters)} dead letters superseded by a fetch "
+                         f"of {date_from} - {date_to}")
+        return letters
+
+    @api.model
+    def _forget_entities(self, timeline, entity_ids):
+        """Drop deleted entities from the open letters of a timeline, they must not come back on retry"""
+        entity_ids = {str(entity_id) for entity_id in entity_ids}
+        if not entity_ids:
+            return
+        for letter in self.search([('timeline_id', '=', timeline.id), ('state', 'in', ('pending', 'failed'))]):
+            items = json.loads(letter.payload or '[]')
+            kept = [item for item in items if _item_entity_id(item) not in entity_ids]
+            if len(kept) == len(items):
+                continue
+            vals = {'payload': json.dumps(kept, default=str), 'item_count': len(kept)}
+            if not kept:
+                vals.update({'state': 'resolved', 'error': _('Activities deleted on the server')})
+            letter.write(vals)
+
+    def _superseded_entities(self, items):
+        """Entity ids of the items whose stored activity was written after the letter"""
+        entity_ids = list({entity_id for entity_id in map(_item_entity_id, items) if entity_id})
+        if not entity_ids:
+            return set()
+        self.env['manictime.activity'].flush_model(['entity_id', 'timeline_id', 'write_date'])
+        self.env.cr.execute("""
+            SELECT entity_id FROM manictime_activity
+             WHERE timeline_id = %s AND entity_id = ANY(%s) AND write_date > %s
+        """, (self.timeline_id.id, entity_ids, self.create_date))
+        return {entity_id for (entity_id,) in self.env.cr.fetchall()}
+
+    def _retry(self):
+        """Re-apply the activities of the letter to its timeline
+
+        Only the kept activities are ingested again, nothing is fetched.
+        Activities a later sync stored since the letter was recorded are
+        skipped, their stored values are newer. The letter is resolved when
+        every activity was stored, otherwise it keeps the activities still
+        rejected.
+
+        Returns:
+            bool: True if the letter is resolved
+        """
+        self.ensure_one()
+        timeline = self.timeline_id
+        items = json.loads(self.payload or '[]')
+        superseded = self._superseded_entities(items)
+        if superseded:
+            items = [item for item in items if _item_entity_id(item) not in superseded]
+            _logger.info(f"Dead letter {self.id}: {len(superseded)} activities updated since, not re-applied")
+        raw_items = [item['raw'] for item in items if 'raw' in item]
+        rejected = []
+        activities = list(normalize_activities(raw_items, rejected=rejected))
+        activities += [record_from_payload(item['record']) for item in items if 'record' in item]
+
+        stats = self.env['manictime.activity.ingest'].sudo().ingest(timeline, activities, rejected=rejected)
+        timeline._update_sync_watermark(stats['newest_start'])
+
+        vals = {'attempts': self.attempts + 1, 'last_retry': fields.Datetime.now()}
+        if rejected:
+            vals.update({
+                'payload': json.dumps(rejected, default=str),
+                'item_count': len(rejected),
+                'error': '\n'.join(sorted({item.get('error') or '' for item in rejected})),
+            })
+        else:
+            vals.update({'state': 'resolved', 'error': False})
+        self.write(vals)
+        _logger.info(f"Dead letter {self.id}: {len(activities) - stats['invalid']} activities re-applied, "
+                     f"{len(rejected)} still rejected")
+        return not rejected
+
+    def retry(self):
+        """Retry the pending letters, each one in its own savepoint
+
+        Letters whose timeline is being synced are left for the next retry.
+        After manictime_server.dead_letter_max_attempts retries, a letter is
+        failed for good.
+
+        Returns:
+            int: number of letters resolved
+        """
+        max_attempts = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.dead_letter_max_attempts', default='5'))
+        sync_lock = self.env['manictime.sync.lock']
+        resolved = 0
+        for letter in self.filtered(lambda letter: letter.state == 'pending'):
+            if not sync_lock.try_lock_timeline(letter.timeline_id.id):
+                continue
+            savepoint_letter = f"dead_letter_{letter.id}"
+            self.env.cr.execute(f"SAVEPOINT {savepoint_letter}")
+            try:
+                resolved += letter._retry()
+                self.env.cr.execute(f"RELEASE SAVEPOINT {savepoint_letter}")
+            except Exception as e:
+                _logger.error(f"Retry of dead letter {letter.id} failed: {str(e)}")
+                self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_letter}")
+                self.env['manictime.activity'].invalidate_model()
+                letter.write({
+                    'attempts': letter.attempts + 1,
+                    'last_retry': fields.Datetime.now(),
+                    'error': str(e),
+                })
+            if letter.state == 'pending' and letter.attempts >= max_attempts:
+                letter.state = 'failed'
+        return resolved
+
+    def action_retry(self):
+        """Retry the selected letters now, failed ones included"""
+        self.filtered(lambda letter: letter.state == 'failed').write({'state': 'pending', 'attempts': 0})
+        resolved = self.retry()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Dead Letters Retried'),
+                'message': _('%s of %s dead letters resolved') % (resolved, len(self)),
+                'type': 'success' if resolved == len(self) else 'warning',
+            }
+        }
+
+    @api.model
+    def cron_retry_dead_letters(self):
+        """Cron job method to retry the pending dead letters"""
+        letters = self.search([('state', '=', 'pending')])
+        resolved = letters.retry()
+        _logger.info(f"Retried {len(letters)} ManicTime dead letters, {resolved} resolved")
+        return True
@@ -0,0 +1,81 @@
+from odoo import models, fields, api
+import logging
+from ..tools.http_pool import NOT_MODIFIED, conditional_get
+from ..tools.response_cache import CachedManicTimeClient
+
+_logger = logging.getLogger(__name__)
+
+
+class ManicTimeHttpValidator(models.Model):
+    _name = 'manictime.http.validator'
+    _description = 'ManicTime Response Validator'
+    _order = 'user_id, endpoint'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    endpoint = fields.Char(
+        string='Endpoint',
+        required=True,
+        help='URL of the listing the validators belong to'
+    )
+    etag = fields.Char(string='ETag', readonly=True)
+    last_modified = fields.Char(string='Last Modified', readonly=True)
+    not_modified_count = fields.Integer(
+        string='Not Modified',
+        readonly=True,
+        help='How many refreshes were answered with 304 Not Modified'
+    )
+
+    _sql_constraints = [
+        ('user_endpoint_uniq', 'unique(user_id, endpoint)',
+         'Validators are kept once per user and endpoint!')
+    ]
+
+    @api.model
+    def fetch(self, user, client, url, headers=None, conditional=True):
+        """GET a listing of the user, conditionally on the validators of its last response
+
+        The validators are only sent when conditional is set, e.g. when the
+        records built from the listing exist. New validators are not stored
+        here: call save() once the response is processed, so a failed
+        refresh is never answered with 304 afterwards. Clients with a
+        response cache answer fresh listings from it (see
+        CachedManicTimeClient.conditional_get).
+
+        Returns:
+            tuple: (NOT_MODIFIED or the decoded response, validators to save)
+        """
+        validator = self.search([('user_id', '=', user.id), ('endpoint', '=', url)], limit=1)
+        last = {'etag': validator.etag, 'last_modified': validator.last_modified} if validator and conditional else None
+        if isinstance(client, CachedManicTimeClient):
+            # A listing still fresh in the response cache is not requested again
+            response, validators = client.conditional_get(url, headers=headers, validators=last)
+        else:
+            response, validators = conditional_get(client, url, headers=headers, validators=last)
+        if response is NOT_MODIFIED:
+            validator.not_modified_count += 1
+            _logger.info(f"{url} not modified for user {user.name}, refresh skipped")
+        return response, validators
+
+    @api.model
+    def save(self, user, url, validators):
+        """Store the validators of a processed response, forgetting them if the server sent none"""
+        validator = self.search([('user_id', '=', user.id), ('endpoint', '=', url)], limit=1)
+        vals = {
+            'etag': (validators or {}).get('etag') or False,
+            'last_modified': (validators or {}).get('last_modified') or False,
+        }
+        if validator:
+            validator.write(vals)
+        elif vals['etag'] or vals['last_modified']:
+            self.create({'user_id': user.id, 'endpoint': url, **vals})
+
+    @api.model
+    def forget(self, users):
+        """Drop the validators of users, their next refresh downloads every listing"""
+        self.search([('user_id', 'in', users.ids)]).unlink()
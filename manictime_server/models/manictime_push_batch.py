@@ -0,0 +1,146 @@
+from odoo import models, fields, api
+from odoo.tools import mute_logger
+import logging
+from datetime import datetime, timedelta
+
+from psycopg2 import errors as pg_errors
+from ..tools.activity_stream import DEFAULT_CHUNK_SIZE, iter_chunks, normalize_activities
+
+_logger = logging.getLogger(__name__)
+
+
+class ManicTimePushBatch(models.Model):
+    _name = 'manictime.push.batch'
+    _description = 'ManicTime Pushed Activity Batch'
+    _order = 'create_date desc, id desc'
+
+    timeline_id = fields.Many2one(
+        'manictime.user.timeline',
+        string='Timeline',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        related='timeline_id.user_id',
+        store=True
+    )
+    idempotency_key = fields.Char(
+        string='Idempotency Key',
+        required=True,
+        help='Key sent by the pusher with the batch, a batch pushed again with the same key is not ingested twice'
+    )
+    received = fields.Integer(string='Received', readonly=True)
+    inserted = fields.Integer(string='Inserted', readonly=True)
+    updated = fields.Integer(string='Updated', readonly=True)
+    skipped = fields.Integer(string='Skipped', readonly=True)
+    invalid = fields.Integer(string='Invalid', readonly=True)
+    failed = fields.Integer(string='Failed', readonly=True)
+
+    _sql_constraints = [
+        ('timeline_key_uniq', 'unique(timeline_id, idempotency_key)',
+         'A batch is pushed once per idempotency key and timeline!')
+    ]
+
+    def _get_result(self, replayed=False):
+        self.ensure_one()
+        return {
+            'idempotency_key': self.idempotency_key,
+            'received': self.received,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'invalid': self.invalid,
+            'failed': self.failed,
+            'replayed': replayed,
+        }
+
+    @api.model
+    def _claim_key(self, timeline, idempotency_key):
+        """Record the idempotency key of a batch before ingesting it
+
+        A concurrent push of the same key that committed after this
+        transaction started is invisible to it, and conflicts on the unique
+        key instead (a serialization failure under repeatable read).
+
+        Returns:
+            manictime.push.batch: the new batch, empty if the key is taken
+        """
+        try:
+            with mute_logger('odoo.sql_db'), self.env.cr.savepoint():
+                self.env.cr.execute("""
+                    INSERT INTO manictime_push_batch
+                           (timeline_id, user_id, idempotency_key,
+                            received, inserted, updated, skipped, invalid, failed,
+                            create_uid, create_date, write_uid, write_date)
+                    VALUES (%(timeline)s, %(user)s, %(key)s, 0, 0, 0, 0, 0, 0,
+                            %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+                    ON CONFLICT (timeline_id, idempotency_key) DO NOTHING
+                    RETURNING id
+                """, {
+                    'timeline': timeline.id,
+                    'user': timeline.user_id.id,
+                    'key': idempotency_key,
+                    'uid': self.env.uid,
+                })
+                row = self.env.cr.fetchone()
+        except (pg_errors.SerializationFailure, pg_errors.UniqueViolation):
+            row = None
+        return self.browse(row[0] if row else [])
+
+    @api.model
+    def ingest_push(self, timeline, idempotency_key, raw_activities):
+        """Ingest a pushed batch of raw API activities through the bulk ingest path
+
+        The idempotency key is claimed before the batch is ingested, in the
+        same transaction, so a batch pushed again (e.g. after a lost
+        response) is answered with the first result instead of being
+        ingested twice. The caller must hold the timeline lock.
+
+        Pushed activities do not move the timeline watermark: a push says
+        nothing about the activities before it, which the next sync still
+        fetches.
+
+        Args:
+            timeline: manictime.user.timeline record
+            idempotency_key: key of the batch
+            raw_activities: iterable of raw API activities ({'entityId': ..., 'values': {...}})
+
+        Returns:
+            dict: the ingest counts of the batch and whether it was 'replayed',
+                  or None when a push of the same key committed concurrently and
+                  is not visible yet (pushing again is answered with its result)
+        """
+        timeline.ensure_one()
+        batch = self.search([('timeline_id', '=', timeline.id), ('idempotency_key', '=', idempotency_key)], limit=1)
+        if batch:
+            _logger.info(f"Timeline {timeline.name}: batch {idempotency_key} was already pushed")
+            return batch._get_result(replayed=True)
+
+        batch = self._claim_key(timeline, idempotency_key)
+        if not batch:
+            _logger.info(f"Timeline {timeline.name}: batch {idempotency_key} is being pushed concurrently")
+            return None
+
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.ingest_chunk_size', default=DEFAULT_CHUNK_SIZE))
+        rejected = []
+        chunks = iter_chunks(normalize_activities(raw_activities, rejected=rejected), chunk_size)
+        stats = self.env['manictime.activity.ingest'].sudo().ingest_chunks(timeline, chunks, rejected=rejected)
+
+        batch.write({key: stats[key] for key in ('received', 'inserted', 'updated', 'skipped', 'invalid', 'failed')})
+        _logger.info(f"Timeline {timeline.name}: pushed batch {idempotency_key} ingested, "
+                     f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['skipped']} skipped, "
+                     f"{stats['invalid']} invalid, {stats['failed']} failed")
+        return batch._get_result()
+
+    @api.model
+    def _gc_push_batches(self):
+        """Delete the idempotency records older than manictime_server.push_key_retention_days"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.push_key_retention_days', default='7'))
+        old_batches = self.search([('create_date', '<', datetime.now() - timedelta(days=days))])
+        old_batches.unlink()
+        return len(old_batches)
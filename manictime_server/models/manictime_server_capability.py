@@ -0,0 +1,192 @@
+from odoo import models, fields, api, _
+import json
+import logging
+from datetime import datetime, timedelta
+
+from psycopg2 import errors as pg_errors
+
+_logger = logging.getLogger(__name__)
+
+# Answers meaning the server does not have an endpoint, rather than a failed request
+UNSUPPORTED_STATUSES = (400, 404, 405, 501)
+
+SUPPORT_SELECTION = [
+    ('unknown', 'Unknown'),
+    ('supported', 'Supported'),
+    ('unsupported', 'Unsupported'),
+]
+
+
+# Contention on the row shared by every sync of the server, the update is left to a later sync
+CONFLICT_ERRORS = (pg_errors.LockNotAvailable, pg_errors.SerializationFailure, pg_errors.UniqueViolation)
+
+
+def is_unsupported_error(error):
+    """Whether a request error tells that the endpoint does not exist on the server"""
+    response = getattr(error, 'response', None)
+    return response is not None and getattr(response, 'status_code', None) in UNSUPPORTED_STATUSES
+
+
+class ManicTimeServerCapability(models.Model):
+    _name = 'manictime.server.capability'
+    _description = 'ManicTime Server Capability'
+    _rec_name = 'server_url'
+    _order = 'server_url'
+
+    server_url = fields.Char(string='Server URL', required=True, readonly=True)
+    server_version = fields.Char(
+        string='Server Version',
+        readonly=True,
+        help='Server header of the last response, the capabilities are detected again when it changes'
+    )
+    ui_api_tags = fields.Selection(
+        SUPPORT_SELECTION,
+        string='UI API Tags',
+        default='unknown',
+        required=True,
+        help='Whether /ui-api/analytics/timelines/tagEditorTags answers'
+    )
+    tag_list_get_all = fields.Selection(
+        SUPPORT_SELECTION,
+        string='All Tag Combinations',
+        default='unknown',
+        required=True,
+        help='Whether /api/tagcombinationlist accepts getAll=true'
+    )
+    response_shapes = fields.Text(
+        string='Response Shapes',
+        readonly=True,
+        help='JSON object of the response shape of each endpoint (see tools/response_shape.py)'
+    )
+    detected_at = fields.Datetime(
+        string='Detected',
+        readonly=True,
+        help='When the capabilities were detected, they are detected again after '
+             'manictime_server.capability_refresh_hours'
+    )
+
+    _sql_constraints = [
+        ('server_url_uniq', 'unique(server_url)', 'Capabilities are kept once per server!')
+    ]
+
+    @api.model
+    def _for_server(self, server_url):
+        """Capabilities of a server, reset when older than the refresh interval
+
+        Returns an empty recordset when the record cannot be created now
+        (another sync is creating it), which behaves as nothing detected.
+        """
+        server_url = server_url.rstrip('/')
+        capability = self.search([('server_url', '=', server_url)], limit=1)
+        if not capability:
+            try:
+                with self.env.cr.savepoint():
+                    # Workers of the same round may meet a new server together
+                    self.env.cr.execute("""
+                        INSERT INTO manictime_server_capability
+                               (server_url, ui_api_tags, tag_list_get_all,
+                                create_uid, create_date, write_uid, write_date)
+                        VALUES (%(url)s, 'unknown', 'unknown',
+                                %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+                        ON CONFLICT (server_url) DO NOTHING
+                    """, {'url': server_url, 'uid': self.env.uid})
+            except CONFLICT_ERRORS:
+                _logger.info(f"Capabilities of ManicTime server {server_url} are being created by another sync")
+            capability = self.search([('server_url', '=', server_url)], limit=1)
+
+        hours = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.capability_refresh_hours', default='24'))
+        if capability.detected_at and capability.detected_at < datetime.now() - timedelta(hours=hours):
+            capability._reset()
+        return capability
+
+    def _reset(self):
+        """Forget what was detected, the next syncs probe the endpoints again"""
+        self._update({
+            'ui_api_tags': 'unknown',
+            'tag_list_get_all': 'unknown',
+            'response_shapes': False,
+            'detected_at': False,
+        })
+
+    def _update(self, vals):
+        """Write the values that changed, without waiting on or failing the sync
+
+        The row is shared by the concurrent syncs of every user of the
+        server: when another transaction holds or changed it, the update is
+        skipped, a later sync detects the same again.
+        """
+        if not self:
+            return
+        self.ensure_one()
+        vals = {key: value for key, value in vals.items() if self[key] != value}
+        if not vals:
+            return
+        if 'detected_at' not in vals:
+            vals['detected_at'] = fields.Datetime.now()
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute(
+                    "SELECT id FROM manictime_server_capability WHERE id = %s FOR UPDATE NOWAIT", [self.id])
+                self.write(vals)
+        except CONFLICT_ERRORS:
+            self.invalidate_recordset()
+            _logger.info(f"ManicTime server {self.server_url} capabilities updated concurrently, skipped {vals}")
+            return
+        _logger.info(f"ManicTime server {self.server_url} capabilities: {vals}")
+
+    def _note_version(self, version):
+        """Detect the capabilities again when the server version changed"""
+        if not self or not version or version == self.server_version:
+            return
+        if self.server_version:
+            _logger.info(f"ManicTime server {self.server_url} changed from {self.server_version} to {version}")
+            self._reset()
+        self._update({'server_version': version})
+
+    def _get_shape(self, endpoint):
+        """Response shape recorded for an endpoint, or None"""
+        if not self or not self.response_shapes:
+            return None
+        return json.loads(self.response_shapes).get(endpoint)
+
+    def _set_shape(self, endpoint, shape):
+        if not self or not shape or self._get_shape(endpoint) == shape:
+            return
+        shapes = json.loads(self.response_shapes or '{}')
+        shapes[endpoint] = shape
+        self._update({'response_shapes': json.dumps(shapes, sort_keys=True)})
+
+    def _tag_endpoints(self, server_url, is_manager):
+        """Tag endpoints to try in order, skipping the ones known to be missing
+
+        Returns:
+            list: (endpoint, url, headers) tuples; the endpoint names the
+                  capability field recording whether it works, if any, and
+                  keys its response shape
+        """
+        server_url = server_url.rstrip('/')
+        legacy_headers = {"Accept": "application/vnd.manictime.v3+json"}
+        endpoints = []
+        if self.ui_api_tags != 'unsupported':
+            endpoints.append(('ui_api_tags', f"{server_url}/ui-api/analytics/timelines/tagEditorTags",
+                              {"Accept": "application/json"}))
+        if is_manager and self.tag_list_get_all != 'unsupported':
+            # Managers can try to get all tags
+            endpoints.append(('tag_list_get_all', f"{server_url}/api/tagcombinationlist?getAll=true",
+                              legacy_headers))
+        endpoints.append(('tag_list', f"{server_url}/api/tagcombinationlist", legacy_headers))
+        return endpoints
+
+    def action_redetect(self):
+        for capability in self:
+            capability._reset()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Capabilities Reset'),
+                'message': _('The endpoints of %s servers are detected again on the next sync') % len(self),
+                'type': 'success',
+            }
+        }
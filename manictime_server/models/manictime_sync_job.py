@@ -0,0 +1,622 @@
+from odoo import models, fields, api, SUPERUSER_ID, _
+from odoo.exceptions import UserError
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from ..tools.server_health import CircuitOpenError, ServerUnavailableError, backoff_delay
+from .manictime_sync_lock import LOCK_NAMESPACE_CLAIM
+
+_logger = logging.getLogger(__name__)
+
+# Open jobs, at most one per user and timeline
+OPEN_STATES = ('pending', 'running')
+
+# Retry backoff: base delay doubled per attempt with jitter, capped
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 3600
+
+# Seconds a cron run spends claiming jobs, below the usual hosted cron limits
+DEFAULT_TIME_BUDGET = 600
+
+# Priority of the jobs of syncs started from a button, ahead of the cron rounds
+MANUAL_PRIORITY = 0
+
+
+def _find_unavailable_error(error):
+    """The ServerUnavailableError of an exception or of its cause/context chain, or None"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, ServerUnavailableError):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class ManicTimeSyncJob(models.Model):
+    _name = 'manictime.sync.job'
+    _description = 'ManicTime Sync Job'
+    _order = 'priority, next_attempt, id'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        required=True,
+        index=True,
+        ondelete='cascade',
+        help='User whose ManicTime data this job syncs'
+    )
+    timeline_id = fields.Many2one(
+        'manictime.user.timeline',
+        string='Timeline',
+        ondelete='cascade',
+        help='Timeline whose activities are synced. Empty for the timelines and tags refresh of the user'
+    )
+    job_type = fields.Selection(
+        [
+            ('refresh', 'Timelines & Tags'),
+            ('timeline', 'Timeline Activities'),
+            ('tags', 'All User & Team Tags'),
+        ],
+        string='Type',
+        default='refresh',
+        required=True
+    )
+    state = fields.Selection(
+        [
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string='State',
+        default='pending',
+        required=True,
+        index=True
+    )
+    priority = fields.Integer(
+        string='Priority',
+        default=10,
+        help='Lower values are claimed first'
+    )
+    attempts = fields.Integer(
+        string='Attempts',
+        default=0,
+        readonly=True
+    )
+    next_attempt = fields.Datetime(
+        string='Next Attempt',
+        default=fields.Datetime.now,
+        required=True,
+        help='The job is not claimed before this time'
+    )
+    started_at = fields.Datetime(string='Started At', readonly=True)
+    date_done = fields.Datetime(string='Done At', readonly=True)
+    worker = fields.Char(string='Worker', readonly=True, help='Worker that claimed the job last')
+    last_error = fields.Text(string='Last Error', readonly=True)
+    activity_count = fields.Integer(
+        string='Synced',
+        readonly=True,
+        help='Activities (or tag combinations) synced by the job'
+    )
+    notify = fields.Boolean(
+        string='Report Progress',
+        readonly=True,
+        help='Push the progress of the job to its user, for syncs started from a button'
+    )
+
+    def init(self):
+        # At most one open job per user, type and timeline, so enqueueing is idempotent
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS manictime_sync_job_open_type_uniq
+                ON manictime_sync_job (user_id, job_type, (COALESCE(timeline_id, 0)))
+             WHERE state IN ('pending', 'running')
+        """)
+
+    @api.model
+    def enqueue(self, users, timelines=None, priority=10, job_type='refresh', notify=False):
+        """Enqueue a job per user and a sync job per timeline
+
+        Users or timelines that already have an open job are skipped. With
+        notify, they are coalesced instead: the open job reports its
+        progress, and is moved up to the given priority and to now.
+
+        Args:
+            users: res.users records to enqueue a job_type job for
+            timelines: manictime.user.timeline records to sync activities for
+            priority: priority of the new jobs
+            job_type: type of the user jobs, 'refresh' or 'tags'
+            notify: push the progress of the jobs to their users
+
+        Returns:
+            int: number of jobs created
+        """
+        keys = [(user.id, None, job_type) for user in users or []]
+        keys += [(timeline.user_id.id, timeline.id, 'timeline') for timeline in timelines or []]
+        if not keys:
+            return 0
+
+        self.flush_model()
+        created = 0
+        for user_id, timeline_id, key_type in keys:
+            self.env.cr.execute("""
+                INSERT INTO manictime_sync_job (
+                    user_id, timeline_id, job_type, state, priority, attempts, next_attempt, notify,
+                    create_uid, create_date, write_uid, write_date
+                )
+                VALUES (%(user_id)s, %(timeline_id)s, %(job_type)s, 'pending', %(priority)s, 0,
+                        now() at time zone 'UTC', %(notify)s,
+                        %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+                ON CONFLICT (user_id, job_type, (COALESCE(timeline_id, 0))) WHERE state IN ('pending', 'running')
+                DO UPDATE SET notify = TRUE,
+                              priority = LEAST(manictime_sync_job.priority, EXCLUDED.priority),
+                              next_attempt = LEAST(manictime_sync_job.next_attempt, EXCLUDED.next_attempt),
+                              write_date = EXCLUDED.write_date
+                        WHERE %(notify)s
+                RETURNING (xmax = 0)
+            """, {
+                'user_id': user_id,
+                'timeline_id': timeline_id,
+                'job_type': key_type,
+                'priority': priority,
+                'notify': notify,
+                'uid': self.env.uid,
+            })
+            row = self.env.cr.fetchone()
+            created += bool(row and row[0])
+        self.invalidate_model()
+        return created
+
+    @api.model
+    def request_sync(self, users, timelines=None, job_type='refresh'):
+        """Enqueue a sync started from a button, and return at once
+
+        The jobs run in the job crons, not in the HTTP request. Repeated
+        clicks are coalesced into the job already queued, and the progress
+        is pushed to the user through the bus (see _notify_progress).
+
+        Returns:
+            dict: notification action
+        """
+        Job = self.sudo()
+        requested = len(users or []) + len(timelines or [])
+        created = Job.enqueue(users, timelines=timelines, priority=MANUAL_PRIORITY,
+                              job_type=job_type, notify=True)
+        Job._trigger_partition_crons()
+
+        if created:
+            message = _('The sync runs in the background, its progress will be shown here.')
+        else:
+            message = _('This sync is already queued, its progress will be shown here.')
+        if created and created < requested:
+            message = _('%s of %s syncs were already queued and have been merged. %s') % (
+                requested - created, requested, message)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('ManicTime Sync Queued'),
+                'message': message,
+                'type': 'info',
+            }
+        }
+
+    @api.model
+    def _claim(self, worker, limit=1, partition=None, partitions=1):
+        """Claim due pending jobs for a worker
+
+        Jobs locked by another worker are skipped (FOR UPDATE SKIP LOCKED).
+        At most one job per user is claimed, the user's best ranked one, and
+        users that already have a running job are left to that worker, so one
+        user with many timelines cannot starve the others.
+
+        The running job of a concurrent claim is not visible until that claim
+        commits, so the claim of a user is also serialized with an advisory
+        lock: a user whose jobs another transaction is claiming is skipped.
+        The lock is only tried on the rows the LIMIT actually takes.
+
+        With several partitions, only users hashed into the given partition
+        are considered, so workers of different partitions never share a user.
+
+        Returns:
+            manictime.sync.job: the claimed jobs, now running
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            WITH candidates AS (
+                SELECT j.id,
+                       row_number() OVER (PARTITION BY j.user_id
+                                          ORDER BY j.priority, j.next_attempt, j.id) AS user_rank
+                  FROM manictime_sync_job j
+                 WHERE j.state = 'pending'
+                   AND j.next_attempt <= now() at time zone 'UTC'
+                   AND (%(partition)s IS NULL
+                        OR mod(abs(hashint4(j.user_id)::bigint), %(partitions)s) = %(partition)s)
+                   AND NOT EXISTS (
+                       SELECT 1 FROM manictime_sync_job r
+                        WHERE r.user_id = j.user_id AND r.state = 'running'
+                   )
+            ), picked AS (
+                -- The volatile lock is not pushed into the ordered subquery,
+                -- it is evaluated row by row until the LIMIT is reached
+                SELECT ranked.id
+                  FROM (
+                      SELECT j.id, j.user_id
+                        FROM manictime_sync_job j
+                        JOIN candidates c ON c.id = j.id
+                       WHERE c.user_rank = 1
+                    ORDER BY j.priority, j.next_attempt, j.id
+                         FOR UPDATE OF j SKIP LOCKED
+                  ) ranked
+                 WHERE pg_try_advisory_xact_lock(%(lock_namespace)s, ranked.user_id)
+                 LIMIT %(limit)s
+            )
+            UPDATE manictime_sync_job
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   started_at = now() at time zone 'UTC',
+                   worker = %(worker)s,
+                   write_date = now() at time zone 'UTC'
+             WHERE id IN (SELECT id FROM picked)
+         RETURNING id
+        """, {
+            'limit': limit,
+            'worker': worker,
+            'partition': partition if partitions > 1 else None,
+            'partitions': max(partitions, 1),
+            'lock_namespace': LOCK_NAMESPACE_CLAIM,
+        })
+        job_ids = [job_id for (job_id,) in self.env.cr.fetchall()]
+        self.invalidate_model()
+        return self.browse(job_ids)
+
+    def _execute(self):
+        """Run the job as its user, raising on failure
+
+        Returns:
+            int: number of activities (or tag combinations) synced
+        """
+        self.ensure_one()
+        user = self.user_id.with_user(self.user_id).with_context(from_cron=True)
+        if not user.manictime_enabled:
+            raise UserError(_("ManicTime integration is not enabled for user %s") % user.name)
+        if not user._check_manictime_auth():
+            raise UserError(_("ManicTime authentication expired for user %s") % user.name)
+
+        # No request is sent to a server paused by its circuit breaker
+        health = user._get_manictime_server_health()
+        if health.is_open():
+            raise CircuitOpenError(_("ManicTime server %s is paused after repeated errors") % health.name,
+                                   retry_at=health.retry_at())
+
+        client = user._get_manictime_client()
+        if self.job_type == 'tags':
+            tag_combinations = user._sync_all_manictime_tags(client)
+            _logger.info(f"Sync job {self.id}: {len(tag_combinations)} tag combinations from all users and teams")
+            return len(tag_combinations)
+
+        if not self.timeline_id:
+            if not self.env['manictime.sync.lock'].try_lock_user(user.id):
+                raise UserError(_("ManicTime sync of user %s is already running") % user.name)
+            user._sync_manictime_tags(client)
+            user._fetch_manictime_timelines(client)
+
+            # The listing tells which selected timelines changed, only those get an activity sync
+            timelines = user.manictime_timeline_ids.filtered('is_selected')
+            changed = timelines.filtered(lambda timeline: timeline._has_pending_changes())
+            self.enqueue(self.env['res.users'], timelines=changed, priority=self.priority + 5, notify=self.notify)
+            _logger.info(f"Sync job {self.id}: {len(changed)} of {len(timelines)} timelines changed "
+                         f"for user {user.name}")
+
+            config = self.env['manictime.config'].sudo().search([('user_id', '=', user.id)], limit=1)
+            config._schedule_next_poll(bool(changed))
+            return 0
+
+        timeline = self.timeline_id.with_user(self.user_id)
+        activity_count, failures = user._sync_timeline_activities(
+            client, timeline, user._get_manictime_sync_start())
+        if failures:
+            raise UserError(failures[timeline.id])
+        _logger.info(f"Sync job {self.id}: {activity_count} activities for timeline {timeline.name}")
+        return activity_count
+
+    def _mark_done(self, activity_count=0):
+        self.write({
+            'state': 'done',
+            'date_done': fields.Datetime.now(),
+            'last_error': False,
+            'activity_count': activity_count,
+        })
+
+    def _mark_failed(self, error):
+        """Schedule a retry with exponential backoff, or fail the job for good"""
+        max_attempts = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.sync_job_max_attempts', default='5'))
+        for job in self:
+            if job.attempts >= max_attempts:
+                _logger.error(f"Sync job {job.id} failed after {job.attempts} attempts: {error}")
+                job.write({'state': 'failed', 'last_error': error})
+                continue
+            delay = round(backoff_delay(max(job.attempts - 1, 0), base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS))
+            _logger.warning(f"Sync job {job.id} attempt {job.attempts} failed, retrying in {delay}s: {error}")
+            job.write({
+                'state': 'pending',
+                'next_attempt': datetime.now() + timedelta(seconds=delay),
+                'last_error': error,
+            })
+
+    def _mark_paused(self, error, retry_at=None):
+        """Put the jobs back until the server is healthy again, without using up an attempt"""
+        retry_at = datetime.fromtimestamp(retry_at) if retry_at else datetime.now()
+        for job in self:
+            # Jittered, so the paused jobs do not all hit the recovering server at once
+            next_attempt = retry_at + timedelta(seconds=backoff_delay(0, base=RETRY_BASE_SECONDS))
+            _logger.warning(f"Sync job {job.id} paused until {next_attempt}: {error}")
+            job.write({
+                'state': 'pending',
+                'attempts': max(job.attempts - 1, 0),
+                'next_attempt': next_attempt,
+                'last_error': error,
+            })
+
+    @api.model
+    def _requeue_stale(self):
+        """Return jobs of crashed or killed workers to the queue
+
+        A job still running after the lease (manictime_server.sync_job_lease,
+        minutes) is considered abandoned, and counts as a failed attempt.
+        """
+        lease = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.sync_job_lease', default='60'))
+        stale = self.search([
+            ('state', '=', 'running'),
+            ('started_at', '<', datetime.now() - timedelta(minutes=lease)),
+        ])
+        if stale:
+            stale._mark_failed(_("Worker did not finish within %s minutes") % lease)
+        return stale
+
+    def _run_claimed_job(self, job_id):
+        """Execute a claimed job on a fresh cursor and record its outcome"""
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            job = env[self._name].browse(job_id)
+            try:
+                job._mark_done(job._execute())
+            except Exception as e:
+                _logger.error(f"Sync job {job_id} failed: {str(e)}")
+                cr.rollback()
+                job = env[self._name].browse(job_id)
+                # Errors may be wrapped by the sync, only a paused server puts the job back
+                unavailable = _find_unavailable_error(e)
+                health = job.user_id._get_manictime_server_health()
+                if unavailable or health.is_open():
+                    job._mark_paused(str(e), getattr(unavailable, 'retry_at', None) or health.retry_at())
+                else:
+                    job._mark_failed(str(e))
+            if job.notify:
+                try:
+                    job._notify_progress()
+                except Exception as notify_error:
+                    _logger.error(f"Error reporting the progress of sync job {job_id}: {str(notify_error)}")
+
+    def _notify_progress(self):
+        """Push the progress of the user's button-started sync round to the user
+
+        The round is made of the user's jobs flagged with notify. Once none
+        of them is open, a summary is sent and the flags are cleared.
+        """
+        self.ensure_one()
+        round_jobs = self.search([('user_id', '=', self.user_id.id), ('notify', '=', True)])
+        open_jobs = round_jobs.filtered(lambda job: job.state in OPEN_STATES)
+        done_jobs = round_jobs.filtered(lambda job: job.state == 'done')
+        timelines_done = len(done_jobs.filtered(lambda job: job.job_type == 'timeline'))
+        activities = sum(done_jobs.filtered(lambda job: job.job_type == 'timeline').mapped('activity_count'))
+        errors = len(round_jobs.filtered('last_error'))
+
+        if self.job_type == 'timeline':
+            subject = self.timeline_id.name
+        else:
+            subject = dict(self._fields['job_type']._description_selection(self.env))[self.job_type]
+        if self.state == 'done':
+            if self.job_type == 'tags':
+                detail = _('%s: %s tag combinations') % (subject, self.activity_count)
+            elif self.job_type == 'timeline':
+                detail = _('%s: %s activities') % (subject, self.activity_count)
+            else:
+                detail = _('%s refreshed') % subject
+        elif self.state == 'failed':
+            detail = _('%s failed: %s') % (subject, self.last_error)
+        else:
+            detail = _('%s failed, retrying: %s') % (subject, self.last_error)
+
+        if open_jobs:
+            title = _('ManicTime Sync in Progress')
+            message = _('%s\n%s timelines done, %s activities, %s errors, %s jobs left') % (
+                detail, timelines_done, activities, errors, len(open_jobs))
+        else:
+            title = _('ManicTime Sync Complete')
+            message = _('%s\n%s timelines synced, %s activities, %s errors') % (
+                detail, timelines_done, activities, errors)
+            round_jobs.write({'notify': False})
+
+        self.user_id._bus_send('simple_notification', {
+            'title': title,
+            'message': message,
+            'type': 'danger' if self.state != 'done' else ('info' if open_jobs else 'success'),
+            'sticky': not open_jobs and bool(errors),
+        })
+
+    def _worker_loop(self, worker, deadline=None, partition=None, partitions=1):
+        """Claim and run jobs one at a time until the queue has no due job
+
+        No new job is claimed once the deadline (time.monotonic) has passed,
+        the job in progress is always finished and committed.
+        """
+        while deadline is None or time.monotonic() < deadline:
+            with self.pool.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                job = env[self._name]._claim(worker, partition=partition, partitions=partitions)
+                job_id = job.id
+            if not job_id:
+                return
+            self._run_claimed_job(job_id)
+
+    @api.model
+    def process_queue(self, workers=None, time_budget=None, cron=None, partition=None):
+        """Run the queue with a pool of worker threads, each on its own cursor
+
+        Every job commits on its own, so the job states, timeline watermarks
+        and change ids are the checkpoint of the run. When the time budget
+        runs out with jobs left, the given cron is triggered to continue
+        where this run stopped.
+
+        Args:
+            workers: number of workers (default: manictime_server.sync_workers)
+            time_budget: seconds after which no new job is claimed
+                         (default: manictime_server.cron_time_budget)
+            cron: ir.cron record to trigger to continue the run
+            partition: only run the jobs of users in this hash partition
+                       (out of manictime_server.sync_partitions)
+
+        Returns:
+            bool: True if the queue was drained of due jobs
+        """
+        param = self.env['ir.config_parameter'].sudo()
+        if workers is None:
+            workers = int(param.get_param('manictime_server.sync_workers', default='2'))
+        workers = max(1, workers)
+        if time_budget is None:
+            time_budget = int(param.get_param(
+                'manictime_server.cron_time_budget', default=DEFAULT_TIME_BUDGET))
+        deadline = time.monotonic() + time_budget if time_budget and time_budget > 0 else None
+        partitions = self._get_partition_count()
+        if partition is not None:
+            partition = partition % partitions
+
+        self._requeue_stale()
+        # Workers use their own cursors, they must see what this transaction did
+        self.env.cr.commit()
+
+        threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                args=(f"{threading.current_thread().name}/{index}", deadline, partition, partitions),
+                name=f"manictime_sync_worker_{partition or 0}_{index}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        # The workers committed on their own cursors
+        self.invalidate_model()
+        due = self.search_count([
+            ('state', '=', 'pending'),
+            ('next_attempt', '<=', fields.Datetime.now()),
+        ])
+        if cron:
+            if due:
+                _logger.info(f"Time budget of {time_budget}s used up with {due} sync jobs left, continuing")
+                cron._trigger()
+            else:
+                # Come back for the next scheduled retry
+                retry = self.search([('state', '=', 'pending')], order='next_attempt', limit=1)
+                if retry:
+                    cron._trigger(at=retry.next_attempt)
+        return not due
+
+    @api.model
+    def _gc_done_jobs(self, days=7):
+        """Delete finished jobs older than the given number of days"""
+        old_jobs = self.search([
+            ('state', '=', 'done'),
+            ('date_done', '<', datetime.now() - timedelta(days=days)),
+        ])
+        old_jobs.unlink()
+        return len(old_jobs)
+
+    @api.model
+    def _get_partition_count(self):
+        return max(1, int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.sync_partitions', default='1')))
+
+    @api.model
+    def _update_partition_crons(self):
+        """Create or remove the job crons of partitions 1 to N-1
+
+        Partition 0 is run by the main job cron. Odoo runs different crons in
+        parallel on multi-worker deployments, so every partition gets a cron
+        of its own.
+        """
+        main_cron = self.env.ref('manictime_server.ir_cron_manictime_sync_jobs')
+        partitions = self._get_partition_count()
+        Cron = self.env['ir.cron'].sudo()
+        existing = Cron.with_context(active_test=False).search([
+            ('model_id', '=', main_cron.model_id.id),
+            ('code', '=like', 'model.cron_process_sync_jobs(partition=%'),
+        ])
+        wanted = {self._partition_cron_code(index): index for index in range(1, partitions)}
+        existing.filtered(lambda cron: cron.code not in wanted).unlink()
+        for code, index in wanted.items():
+            if code not in existing.mapped('code'):
+                Cron.create({
+                    'name': f"{main_cron.name} (partition {index})",
+                    'model_id': main_cron.model_id.id,
+                    'state': 'code',
+                    'code': code,
+                    'interval_number': main_cron.interval_number,
+                    'interval_type': main_cron.interval_type,
+                    'active': main_cron.active,
+                })
+
+    @api.model
+    def _trigger_partition_crons(self):
+        """Wake up the job crons of all partitions, to run them in parallel"""
+        crons = self.env.ref('manictime_server.ir_cron_manictime_sync_jobs')
+        crons |= self.env['ir.cron'].sudo().search([
+            ('code', 'in', [self._partition_cron_code(index) for index in range(1, self._get_partition_count())]),
+        ])
+        for cron in crons:
+            cron._trigger()
+
+    @api.model
+    def _partition_cron_code(self, partition):
+        return f"model.cron_process_sync_jobs(partition={partition})"
+
+    @api.model
+    def cron_process_sync_jobs(self, partition=None, time_budget=None):
+        """Cron job method to run the sync job queue within a time budget
+
+        Without a partition, the main job cron runs partition 0 when the
+        users are split into several partitions, and every job otherwise.
+        """
+        if partition is None and self._get_partition_count() > 1:
+            partition = 0
+        cron = self.env['ir.cron']
+        if partition:
+            cron = cron.sudo().search([('code', '=', self._partition_cron_code(partition))], limit=1)
+        return self.process_queue(
+            time_budget=time_budget,
+            cron=cron or self.env.ref('manictime_server.ir_cron_manictime_sync_jobs'),
+            partition=partition,
+        )
+
+    def action_retry(self):
+        """Put failed jobs back in the queue"""
+        failed = self.filtered(lambda job: job.state == 'failed')
+        # A user or timeline may have been enqueued again since the job failed
+        open_keys = {
+            (job.user_id.id, job.job_type, job.timeline_id.id)
+            for job in self.search([('state', 'in', OPEN_STATES), ('user_id', 'in', failed.user_id.ids)])
+        }
+        failed.filtered(lambda job: (job.user_id.id, job.job_type, job.timeline_id.id) not in open_keys).write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt': fields.Datetime.now(),
+        })
+        self.env.ref('manictime_server.ir_cron_manictime_sync_jobs')._trigger()
+        return True
@@ -0,0 +1,52 @@
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Advisory lock namespaces (first key of the two-key lock), one per kind of resource
+LOCK_NAMESPACE_USER = 0x4D540001
+LOCK_NAMESPACE_TIMELINE = 0x4D540002
+# Held by the transaction claiming a job of the user, see manictime.sync.job._claim
+LOCK_NAMESPACE_CLAIM = 0x4D540003
+
+
+class ManicTimeSyncLock(models.AbstractModel):
+    _name = 'manictime.sync.lock'
+    _description = 'ManicTime Sync Locks'
+
+    @api.model
+    def _try_lock(self, namespace, resource_id):
+        """Try to take a transaction-level advisory lock, without waiting
+
+        The lock is released when the current transaction commits or rolls
+        back, so a crashed sync can never leave it behind.
+
+        Returns:
+            bool: True if the lock is held by this transaction
+        """
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (namespace, resource_id))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def try_lock_user(self, user_id):
+        """Lock the timelines and tags refresh of a user
+
+        Returns:
+            bool: False if another transaction is syncing the user
+        """
+        locked = self._try_lock(LOCK_NAMESPACE_USER, user_id)
+        if not locked:
+            _logger.info(f"ManicTime sync of user {user_id} is already running elsewhere")
+        return locked
+
+    @api.model
+    def try_lock_timeline(self, timeline_id):
+        """Lock the activity sync of a timeline
+
+        Returns:
+            bool: False if another transaction is syncing the timeline
+        """
+        locked = self._try_lock(LOCK_NAMESPACE_TIMELINE, timeline_id)
+        if not locked:
+            _logger.info(f"ManicTime sync of timeline {timeline_id} is already running elsewhere")
+        return locked
@@ -0,0 +1,195 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class ManicTimeSyncPlan(models.TransientModel):
+    _name = 'manictime.sync.plan'
+    _description = 'ManicTime Sync Plan'
+
+    def _default_user_ids(self):
+        configs = self.env['manictime.config'].sudo().search([('token_expiry', '>', fields.Datetime.now())])
+        return configs.mapped('user_id').filtered('manictime_enabled')
+
+    user_ids = fields.Many2many(
+        'res.users',
+        string='Users',
+        default=_default_user_ids,
+        help='Users whose selected timelines are planned. Defaults to the users with valid ManicTime authentication'
+    )
+    line_ids = fields.One2many(
+        'manictime.sync.plan.line',
+        'plan_id',
+        string='Timelines',
+        readonly=True
+    )
+    max_requests = fields.Integer(
+        string='Max Requests',
+        help='Refuse to start the sync if it needs more requests than this. 0 means no limit'
+    )
+    max_rows = fields.Integer(
+        string='Max Activities',
+        help='Refuse to start the sync if it is expected to fetch more activities than this. 0 means no limit'
+    )
+    max_minutes = fields.Float(
+        string='Max Duration (min)',
+        help='Refuse to start the sync if it is expected to take longer than this. 0 means no limit'
+    )
+    est_requests = fields.Integer(
+        string='Requests',
+        readonly=True,
+        help='Estimated number of requests to the ManicTime server'
+    )
+    est_rows = fields.Integer(
+        string='Activities',
+        readonly=True,
+        help='Estimated number of activities fetched'
+    )
+    est_minutes = fields.Float(
+        string='Duration (min)',
+        readonly=True,
+        help='Estimated duration when run by a single worker, from the sync statistics of the timelines'
+    )
+    timeline_count = fields.Integer(
+        string='Timeline Count',
+        compute='_compute_timeline_count'
+    )
+
+    @api.depends('line_ids')
+    def _compute_timeline_count(self):
+        for plan in self:
+            plan.timeline_count = len(plan.line_ids)
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_plan(self):
+        """Dry run: build the plan and its estimate, without fetching anything"""
+        self.ensure_one()
+        Planner = self.env['manictime.sync.planner']
+        estimate = Planner.estimate(Planner.plan_users(self.user_ids))
+
+        self.line_ids.unlink()
+        self.write({
+            'line_ids': [(0, 0, {
+                'user_id': entry['user'].id,
+                'timeline_id': entry['timeline'].id,
+                'timeline_type': entry['timeline_type'],
+                'mode': entry['mode'],
+                'date_from': entry['date_from'],
+                'date_to': entry['date_to'],
+                'overlap_minutes': entry['overlap'].total_seconds() / 60,
+                'est_requests': entry['requests'],
+                'est_rows': entry['rows'],
+                'est_seconds': entry['seconds'],
+            }) for entry in estimate['entries']],
+            'est_requests': estimate['requests'],
+            'est_rows': estimate['rows'],
+            'est_minutes': estimate['seconds'] / 60,
+        })
+        return self._reopen()
+
+    def _check_caps(self):
+        """Raise if the estimate exceeds one of the caps"""
+        exceeded = []
+        if self.max_requests and self.est_requests > self.max_requests:
+            exceeded.append(_('%s requests (max %s)') % (self.est_requests, self.max_requests))
+        if self.max_rows and self.est_rows > self.max_rows:
+            exceeded.append(_('%s activities (max %s)') % (self.est_rows, self.max_rows))
+        if self.max_minutes and self.est_minutes > self.max_minutes:
+            exceeded.append(_('%.1f minutes (max %.1f)') % (self.est_minutes, self.max_minutes))
+        if exceeded:
+            raise UserError(_("The planned sync exceeds its limits: %s.\n"
+                              "Deselect timelines, narrow the users or raise the limits.") % ', '.join(exceeded))
+
+    def action_start(self):
+        """Enqueue the planned timelines as sync jobs, if the estimate is within the caps"""
+        self.ensure_one()
+        # Plan again, timelines may have been synced since the dry run
+        self.action_plan()
+        if not self.line_ids:
+            raise UserError(_("No selected timeline to sync for these users."))
+        self._check_caps()
+
+        Job = self.env['manictime.sync.job'].sudo()
+        created = Job.enqueue(self.env['res.users'], timelines=self.line_ids.mapped('timeline_id'))
+        Job._trigger_partition_crons()
+        _logger.info(f"Sync plan {self.id}: enqueued {created} timeline jobs, estimated "
+                     f"{self.est_requests} requests, {self.est_rows} activities, {self.est_minutes:.1f} minutes")
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Sync Started'),
+                'message': _('%s timeline sync jobs enqueued, about %s activities expected') %
+                             (created, self.est_rows),
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
+
+
+class ManicTimeSyncPlanLine(models.TransientModel):
+    _name = 'manictime.sync.plan.line'
+    _description = 'ManicTime Sync Plan Line'
+    _order = 'est_seconds desc'
+
+    plan_id = fields.Many2one(
+        'manictime.sync.plan',
+        string='Plan',
+        required=True,
+        ondelete='cascade'
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        readonly=True
+    )
+    timeline_id = fields.Many2one(
+        'manictime.user.timeline',
+        string='Timeline',
+        readonly=True
+    )
+    timeline_type = fields.Char(
+        string='Type',
+        readonly=True
+    )
+    mode = fields.Selection([
+        ('changes', 'Change Feed'),
+        ('window', 'Window'),
+    ], string='Mode', readonly=True,
+        help='Change Feed replays the changes since the last sync, Window fetches all activities of the window')
+    date_from = fields.Datetime(
+        string='From',
+        readonly=True
+    )
+    date_to = fields.Datetime(
+        string='To',
+        readonly=True
+    )
+    overlap_minutes = fields.Float(
+        string='Overlap (min)',
+        readonly=True,
+        help='Overlap of the timeline type policy, already subtracted from the window start'
+    )
+    est_requests = fields.Integer(
+        string='Requests',
+        readonly=True
+    )
+    est_rows = fields.Integer(
+        string='Activities',
+        readonly=True
+    )
+    est_seconds = fields.Float(
+        string='Duration (s)',
+        readonly=True
+    )
@@ -0,0 +1,124 @@
+from odoo import models, api
+import logging
+from datetime import datetime
+
+_logger = logging.getLogger(__name__)
+
+# Estimates used for timelines (and timeline types) without sync history
+DEFAULT_ROWS_PER_DAY = 500.0
+DEFAULT_ROWS_PER_SECOND = 200.0
+DEFAULT_REQUEST_SECONDS = 2.0
+
+# Requests made per user besides the activity requests: tags and timelines listing
+USER_REQUESTS = 2
+
+
+class ManicTimeSyncPlanner(models.AbstractModel):
+    _name = 'manictime.sync.planner'
+    _description = 'ManicTime Sync Planner'
+
+    @api.model
+    def plan_timelines(self, timelines, sync_start, sync_end=None):
+        """Build the sync plan of timelines, before anything is fetched
+
+        Args:
+            timelines: manictime.user.timeline records to sync
+            sync_start: start of the initial window, for timelines without a
+                        watermark (or for all of them with sync_since in the context)
+            sync_end: end of the windows (default: now)
+
+        Returns:
+            list: one dict per timeline with the 'timeline', its 'timeline_type',
+                  the fetch 'mode' ('changes' or 'window'), the window
+                  'date_from' / 'date_to' and the policy 'overlap' applied
+        """
+        sync_end = sync_end or datetime.now()
+        Policy = self.env['manictime.sync.policy']
+        entries = []
+        for timeline in timelines:
+            # An explicit start in the context wins, otherwise resume from the timeline watermark
+            if self.env.context.get('sync_since'):
+                date_from = sync_start
+            else:
+                date_from = timeline._get_sync_start(sync_start)
+            entries.append({
+                'timeline': timeline,
+                'timeline_type': timeline.timeline_type,
+                'mode': 'changes' if timeline.sync_change_id and timeline.get_changes_url() else 'window',
+                'date_from': date_from,
+                'date_to': sync_end,
+                'overlap': Policy.get_overlap(timeline.timeline_type),
+            })
+        return entries
+
+    @api.model
+    def plan_users(self, users):
+        """Build the sync plan of the selected timelines of users
+
+        Returns:
+            list: plan entries (see plan_timelines), with the 'user' added
+        """
+        entries = []
+        for user in users:
+            timelines = user.manictime_timeline_ids.filtered('is_selected')
+            for entry in self.plan_timelines(timelines, user._get_manictime_sync_start()):
+                entry['user'] = user
+                entries.append(entry)
+        return entries
+
+    @api.model
+    def _type_averages(self):
+        """Average sync statistics per timeline type, for timelines without history
+
+        Returns:
+            dict: {timeline_type: (rows_per_day, rows_per_second, request_seconds)}
+        """
+        groups = self.env['manictime.user.timeline'].sudo()._read_group(
+            [('stat_rows_per_day', '>', 0)],
+            ['timeline_type'],
+            ['stat_rows_per_day:avg', 'stat_rows_per_second:avg', 'stat_request_seconds:avg'],
+        )
+        return {
+            timeline_type: (rows_per_day, rows_per_second, request_seconds)
+            for timeline_type, rows_per_day, rows_per_second, request_seconds in groups
+        }
+
+    @api.model
+    def estimate(self, entries):
+        """Estimate the cost of a sync plan from the historical sync statistics
+
+        Every timeline costs one request (the change feed, or the streamed
+        window) and every user two more (tags and timelines listing). Rows
+        are the window length times the rows per day of the timeline, the
+        duration is the request latency plus the rows at the ingest rate.
+        The duration is the serial one, workers run in parallel.
+
+        Returns:
+            dict: 'entries' with 'requests', 'rows' and 'seconds' set on each
+                  entry, and the 'requests', 'rows' and 'seconds' totals
+        """
+        type_averages = self._type_averages()
+        totals = {'requests': 0, 'rows': 0, 'seconds': 0.0}
+
+        users = set()
+        for entry in entries:
+            timeline = entry['timeline']
+            type_average = type_averages.get(entry['timeline_type']) or (None, None, None)
+            rows_per_day = timeline.stat_rows_per_day or type_average[0] or DEFAULT_ROWS_PER_DAY
+            rows_per_second = timeline.stat_rows_per_second or type_average[1] or DEFAULT_ROWS_PER_SECOND
+            request_seconds = timeline.stat_request_seconds or type_average[2] or DEFAULT_REQUEST_SECONDS
+
+            days = max((entry['date_to'] - entry['date_from']).total_seconds(), 0) / 86400.0
+            entry['requests'] = 1
+            entry['rows'] = int(round(days * rows_per_day))
+            entry['seconds'] = request_seconds + entry['rows'] / rows_per_second
+
+            users.add(timeline.user_id.id)
+            totals['requests'] += entry['requests']
+            totals['rows'] += entry['rows']
+            totals['seconds'] += entry['seconds']
+
+        totals['requests'] += USER_REQUESTS * len(users)
+        totals['seconds'] += USER_REQUESTS * DEFAULT_REQUEST_SECONDS * len(users)
+        totals['entries'] = entries
+        return totals
@@ -0,0 +1,40 @@
+from odoo import models, fields, api
+from datetime import timedelta
+
+class ManicTimeSyncPolicy(models.Model):
+    _name = 'manictime.sync.policy'
+    _description = 'ManicTime Sync Policy'
+    _rec_name = 'timeline_type'
+    _order = 'timeline_type'
+
+    timeline_type = fields.Char(
+        string='Timeline Type',
+        required=True,
+        help='Timeline type this policy applies to (e.g., Applications, Web, ComputerUsage)'
+    )
+    overlap_minutes = fields.Integer(
+        string='Overlap (minutes)',
+        default=60,
+        help='How far before the newest synced activity each sync starts, to catch late changes'
+    )
+
+    _sql_constraints = [
+        ('timeline_type_uniq', 'unique(timeline_type)', 'Only one sync policy per timeline type is allowed!')
+    ]
+
+    @api.model
+    def get_overlap(self, timeline_type):
+        """Get the sync overlap for a timeline type
+
+        Falls back to the global overlap setting when no policy exists for the type.
+
+        Returns:
+            timedelta: overlap to subtract from the timeline watermark
+        """
+        policy = self.sudo().search([('timeline_type', '=', timeline_type)], limit=1) if timeline_type else False
+        if policy:
+            minutes = policy.overlap_minutes
+        else:
+            minutes = int(self.env['ir.config_parameter'].sudo().get_param(
+                'manictime_server.sync_overlap', default='60'))
+        return timedelta(minutes=max(minutes, 0))
@@ -1,4 +1,13 @@
 from odoo import models, fields, api
+import logging
+from datetime import datetime, time, timedelta
+
+_logger = logging.getLogger(__name__)
+
+# Weight of the latest sync in the statistics moving averages
+STAT_SMOOTHING = 0.3
+# Syncs with fewer activities measure the request latency rather than the rate
+STAT_MIN_ROWS = 100
 
 class ManicTimeUserTimeline(models.Model):
     _name = 'manictime.user.timeline'
@@ -83,6 +92,10 @@ class ManicTimeUserTimeline(models.Model):
         string='Last Change ID',
         help='ID of the last change in ManicTime'
     )
+    sync_change_id = fields.Char(
+        string='Synced Change ID',
+        help='Change ID up to which activities have been synchronized, used for incremental syncs'
+    )
 
     # Additional fields directly from API
     publish_key = fields.Char(
@@ -108,6 +121,50 @@ class ManicTimeUserTimeline(models.Model):
         string='Last Sync',
         help='When this timeline was last synchronized'
     )
+    sync_watermark = fields.Datetime(
+        string='Sync Watermark',
+        readonly=True,
+        help='Start time of the newest activity committed for this timeline. '
+             'Syncs request activities from here, minus the overlap of the timeline type policy'
+    )
+    backfill_target = fields.Datetime(
+        string='Backfill Until',
+        readonly=True,
+        help='Oldest point in time the historical backfill should import'
+    )
+    backfill_cursor = fields.Datetime(
+        string='Backfilled Down To',
+        readonly=True,
+        help='Everything between this point and the start of the backfill has been imported. '
+             'The next backfill slice continues from here'
+    )
+    backfill_failures = fields.Integer(
+        string='Backfill Slice Failures',
+        readonly=True,
+        help='Runs in a row that failed to import the next backfill slice, it is skipped after '
+             'manictime_server.backfill_max_slice_failures'
+    )
+    backfill_skipped = fields.Text(
+        string='Skipped Backfill Slices',
+        readonly=True,
+        help='Backfill slices given up after repeated failures, one window per line'
+    )
+    # Sync statistics, moving averages the sync planner estimates costs from
+    stat_rows_per_day = fields.Float(
+        string='Activities per Day',
+        readonly=True,
+        help='Average number of activities fetched per day of sync window'
+    )
+    stat_rows_per_second = fields.Float(
+        string='Activities per Second',
+        readonly=True,
+        help='Average fetch and ingest rate of large syncs'
+    )
+    stat_request_seconds = fields.Float(
+        string='Request Latency (s)',
+        readonly=True,
+        help='Average duration of small syncs, dominated by the request latency'
+    )
     activity_count = fields.Integer(
         string='Activities',
         compute='_compute_activity_count',
@@ -190,6 +247,98 @@ class ManicTimeUserTimeline(models.Model):
 
         return url
 
+    def _get_sync_start(self, default_start):
+        """Get the start of the window to request for this timeline
+
+        Args:
+            default_start: start to use when the timeline was never synced
+
+        Returns:
+            datetime: watermark minus the policy overlap, or default_start
+        """
+        self.ensure_one()
+        if not self.sync_watermark:
+            return default_start
+        overlap = self.env['manictime.sync.policy'].get_overlap(self.timeline_type)
+        return self.sync_watermark - overlap
+
+    def _has_pending_changes(self):
+        """Whether the server reports changes not synced yet, from the timelines listing
+
+        Relies on lastChangeId and lastUpdate as stored by the last listing
+        refresh, so no activity request is needed. Timelines never synced,
+        or without any change marker, always count as changed.
+        """
+        self.ensure_one()
+        if not self.last_sync:
+            return True
+        if self.last_change_id and self.sync_change_id:
+            return self.last_change_id != self.sync_change_id
+        if self.last_update:
+            return self.last_update > self.last_sync
+        return True
+
+    def _is_backfill_pending(self):
+        """Whether this timeline still has history to backfill"""
+        self.ensure_one()
+        return bool(self.backfill_target) and (
+            not self.backfill_cursor or self.backfill_cursor > self.backfill_target
+        )
+
+    def _get_backfill_slices(self):
+        """Yield the remaining backfill window as day-sized slices, newest first
+
+        Slices are aligned on (UTC) day boundaries, so the current day is the
+        first and usually partial slice.
+
+        Yields:
+            tuple: (slice_start, slice_end) naive UTC datetimes
+        """
+        self.ensure_one()
+        if not self._is_backfill_pending():
+            return
+        slice_end = self.backfill_cursor or fields.Datetime.now()
+        while slice_end > self.backfill_target:
+            day_start = datetime.combine(slice_end.date(), time.min)
+            if day_start == slice_end:
+                day_start -= timedelta(days=1)
+            slice_start = max(day_start, self.backfill_target)
+            yield slice_start, slice_end
+            slice_end = slice_start
+
+    def _prepare_sync_stats(self, stream):
+        """Fold a finished fetch stream into the sync statistics of the timeline
+
+        Args:
+            stream: TimelineStream of this timeline, fully consumed
+
+        Returns:
+            dict: values to write
+        """
+        self.ensure_one()
+
+        def smooth(current, sample):
+            return sample if not current else current + STAT_SMOOTHING * (sample - current)
+
+        vals = {}
+        # Time the fetch worker was busy with the timeline, including waiting on ingest
+        elapsed = stream.fetch_seconds + stream.blocked_seconds
+        if stream.mode == 'window':
+            days = (stream.plan['date_to'] - stream.plan['date_from']).total_seconds() / 86400.0
+            if days > 0:
+                vals['stat_rows_per_day'] = smooth(self.stat_rows_per_day, stream.records / days)
+        if stream.mode == 'window' and stream.records >= STAT_MIN_ROWS and elapsed > 0:
+            vals['stat_rows_per_second'] = smooth(self.stat_rows_per_second, stream.records / elapsed)
+        elif elapsed > 0:
+            vals['stat_request_seconds'] = smooth(self.stat_request_seconds, elapsed)
+        return vals
+
+    def _update_sync_watermark(self, newest_start):
+        """Move the watermark forward to the newest committed activity start"""
+        for timeline in self:
+            if newest_start and (not timeline.sync_watermark or newest_start > timeline.sync_watermark):
+                timeline.write({'sync_watermark': newest_start})
+
     def get_activities_url(self):
         """Get the activities URL for this timeline"""
         return self.get_link_url('manictime/activities')
@@ -216,6 +365,6 @@ class ManicTimeUserTimeline(models.Model):
         }
 
     def action_sync_timeline(self):
-        """Sync just this timeline"""
+        """Queue a sync of just this timeline"""
         self.ensure_one()
-        return self.user_id.with_context(active_timeline_id=self.id).manictime_sync_data()
+        return self.user_id._request_manictime_sync(timelines=self)
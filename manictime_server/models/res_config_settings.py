@@ -1,4 +1,4 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, _
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -25,4 +25,126 @@ class ResConfigSettings(models.TransientModel):
         help='How many days to look back when syncing activities (max 7 days recommended for Odoo.sh deployments)',
         config_parameter='manictime_server.sync_interval',
         default=7
-    )
\ No newline at end of file
+    )
+
+    manictime_sync_overlap = fields.Integer(
+        string='Sync Overlap (minutes)',
+        help='Default overlap before each timeline watermark, for timeline types without a sync policy',
+        config_parameter='manictime_server.sync_overlap',
+        default=60
+    )
+    manictime_fetch_concurrency = fields.Integer(
+        string='Fetch Concurrency',
+        help='How many timelines of a user are fetched from the ManicTime server in parallel',
+        config_parameter='manictime_server.fetch_concurrency',
+        default=4
+    )
+
+    manictime_pipeline_depth = fields.Integer(
+        string='Pipeline Depth',
+        help='How many activity chunks per timeline may be buffered between fetching and writing',
+        config_parameter='manictime_server.pipeline_depth',
+        default=4
+    )
+
+    manictime_sync_workers = fields.Integer(
+        string='Sync Workers',
+        help='How many sync jobs run in parallel, each on its own database connection',
+        config_parameter='manictime_server.sync_workers',
+        default=2
+    )
+
+    manictime_cron_time_budget = fields.Integer(
+        string='Cron Time Budget (seconds)',
+        help='How long a sync or backfill cron run keeps starting new work before it continues in a new run. '
+             'Keep it below the cron time limit of the hosting platform',
+        config_parameter='manictime_server.cron_time_budget',
+        default=600
+    )
+
+    manictime_sync_partitions = fields.Integer(
+        string='Sync Partitions',
+        help='Users are split into this many hash partitions, each synced by a cron of its own. '
+             'Use more than one on deployments with several cron workers',
+        config_parameter='manictime_server.sync_partitions',
+        default=1
+    )
+
+    manictime_poll_min_interval = fields.Integer(
+        string='Minimum Poll Interval (minutes)',
+        help='Users whose timelines changed since the last sync are polled again after this interval',
+        config_parameter='manictime_server.poll_min_interval',
+        default=15
+    )
+
+    manictime_poll_max_interval = fields.Integer(
+        string='Maximum Poll Interval (minutes)',
+        help='The poll interval of idle users doubles after every poll without changes, up to this interval',
+        config_parameter='manictime_server.poll_max_interval',
+        default=1440
+    )
+
+    manictime_http_max_connections = fields.Integer(
+        string='Connections per Server',
+        help='Keep-alive connections each Odoo process keeps open to a ManicTime server, shared by all users. '
+             'Requests beyond this wait for a free connection',
+        config_parameter='manictime_server.http_max_connections',
+        default=10
+    )
+
+    manictime_cache_max_mb = fields.Integer(
+        string='Response Cache Size (MB)',
+        help='Memory bound of the response cache of each Odoo process, least recently used responses are evicted',
+        config_parameter='manictime_server.cache_max_mb',
+        default=32
+    )
+
+    manictime_cache_ttl_timelines = fields.Integer(
+        string='Timelines Cache Lifetime (seconds)',
+        help='How long the timelines listing of a user is answered from the cache, 0 disables it',
+        config_parameter='manictime_server.cache_ttl_timelines',
+        default=300
+    )
+
+    manictime_cache_ttl_tags = fields.Integer(
+        string='Tags Cache Lifetime (seconds)',
+        help='How long the tag lists of a user are answered from the cache, 0 disables it',
+        config_parameter='manictime_server.cache_ttl_tags',
+        default=3600
+    )
+
+    manictime_cache_dir = fields.Char(
+        string='Response Cache Directory',
+        help='Optional directory of a file cache shared by the Odoo processes of this machine. '
+             'Leave empty to cache in memory only',
+        config_parameter='manictime_server.cache_dir'
+    )
+
+    def action_manictime_cache_stats(self):
+        """Show the response cache counters of this Odoo process"""
+        stats = self.env['res.users']._get_manictime_response_cache().stats()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Response Cache (this process)'),
+                'message': _('%(entries)s responses, %(kb)s KB of %(max_kb)s KB. '
+                             '%(hits)s hits, %(disk_hits)s disk hits, %(misses)s misses (%(ratio)s%%), '
+                             '%(evictions)s evictions, %(expired)s expired') % {
+                    'entries': stats['entries'],
+                    'kb': stats['bytes'] // 1024,
+                    'max_kb': stats['max_bytes'] // 1024,
+                    'hits': stats['hits'],
+                    'disk_hits': stats['disk_hits'],
+                    'misses': stats['misses'],
+                    'ratio': round(stats['hit_ratio'] * 100),
+                    'evictions': stats['evictions'],
+                    'expired': stats['expired'],
+                },
+                'type': 'info',
+            }
+        }
+
+    def set_values(self):
+        super().set_values()
+        self.env['manictime.sync.job'].sudo()._update_partition_crons()
@@ -1,7 +1,21 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import logging
+import os
+import time
+from contextlib import closing
 from datetime import datetime, timedelta
+from ..tools.activity_stream import DEFAULT_CHUNK_SIZE, normalize_activities
+from ..tools.http_pool import DEFAULT_MAX_CONNECTIONS, NOT_MODIFIED, pool_key, use_shared_session
+from ..tools.response_shape import (
+    detect_tags_shape, detect_timelines_shape, extract_by_shape, ui_api_tag_combinations,
+)
+from ..tools.server_health import get_server_health
+from .manictime_server_capability import is_unsupported_error
+from ..tools.response_cache import CachedManicTimeClient, get_response_cache
+from ..tools.timeline_fetch import DEFAULT_FETCH_CONCURRENCY, DEFAULT_PIPELINE_DEPTH, fetch_timelines
+from ..tools.timestamps import to_naive_utc
+from .manictime_sync_job import DEFAULT_TIME_BUDGET
 import uuid
 import hashlib
 # Try to import keyring but don't fail if not available
@@ -271,7 +285,7 @@ class ResUsers(models.Model):
 
             # Create client and try authentication
             try:
-                client = ManicTimeClient(config)
+                client = self._use_manictime_pool(ManicTimeClient(config))
 
                 if self.manictime_auth_type == 'bearer':
                     # Force token refresh
@@ -483,480 +497,530 @@ class ResUsers(models.Model):
             }
 
     def _fetch_manictime_timelines(self, client, timelines=None):
-        """Fetch and store ManicTime timelines"""
-        self.ensure_one()
+        """Fetch and store ManicTime timelines
 
+        The refresh runs in a savepoint: on failure nothing of it is kept and
+        the transaction stays usable for the rest of the sync.
+        """
+        self.ensure_one()
         try:
+            with self.env.cr.savepoint():
+                return self._refresh_manictime_timelines(client, timelines=timelines)
+        except Exception as e:
+            _logger.error(f"Error fetching or storing timelines: {str(e)}")
+            return []
+
+    def _refresh_manictime_timelines(self, client, timelines=None):
+        """Fetch and store ManicTime timelines, errors are raised to _fetch_manictime_timelines"""
+        self.ensure_one()
+
+        listing_url = validators = None
+        if timelines is None:
+            # If timelines weren't provided, fetch them, unless they did not change since the last refresh
+            listing_url = f"{client.config.server_url.rstrip('/')}/api/timelines"
+            timelines, validators = self.env['manictime.http.validator'].sudo().fetch(
+                self, client, listing_url, headers={"Accept": "application/vnd.manictime.v3+json"},
+                conditional=bool(self.manictime_timeline_ids))
+            if timelines is NOT_MODIFIED:
+                return self.manictime_timeline_ids.ids
+
+        # The shape this server answered with before is unwrapped directly, without probing
+        capability = self.env['manictime.server.capability'].sudo()._for_server(client.config.server_url)
+        if listing_url:
+            capability._note_version(validators.get('server'))
+        response = timelines
+        timelines = extract_by_shape(response, capability._get_shape('timelines'))
+        if timelines is None:
+            timelines, shape = detect_timelines_shape(response)
             if timelines is None:
-                # If timelines weren't provided, fetch them
-                timelines = client.get_timelines()
-
-            # Handle various response formats with detailed logging
-            if isinstance(timelines, dict):
-                _logger.info("Timeline response is a dictionary, extracting timeline data")
-                import pprint
-                _logger.info(f"Dictionary keys: {list(timelines.keys())}")
-
-                # Log the first few top-level values
-                for key in list(timelines.keys())[:3]:  # Limit to first 3 keys to prevent log overflow
-                    value = timelines[key]
-                    _logger.info(f"Key: '{key}', Type: {type(value)}")
-                    if isinstance(value, (dict, list)) and value:
-                        _logger.info(f"Value sample for key '{key}': {pprint.pformat(value)[:500]}...")  # Limit output length
-
-                # Handle common response patterns
-                if 'timelines' in timelines:
-                    _logger.info(f"Found 'timelines' key: {type(timelines['timelines'])}")
-                    timelines = timelines.get('timelines', [])
-                elif 'items' in timelines:
-                    _logger.info(f"Found 'items' key: {type(timelines['items'])}")
-                    timelines = timelines.get('items', [])
-                elif 'data' in timelines:
-                    _logger.info(f"Found 'data' key: {type(timelines['data'])}")
-                    timelines = timelines.get('data', [])
-                # Handle response with embedded list in a key that isn't one of the standard options
-                elif any(isinstance(timelines.get(key), list) and timelines.get(key) for key in timelines.keys()):
-                    # Find first key with a non-empty list
-                    list_key = next((key for key in timelines.keys()
-                                   if isinstance(timelines.get(key), list) and timelines.get(key)), None)
-                    if list_key:
-                        _logger.info(f"Using list from non-standard key: '{list_key}'")
-                        timelines = timelines.get(list_key, [])
-                # If we find any object with a timeline ID, try to use that
-                elif 'timelineId' in timelines or 'id' in timelines:
-                    _logger.info("Using dict itself as a single timeline object")
-                    timelines = [timelines]
-                # Other common response patterns - scan for common timeline-related terms
-                elif any(key for key in timelines.keys() if 'timeline' in key.lower()):
-                    timeline_key = next((key for key in timelines.keys() if 'timeline' in key.lower()), None)
-                    _logger.info(f"Found timeline-related key: '{timeline_key}'")
-                    if isinstance(timelines.get(timeline_key), list):
-                        timelines = timelines.get(timeline_key, [])
-                    elif isinstance(timelines.get(timeline_key), dict):
-                        timelines = [timelines.get(timeline_key)]
-                    else:
-                        _logger.warning(f"Timeline key '{timeline_key}' doesn't contain list or dict")
-                        return []
-                else:
-                    _logger.warning("Could not extract timeline data from response")
-                    # For diagnostic purposes, log which keys look like potential candidates
-                    for key, value in timelines.items():
-                        if isinstance(value, (list, dict)):
-                            _logger.info(f"Potential candidate key: '{key}' of type {type(value)}")
-                    return []
-
-            if not isinstance(timelines, list):
-                _logger.warning(f"Expected list of timelines, got {type(timelines)}")
                 return []
+            # An empty listing tells nothing about the shape of a full one
+            if timelines:
+                capability._set_shape('timelines', shape)
 
-            result = []
+        if not isinstance(timelines, list):
+            _logger.warning(f"Expected list of timelines, got {type(timelines)}")
+            return []
 
-            # Process timeline data in a transaction
-            for timeline_data in timelines:
-                try:
-                    if not isinstance(timeline_data, dict):
-                        _logger.warning(f"Invalid timeline data format: {type(timeline_data)}, skipping")
-                        continue
+        result = []
 
-                    try:
-                        # Log the timeline data structure for debugging
-                        import pprint
-                        import json
-
-                        # Create a more concise log with just essential fields
-                        log_data = {
-                            'timelineId': timeline_data.get('timelineId', timeline_data.get('id', 'unknown')),
-                            'timelineKey': timeline_data.get('timelineKey', ''),
-                            'name': timeline_data.get('name', ''),
-                            'deviceDisplayName': timeline_data.get('deviceDisplayName', '')
-                        }
-
-                        # Add schema info if available
-                        if 'schema' in timeline_data and isinstance(timeline_data['schema'], dict):
-                            log_data['schema'] = {
-                                'name': timeline_data['schema'].get('name', ''),
-                                'version': timeline_data['schema'].get('version', '')
-                            }
+        # Process timeline data in a transaction
+        for timeline_data in timelines:
+            try:
+                if not isinstance(timeline_data, dict):
+                    _logger.warning(f"Invalid timeline data format: {type(timeline_data)}, skipping")
+                    continue
 
-                        # Log the complete link structure to help with debugging
-                        if 'links' in timeline_data and isinstance(timeline_data['links'], list):
-                            log_data['links'] = timeline_data['links']
+                try:
+                    # Log the timeline data structure for debugging
+                    import pprint
+                    import json
+
+                    # Create a more concise log with just essential fields
+                    log_data = {
+                        'timelineId': timeline_data.get('timelineId', timeline_data.get('id', 'unknown')),
+                        'timelineKey': timeline_data.get('timelineKey', ''),
+                        'name': timeline_data.get('name', ''),
+                        'deviceDisplayName': timeline_data.get('deviceDisplayName', '')
+                    }
 
-                        # Log in a more easily readable format for debugging
-                        _logger.info(f"Timeline data (summary): {json.dumps(log_data, indent=2)}")
-                    except Exception as log_error:
-                        # If there's an error in logging, don't let it stop processing
-                        _logger.warning(f"Error logging timeline data: {str(log_error)}")
+                    # Add schema info if available
+                    if 'schema' in timeline_data and isinstance(timeline_data['schema'], dict):
+                        log_data['schema'] = {
+                            'name': timeline_data['schema'].get('name', ''),
+                            'version': timeline_data['schema'].get('version', '')
+                        }
 
-                    # Use timelineKey as the primary identifier for timeline records
-                    # This is more reliable and consistent with the API
-                    timeline_key = timeline_data.get('timelineKey')
+                    # Log the complete link structure to help with debugging
+                    if 'links' in timeline_data and isinstance(timeline_data['links'], list):
+                        log_data['links'] = timeline_data['links']
+
+                    # Log in a more easily readable format for debugging
+                    _logger.info(f"Timeline data (summary): {json.dumps(log_data, indent=2)}")
+                except Exception as log_error:
+                    # If there's an error in logging, don't let it stop processing
+                    _logger.warning(f"Error logging timeline data: {str(log_error)}")
+
+                # Use timelineKey as the primary identifier for timeline records
+                # This is more reliable and consistent with the API
+                timeline_key = timeline_data.get('timelineKey')
+
+                # For backward compatibility, still look for other ID fields, but prefer timelineKey
+                timeline_id = (
+                    timeline_key or
+                    timeline_data.get('timelineId') or
+                    timeline_data.get('id') or
+                    timeline_data.get('timeline_id')
+                )
 
-                    # For backward compatibility, still look for other ID fields, but prefer timelineKey
+                # If we still don't have an ID, check for nested structure
+                if not timeline_id and isinstance(timeline_data.get('timeline'), dict):
+                    nested_timeline = timeline_data.get('timeline')
                     timeline_id = (
-                        timeline_key or
-                        timeline_data.get('timelineId') or
-                        timeline_data.get('id') or
-                        timeline_data.get('timeline_id')
+                        nested_timeline.get('timelineKey') or
+                        nested_timeline.get('timelineId') or
+                        nested_timeline.get('id')
                     )
-
-                    # If we still don't have an ID, check for nested structure
-                    if not timeline_id and isinstance(timeline_data.get('timeline'), dict):
-                        nested_timeline = timeline_data.get('timeline')
-                        timeline_id = (
-                            nested_timeline.get('timelineKey') or
-                            nested_timeline.get('timelineId') or
-                            nested_timeline.get('id')
-                        )
-                        _logger.info(f"Extracted ID from nested timeline: {timeline_id}")
-
-                    # If we still don't have an ID, use a hash of the timeline name and device
-                    # This is better than random UUIDs for consistency between syncs
-                    if not timeline_id:
-                        _logger.warning(f"Timeline missing ID, generating a deterministic ID")
-                        name = timeline_data.get('name', '')
-                        device = timeline_data.get('deviceDisplayName', '') or timeline_data.get('deviceName', '')
-                        # Create a deterministic hash based on name and device
-                        hash_source = f"{name}:{device}"
-                        if hash_source.strip(':'):
-                            timeline_id = f"key_{hashlib.md5(hash_source.encode()).hexdigest()[:16]}"
-                        else:
-                            # Last resort - use UUID but log a warning
-                            timeline_id = f"key_{uuid.uuid4().hex[:16]}"
-                            _logger.warning(f"Created UUID-based timeline ID with no identifying information")
-
-                    # Look for existing timeline - prioritize finding by timelineKey if available
-                    if timeline_key:
-                        timeline = self.env['manictime.user.timeline'].search([
-                            ('user_id', '=', self.id),
-                            ('timeline_key', '=', timeline_key)
-                        ], limit=1)
-                        # Fallback to timeline_id if not found by timeline_key
-                        if not timeline:
-                            timeline = self.env['manictime.user.timeline'].search([
-                                ('user_id', '=', self.id),
-                                ('timeline_id', '=', timeline_id)
-                            ], limit=1)
+                    _logger.info(f"Extracted ID from nested timeline: {timeline_id}")
+
+                # If we still don't have an ID, use a hash of the timeline name and device
+                # This is better than random UUIDs for consistency between syncs
+                if not timeline_id:
+                    _logger.warning(f"Timeline missing ID, generating a deterministic ID")
+                    name = timeline_data.get('name', '')
+                    device = timeline_data.get('deviceDisplayName', '') or timeline_data.get('deviceName', '')
+                    # Create a deterministic hash based on name and device
+                    hash_source = f"{name}:{device}"
+                    if hash_source.strip(':'):
+                        timeline_id = f"key_{hashlib.md5(hash_source.encode()).hexdigest()[:16]}"
                     else:
-                        # If no timeline_key is available, search by timeline_id only
+                        # Last resort - use UUID but log a warning
+                        timeline_id = f"key_{uuid.uuid4().hex[:16]}"
+                        _logger.warning(f"Created UUID-based timeline ID with no identifying information")
+
+                # Look for existing timeline - prioritize finding by timelineKey if available
+                if timeline_key:
+                    timeline = self.env['manictime.user.timeline'].search([
+                        ('user_id', '=', self.id),
+                        ('timeline_key', '=', timeline_key)
+                    ], limit=1)
+                    # Fallback to timeline_id if not found by timeline_key
+                    if not timeline:
                         timeline = self.env['manictime.user.timeline'].search([
                             ('user_id', '=', self.id),
                             ('timeline_id', '=', timeline_id)
                         ], limit=1)
+                else:
+                    # If no timeline_key is available, search by timeline_id only
+                    timeline = self.env['manictime.user.timeline'].search([
+                        ('user_id', '=', self.id),
+                        ('timeline_id', '=', timeline_id)
+                    ], limit=1)
+
+                # Make sure we have the timeline_key saved correctly
+                if not timeline_key:
+                    timeline_key = timeline_data.get('key', '')
+                publish_key = timeline_data.get('publishKey', '')
+                update_protocol = timeline_data.get('updateProtocol', '')
+                timestamp = timeline_data.get('timestamp', '')
+
+                # Extract owner information
+                owner_username = ''
+                owner_display_name = ''
+                if isinstance(timeline_data.get('owner'), dict):
+                    owner = timeline_data.get('owner', {})
+                    owner_username = owner.get('username', '')
+                    owner_display_name = owner.get('displayName', '')
+
+                # Extract schema information
+                schema_info = ""
+                schema_name = ""
+                schema_version = ""
+                base_schema_name = ""
+                base_schema_version = ""
+                schema_record_id = False
+                base_schema_record_id = False
+
+                if isinstance(timeline_data.get('schema'), dict):
+                    schema = timeline_data.get('schema', {})
+                    schema_name = schema.get('name', '')
+                    schema_version = schema.get('version', '')
+
+                    # Find or create schema record
+                    if schema_name and schema_version:
+                        schema_record = self.env['manictime.schema'].search([
+                            ('name', '=', schema_name),
+                            ('version', '=', schema_version)
+                        ], limit=1)
+
+                        if not schema_record:
+                            _logger.info(f"Creating new schema record: {schema_name} v{schema_version}")
+                            schema_record = self.env['manictime.schema'].create({
+                                'name': schema_name,
+                                'version': schema_version
+                            })
 
-                    # Make sure we have the timeline_key saved correctly
-                    if not timeline_key:
-                        timeline_key = timeline_data.get('key', '')
-                    publish_key = timeline_data.get('publishKey', '')
-                    update_protocol = timeline_data.get('updateProtocol', '')
-                    timestamp = timeline_data.get('timestamp', '')
-
-                    # Extract owner information
-                    owner_username = ''
-                    owner_display_name = ''
-                    if isinstance(timeline_data.get('owner'), dict):
-                        owner = timeline_data.get('owner', {})
-                        owner_username = owner.get('username', '')
-                        owner_display_name = owner.get('displayName', '')
-
-                    # Extract schema information
-                    schema_info = ""
-                    schema_name = ""
-                    schema_version = ""
-                    base_schema_name = ""
-                    base_schema_version = ""
-                    schema_record_id = False
-                    base_schema_record_id = False
-
-                    if isinstance(timeline_data.get('schema'), dict):
-                        schema = timeline_data.get('schema', {})
-                        schema_name = schema.get('name', '')
-                        schema_version = schema.get('version', '')
-
-                        # Find or create schema record
-                        if schema_name and schema_version:
-                            schema_record = self.env['manictime.schema'].search([
-                                ('name', '=', schema_name),
-                                ('version', '=', schema_version)
+                        schema_record_id = schema_record.id
+
+                    # Process base schema
+                    base_schema = schema.get('baseSchema', {})
+                    if isinstance(base_schema, dict):
+                        base_schema_name = base_schema.get('name', '')
+                        base_schema_version = base_schema.get('version', '')
+
+                        # Find or create base schema record
+                        if base_schema_name and base_schema_version:
+                            base_schema_record = self.env['manictime.schema'].search([
+                                ('name', '=', base_schema_name),
+                                ('version', '=', base_schema_version)
                             ], limit=1)
 
-                            if not schema_record:
-                                _logger.info(f"Creating new schema record: {schema_name} v{schema_version}")
-                                schema_record = self.env['manictime.schema'].create({
-                                    'name': schema_name,
-                                    'version': schema_version
+                            if not base_schema_record:
+                                _logger.info(f"Creating new base schema record: {base_schema_name} v{base_schema_version}")
+                                base_schema_record = self.env['manictime.schema'].create({
+                                    'name': base_schema_name,
+                                    'version': base_schema_version
                                 })
 
-                            schema_record_id = schema_record.id
-
-                        # Process base schema
-                        base_schema = schema.get('baseSchema', {})
-                        if isinstance(base_schema, dict):
-                            base_schema_name = base_schema.get('name', '')
-                            base_schema_version = base_schema.get('version', '')
-
-                            # Find or create base schema record
-                            if base_schema_name and base_schema_version:
-                                base_schema_record = self.env['manictime.schema'].search([
-                                    ('name', '=', base_schema_name),
-                                    ('version', '=', base_schema_version)
-                                ], limit=1)
-
-                                if not base_schema_record:
-                                    _logger.info(f"Creating new base schema record: {base_schema_name} v{base_schema_version}")
-                                    base_schema_record = self.env['manictime.schema'].create({
-                                        'name': base_schema_name,
-                                        'version': base_schema_version
-                                    })
-
-                                base_schema_record_id = base_schema_record.id
-
-                                # Update schema record to reference base schema
-                                if schema_record_id and base_schema_record_id:
-                                    self.env['manictime.schema'].browse(schema_record_id).write({
-                                        'base_schema_id': base_schema_record_id
-                                    })
-
-                            # Format schema info for display
-                            if base_schema_name:
-                                schema_info = f"{base_schema_name} {base_schema_version}"
-
-                        # Add schema name and version to schema info
-                        if schema_name:
-                            if schema_info:
-                                schema_info += f" → {schema_name} {schema_version}"
-                            else:
-                                schema_info = f"{schema_name} {schema_version}"
-
-                    # Extract device information
-                    device_display_name = timeline_data.get('deviceDisplayName', '')
-                    device_name = ''
-                    environment_id_str = ''
-                    environment_record_id = False
-
-                    # Try to extract from homeEnvironment
-                    if isinstance(timeline_data.get('homeEnvironment'), dict):
-                        home_env = timeline_data.get('homeEnvironment', {})
-                        device_name = home_env.get('deviceName', '')
-                        environment_id_str = home_env.get('environmentId', '')
-
-                        # Find or create environment record
-                        if environment_id_str:
-                            environment_record = self.env['manictime.environment'].search([
-                                ('environment_id', '=', environment_id_str)
-                            ], limit=1)
+                            base_schema_record_id = base_schema_record.id
 
-                            if not environment_record:
-                                _logger.info(f"Creating new environment record: {device_name} ({environment_id_str})")
-                                environment_record = self.env['manictime.environment'].create({
-                                    'environment_id': environment_id_str,
-                                    'device_name': device_name or device_display_name or 'Unknown Device',
-                                    'device_display_name': device_display_name,
-                                    'user_id': self.id
+                            # Update schema record to reference base schema
+                            if schema_record_id and base_schema_record_id:
+                                self.env['manictime.schema'].browse(schema_record_id).write({
+                                    'base_schema_id': base_schema_record_id
                                 })
 
-                            environment_record_id = environment_record.id
+                        # Format schema info for display
+                        if base_schema_name:
+                            schema_info = f"{base_schema_name} {base_schema_version}"
 
-                    # Extract timeline type from schema or directly
-                    timeline_type = ''
+                    # Add schema name and version to schema info
                     if schema_name:
-                        if 'ComputerUsage' in schema_name:
-                            timeline_type = 'Computer Usage'
-                        elif 'Applications' in schema_name:
-                            timeline_type = 'Applications'
-                        elif 'Documents' in schema_name:
-                            timeline_type = 'Documents'
-                        elif 'Web' in schema_name:
-                            timeline_type = 'Web'
-                        elif 'Group' in schema_name or 'Generic/Group' in schema_name:
-                            timeline_type = 'Group'
+                        if schema_info:
+                            schema_info += f" → {schema_name} {schema_version}"
                         else:
-                            # Extract the last part of the schema name for type
-                            parts = schema_name.split('/')
-                            if parts:
-                                timeline_type = parts[-1]
-
-                    if not timeline_type:
-                        timeline_type = timeline_data.get('type') or timeline_data.get('timelineType', '')
-
-                    # Set a meaningful name
-                    if device_display_name:
-                        timeline_name = device_display_name
-                    elif device_name:
-                        timeline_name = device_name
+                            schema_info = f"{schema_name} {schema_version}"
+
+                # Extract device information
+                device_display_name = timeline_data.get('deviceDisplayName', '')
+                device_name = ''
+                environment_id_str = ''
+                environment_record_id = False
+
+                # Try to extract from homeEnvironment
+                if isinstance(timeline_data.get('homeEnvironment'), dict):
+                    home_env = timeline_data.get('homeEnvironment', {})
+                    device_name = home_env.get('deviceName', '')
+                    environment_id_str = home_env.get('environmentId', '')
+
+                    # Find or create environment record
+                    if environment_id_str:
+                        environment_record = self.env['manictime.environment'].search([
+                            ('environment_id', '=', environment_id_str)
+                        ], limit=1)
+
+                        if not environment_record:
+                            _logger.info(f"Creating new environment record: {device_name} ({environment_id_str})")
+                            environment_record = self.env['manictime.environment'].create({
+                                'environment_id': environment_id_str,
+                                'device_name': device_name or device_display_name or 'Unknown Device',
+                                'device_display_name': device_display_name,
+                                'user_id': self.id
+                            })
+
+                        environment_record_id = environment_record.id
+
+                # Extract timeline type from schema or directly
+                timeline_type = ''
+                if schema_name:
+                    if 'ComputerUsage' in schema_name:
+                        timeline_type = 'Computer Usage'
+                    elif 'Applications' in schema_name:
+                        timeline_type = 'Applications'
+                    elif 'Documents' in schema_name:
+                        timeline_type = 'Documents'
+                    elif 'Web' in schema_name:
+                        timeline_type = 'Web'
+                    elif 'Group' in schema_name or 'Generic/Group' in schema_name:
+                        timeline_type = 'Group'
                     else:
-                        timeline_name = timeline_data.get('name') or timeline_type or 'Unnamed Timeline'
-
-                    # Extract last update time
-                    last_update = None
-                    if isinstance(timeline_data.get('lastUpdate'), dict):
-                        last_update_data = timeline_data.get('lastUpdate', {})
-                        if 'updatedUtcTime' in last_update_data:
-                            try:
-                                # Parse ISO format datetime
-                                from datetime import datetime
-                                last_update_str = last_update_data.get('updatedUtcTime', '')
-                                # Remove timezone part if present (Odoo handles UTC internally)
-                                if '+' in last_update_str:
-                                    last_update_str = last_update_str.split('+')[0]
-                                last_update = datetime.fromisoformat(last_update_str)
-                            except (ValueError, TypeError):
-                                _logger.warning(f"Could not parse last update time: {last_update_data.get('updatedUtcTime')}")
-
-                    # Extract last change ID
-                    last_change_id = timeline_data.get('lastChangeId', '')
-
-                    # Extract API URLs and prepare link records
-                    timeline_url = ''
-                    activities_url = ''
-                    changes_url = ''
-                    add_changes_url = ''
-                    edit_properties_url = ''
-                    links_to_create = []
-
-                    if isinstance(timeline_data.get('links'), list):
-                        for link in timeline_data.get('links', []):
-                            if isinstance(link, dict):
-                                rel = link.get('rel', '')
-                                href = link.get('href', '')
-
-                                if not rel or not href:
-                                    continue
-
-                                # Store URLs for immediate use
-                                if rel == 'self':
-                                    timeline_url = href
-                                elif rel == 'manictime/activities':
-                                    activities_url = href
-                                elif rel == 'manictime/getchanges':
-                                    changes_url = href
-                                elif rel == 'manictime/addchanges':
-                                    add_changes_url = href
-                                elif rel == 'manictime/editproperties':
-                                    edit_properties_url = href
-
-                                # Collect link data for the manictime.link model
-                                # These will be created after the timeline is created or updated
-                                links_to_create.append({
+                        # Extract the last part of the schema name for type
+                        parts = schema_name.split('/')
+                        if parts:
+                            timeline_type = parts[-1]
+
+                if not timeline_type:
+                    timeline_type = timeline_data.get('type') or timeline_data.get('timelineType', '')
+
+                # Set a meaningful name
+                if device_display_name:
+                    timeline_name = device_display_name
+                elif device_name:
+                    timeline_name = device_name
+                else:
+                    timeline_name = timeline_data.get('name') or timeline_type or 'Unnamed Timeline'
+
+                # Extract last update time
+                last_update = None
+                if isinstance(timeline_data.get('lastUpdate'), dict):
+                    last_update_data = timeline_data.get('lastUpdate', {})
+                    if 'updatedUtcTime' in last_update_data:
+                        try:
+                            # Parse ISO format datetime, converted to naive UTC for Odoo
+                            last_update = to_naive_utc(last_update_data.get('updatedUtcTime'))
+                        except (ValueError, TypeError):
+                            _logger.warning(f"Could not parse last update time: {last_update_data.get('updatedUtcTime')}")
+
+                # Extract last change ID
+                last_change_id = timeline_data.get('lastChangeId', '')
+
+                # Extract API URLs and prepare link records
+                timeline_url = ''
+                activities_url = ''
+                changes_url = ''
+                add_changes_url = ''
+                edit_properties_url = ''
+                links_to_create = []
+
+                if isinstance(timeline_data.get('links'), list):
+                    for link in timeline_data.get('links', []):
+                        if isinstance(link, dict):
+                            rel = link.get('rel', '')
+                            href = link.get('href', '')
+
+                            if not rel or not href:
+                                continue
+
+                            # Store URLs for immediate use
+                            if rel == 'self':
+                                timeline_url = href
+                            elif rel == 'manictime/activities':
+                                activities_url = href
+                            elif rel == 'manictime/getchanges':
+                                changes_url = href
+                            elif rel == 'manictime/addchanges':
+                                add_changes_url = href
+                            elif rel == 'manictime/editproperties':
+                                edit_properties_url = href
+
+                            # Collect link data for the manictime.link model
+                            # These will be created after the timeline is created or updated
+                            links_to_create.append({
+                                'rel': rel,
+                                'href': href,  # Raw href from API response
+                                'pattern': None  # Will be calculated later using timeline_key
+                            })
+
+                # Log the most important URLs to help with debugging
+                if activities_url:
+                    _logger.info(f"Activities URL for timeline {timeline_id}: {activities_url}")
+
+                # Prepare data for update/create
+                data = {
+                    'timeline_key': timeline_key,
+                    'timeline_type': timeline_type,
+                    'device_display_name': device_display_name,
+                    'owner_username': owner_username,
+                    'owner_display_name': owner_display_name,
+                    'publish_key': publish_key,
+                    'update_protocol': update_protocol,
+                    'timestamp': timestamp,
+                    'last_change_id': last_change_id,
+                }
+
+                # Add environment_id_str for backward compatibility
+                if environment_id_str:
+                    data['environment_id_str'] = environment_id_str
+
+                # Add relationship fields
+                if schema_record_id:
+                    data['schema_id'] = schema_record_id
+                if environment_record_id:
+                    data['environment_id'] = environment_record_id
+
+                # Add last_update if it was successfully parsed
+                if last_update:
+                    data['last_update'] = last_update
+
+                # Create or update the timeline
+                if timeline:
+                    # Update the existing timeline
+                    timeline.write(data)
+                    timeline_id = timeline.id
+                    result.append(timeline_id)
+                else:
+                    # Get the user configuration to check for timeline default settings
+                    config = self.env['manictime.config'].sudo().search([
+                        ('user_id', '=', self.id)
+                    ], limit=1)
+
+                    # Use the config default if available, otherwise default to True (opt-out)
+                    # More reliable to use the config model directly
+                    default_selected = config.sync_by_default if config else True
+
+                    data.update({
+                        'user_id': self.id,
+                        'timeline_id': timeline_id,  # Legacy field
+                        'is_selected': default_selected,
+                    })
+
+                    new_timeline = self.env['manictime.user.timeline'].create(data)
+                    timeline_id = new_timeline.id
+                    result.append(timeline_id)
+
+                # Process capabilities after the timeline is available
+                if links_to_create:
+                    # First, get the timeline object
+                    timeline_obj = self.env['manictime.user.timeline'].browse(timeline_id)
+
+                    # Disconnect from all existing links
+                    if timeline_obj.link_ids:
+                        timeline_obj.write({'link_ids': [(5, 0, 0)]})  # Clear all links
+
+                    # Process each link capability
+                    for link_data in links_to_create:
+                        try:
+                            rel = link_data['rel']
+                            href = link_data['href']
+
+                            if not rel or not href:
+                                continue
+
+                            # Extract a pattern from the URL by replacing the timeline key with a placeholder
+                            # Using the Link model's helper method for consistency
+                            pattern = self.env['manictime.link'].extract_url_pattern(href, timeline_obj.timeline_key)
+
+                            # Look for an existing capability with this rel and pattern
+                            existing_link = self.env['manictime.link'].search([
+                                ('rel', '=', rel),
+                                ('pattern', '=', pattern)
+                            ], limit=1)
+
+                            if existing_link:
+                                # Add this timeline to the existing capability
+                                existing_link.write({
+                                    'timeline_ids': [(4, timeline_id)]
+                                })
+                            else:
+                                # Create a new capability and link it to this timeline
+                                new_link = self.env['manictime.link'].create({
                                     'rel': rel,
-                                    'href': href,  # Raw href from API response
-                                    'pattern': None  # Will be calculated later using timeline_key
+                                    'pattern': pattern,
+                                    'timeline_ids': [(4, timeline_id)]
                                 })
+                                _logger.info(f"Created new API capability: {rel} with pattern {pattern}")
+                        except Exception as link_error:
+                            _logger.warning(f"Failed to process capability {link_data.get('rel', 'unknown')} for timeline {timeline_id}: {str(link_error)}")
+
+            except Exception as timeline_error:
+                _logger.error(f"Error processing timeline: {str(timeline_error)}")
+                # The listing must be downloaded again next time, not answered with 304
+                validators = None
+                # Continue with other timelines, don't let one failure abort all
+                continue
 
-                    # Log the most important URLs to help with debugging
-                    if activities_url:
-                        _logger.info(f"Activities URL for timeline {timeline_id}: {activities_url}")
-
-                    # Prepare data for update/create
-                    data = {
-                        'timeline_key': timeline_key,
-                        'timeline_type': timeline_type,
-                        'device_display_name': device_display_name,
-                        'owner_username': owner_username,
-                        'owner_display_name': owner_display_name,
-                        'publish_key': publish_key,
-                        'update_protocol': update_protocol,
-                        'timestamp': timestamp,
-                        'last_change_id': last_change_id,
-                    }
+        if listing_url and validators is not None:
+            self.env['manictime.http.validator'].sudo().save(self, listing_url, validators)
+        return result
 
-                    # Add environment_id_str for backward compatibility
-                    if environment_id_str:
-                        data['environment_id_str'] = environment_id_str
-
-                    # Add relationship fields
-                    if schema_record_id:
-                        data['schema_id'] = schema_record_id
-                    if environment_record_id:
-                        data['environment_id'] = environment_record_id
-
-                    # Add last_update if it was successfully parsed
-                    if last_update:
-                        data['last_update'] = last_update
-
-                    # Create or update the timeline
-                    if timeline:
-                        # Update the existing timeline
-                        timeline.write(data)
-                        timeline_id = timeline.id
-                        result.append(timeline_id)
-                    else:
-                        # Get the user configuration to check for timeline default settings
-                        config = self.env['manictime.config'].sudo().search([
-                            ('user_id', '=', self.id)
-                        ], limit=1)
+    @api.model
+    def _use_manictime_pool(self, client):
+        """Send the client's requests over the shared keep-alive pool of its server"""
+        max_connections = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.http_max_connections', default=DEFAULT_MAX_CONNECTIONS))
+        return use_shared_session(client, max_connections=max(1, max_connections))
 
-                        # Use the config default if available, otherwise default to True (opt-out)
-                        # More reliable to use the config model directly
-                        default_selected = config.sync_by_default if config else True
-
-                        data.update({
-                            'user_id': self.id,
-                            'timeline_id': timeline_id,  # Legacy field
-                            'is_selected': default_selected,
-                        })
-
-                        new_timeline = self.env['manictime.user.timeline'].create(data)
-                        timeline_id = new_timeline.id
-                        result.append(timeline_id)
-
-                    # Process capabilities after the timeline is available
-                    if links_to_create:
-                        # First, get the timeline object
-                        timeline_obj = self.env['manictime.user.timeline'].browse(timeline_id)
-
-                        # Disconnect from all existing links
-                        if timeline_obj.link_ids:
-                            timeline_obj.write({'link_ids': [(5, 0, 0)]})  # Clear all links
-
-                        # Process each link capability
-                        for link_data in links_to_create:
-                            try:
-                                rel = link_data['rel']
-                                href = link_data['href']
-
-                                if not rel or not href:
-                                    continue
-
-                                # Extract a pattern from the URL by replacing the timeline key with a placeholder
-                                # Using the Link model's helper method for consistency
-                                pattern = self.env['manictime.link'].extract_url_pattern(href, timeline_obj.timeline_key)
-
-                                # Look for an existing capability with this rel and pattern
-                                existing_link = self.env['manictime.link'].search([
-                                    ('rel', '=', rel),
-                                    ('pattern', '=', pattern)
-                                ], limit=1)
-
-                                if existing_link:
-                                    # Add this timeline to the existing capability
-                                    existing_link.write({
-                                        'timeline_ids': [(4, timeline_id)]
-                                    })
-                                else:
-                                    # Create a new capability and link it to this timeline
-                                    new_link = self.env['manictime.link'].create({
-                                        'rel': rel,
-                                        'pattern': pattern,
-                                        'timeline_ids': [(4, timeline_id)]
-                                    })
-                                    _logger.info(f"Created new API capability: {rel} with pattern {pattern}")
-                            except Exception as link_error:
-                                _logger.warning(f"Failed to process capability {link_data.get('rel', 'unknown')} for timeline {timeline_id}: {str(link_error)}")
+    @api.model
+    def _get_manictime_server_health(self):
+        """Concurrency limit and circuit breaker of the ManicTime server in this process"""
+        max_connections = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.http_max_connections', default=DEFAULT_MAX_CONNECTIONS))
+        return get_server_health(pool_key(self.get_manictime_server_url()), max(1, max_connections))
 
-                except Exception as timeline_error:
-                    _logger.error(f"Error processing timeline: {str(timeline_error)}")
-                    # Continue with other timelines, don't let one failure abort all
-                    continue
+    @api.model
+    def _get_manictime_response_cache(self):
+        """Response cache of this process, sized by the cache settings"""
+        params = self.env['ir.config_parameter'].sudo()
+        cache_dir = params.get_param('manictime_server.cache_dir')
+        return get_response_cache(
+            max_bytes=int(params.get_param('manictime_server.cache_max_mb', default='32')) * 1024 * 1024,
+            disk_path=os.path.join(cache_dir, f'{self.env.cr.dbname}.sqlite') if cache_dir else None,
+        )
 
-            return result
+    def _get_manictime_client(self):
+        """Build a ManicTime client from the user's stored credentials"""
+        self.ensure_one()
 
-        except Exception as e:
-            _logger.error(f"Error fetching or storing timelines: {str(e)}")
-            return []
+        # Import ManicTime client libraries
+        import sys
+        import os
+        server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        manictime_path = os.path.join(server_path, 'manictime')
+        if manictime_path not in sys.path:
+            sys.path.append(manictime_path)
+
+        # Now import from manictime library
+        from client import ManicTimeClient
+        from configuration import Config
+
+        # Get the stored secret or use token
+        secret = self._get_manictime_secret()
+        server_url = self.get_manictime_server_url()
+
+        if self.manictime_auth_type == 'bearer':
+            # Get the access token from secure storage
+            access_token = self.env['manictime.token.storage'].get_secret(self.id, 'access_token')
+
+            config = Config(
+                server_url=server_url,
+                auth_type=self.manictime_auth_type,
+                token=access_token,
+                timeout=30
+            )
+        else:  # ntlm
+            config = Config(
+                server_url=server_url,
+                auth_type=self.manictime_auth_type,
+                username=self.manictime_client_id_username,
+                password=secret,
+                timeout=30
+            )
+
+        # Timelines and tag lists are answered from the process response cache
+        params = self.env['ir.config_parameter'].sudo()
+        cache = self._get_manictime_response_cache()
+        ttls = {
+            'timelines': int(params.get_param('manictime_server.cache_ttl_timelines', default='300')),
+            'tags': int(params.get_param('manictime_server.cache_ttl_tags', default='3600')),
+        }
+        client = self._use_manictime_pool(ManicTimeClient(config))
+        return CachedManicTimeClient(client, cache, identity=f"{server_url}|{self.id}", ttls=ttls)
 
     def manictime_sync_all_tags(self):
-        """Sync ALL tag combinations from ManicTime (admin only)"""
+        """Queue a sync of ALL tag combinations from ManicTime (admin only)
+
+        The sync runs as a background job, its progress is pushed to the user.
+        """
         self.ensure_one()
 
         if not self.manictime_enabled:
@@ -985,117 +1049,80 @@ class ResUsers(models.Model):
         if not self._check_manictime_auth():
             return self._manictime_auth_expired_notification()
 
-        # Create a savepoint to roll back to if something goes wrong
-        savepoint_name = f"manictime_sync_tags_{self.id}_{int(datetime.now().timestamp())}"
-        self.env.cr.execute(f"SAVEPOINT {savepoint_name}")
+        return self.env['manictime.sync.job'].request_sync(self, job_type='tags')
 
-        try:
-            # Import ManicTime client libraries
-            import sys
-            import os
-            server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            manictime_path = os.path.join(server_path, 'manictime')
-            if manictime_path not in sys.path:
-                sys.path.append(manictime_path)
-
-            # Now import from manictime library
-            from client import ManicTimeClient, CachedManicTimeClient
-            from configuration import Config
-
-            # Get the stored secret or use token
-            secret = self._get_manictime_secret()
-            server_url = self.get_manictime_server_url()
-
-            if self.manictime_auth_type == 'bearer':
-                # Get the access token from secure storage
-                access_token = self.env['manictime.token.storage'].get_secret(self.id, 'access_token')
+    def _sync_all_manictime_tags(self, client):
+        """Sync the tag combinations of all users and teams
 
-                config = Config(
-                    server_url=server_url,
-                    auth_type=self.manictime_auth_type,
-                    token=access_token,
-                    timeout=30
-                )
-            else:  # ntlm
-                config = Config(
-                    server_url=server_url,
-                    auth_type=self.manictime_auth_type,
-                    username=self.manictime_client_id_username,
-                    password=secret,
-                    timeout=30
-                )
-
-            # Use cached client for better performance
-            client = CachedManicTimeClient(config)
-
-            _logger.info("Fetching all tag combinations including team and user data")
+        Returns:
+            list: the tag combinations synced
 
-            try:
-                # Use the UI API endpoint that returns actual tag data
-                url = f"{client.config.server_url}/ui-api/analytics/timelines/tagEditorTags"
-                headers = {"Accept": "application/json"}
-                
-                _logger.info(f"Fetching all tags from UI API endpoint: {url}")
+        Raises:
+            Exception: if the tags cannot be fetched or stored
+        """
+        self.ensure_one()
+        _logger.info("Fetching all tag combinations including team and user data")
+
+        # Use the UI API endpoint that returns actual tag data
+        url = f"{client.config.server_url}/ui-api/analytics/timelines/tagEditorTags"
+        headers = {"Accept": "application/json"}
+
+        _logger.info(f"Fetching all tags from UI API endpoint: {url}")
+        tag_combinations_response = client._make_request(url, headers=headers)
+
+        # Fall back to legacy endpoint if UI API returns empty results
+        if isinstance(tag_combinations_response, dict) and 'tagCombinations' in tag_combinations_response:
+            if not tag_combinations_response.get('tagCombinations'):
+                _logger.warning("UI API returned empty tagCombinations list, falling back to legacy endpoint")
+                # Fall back to legacy endpoint
+                url = f"{client.config.server_url}/api/tagcombinationlist?getAll=true"
+                headers = {"Accept": "application/vnd.manictime.v3+json"}
                 tag_combinations_response = client._make_request(url, headers=headers)
-                
-                # Fall back to legacy endpoint if UI API returns empty results
-                if isinstance(tag_combinations_response, dict) and 'tagCombinations' in tag_combinations_response:
-                    if not tag_combinations_response.get('tagCombinations'):
-                        _logger.warning("UI API returned empty tagCombinations list, falling back to legacy endpoint")
-                        # Fall back to legacy endpoint
-                        url = f"{client.config.server_url}/api/tagcombinationlist?getAll=true"
-                        headers = {"Accept": "application/vnd.manictime.v3+json"}
-                        tag_combinations_response = client._make_request(url, headers=headers)
-                
-                tag_combinations = self._sync_manictime_tags(client, force_response=tag_combinations_response)
 
-                # Show success notification
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Tags Synchronized'),
-                        'message': _('Successfully synchronized %s tag combinations from all users and teams.') % len(tag_combinations),
-                        'type': 'success',
-                        'next': {
-                            'type': 'ir.actions.act_window_close',
-                            'infos': {'effect': {'type': 'reload'}}
-                        }
-                    }
-                }
+        return self._sync_manictime_tags(client, force_response=tag_combinations_response)
 
-            except Exception as tag_error:
-                _logger.error(f"Error syncing all tags: {str(tag_error)}")
-                # Roll back to savepoint
-                self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+    def action_manictime_sync_data(self):
+        """Queue a sync of the user's ManicTime data and return at once
 
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Error'),
-                        'message': _('Failed to sync all tags: %s') % str(tag_error),
-                        'type': 'danger',
-                    }
-                }
+        The timelines and tags are refreshed and the changed timelines
+        synced. The sync runs as background jobs, its progress is pushed to
+        the user.
+        """
+        return self._request_manictime_sync()
 
-        except Exception as e:
-            _logger.error(f"Error syncing all tags: {str(e)}")
-            # Roll back to savepoint
-            self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+    def _request_manictime_sync(self, timelines=None):
+        """Queue a sync of the user, or of the given timelines of the user only
 
+        Returns:
+            dict: notification action
+        """
+        self.ensure_one()
+
+        if not self.manictime_enabled:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Error'),
-                    'message': _('Unexpected error when syncing all tags: %s') % str(e),
+                    'message': _('ManicTime integration is not enabled for this user.'),
                     'type': 'danger',
                 }
             }
 
-    def manictime_sync_data(self):
-        """Sync all ManicTime data - timelines, tags, and activities"""
+        if not self._check_manictime_auth():
+            return self._manictime_auth_expired_notification()
+
+        users = self if timelines is None else self.env['res.users']
+        return self.env['manictime.sync.job'].request_sync(users, timelines=timelines)
+
+    def _manictime_sync_data(self):
+        """Sync all ManicTime data - timelines, tags, and activities, synchronously
+
+        The tags and timelines refresh is committed on the current cursor
+        before the timelines are synced in transactions of their own, so the
+        caller must own the cursor (CLI runner). Requests and buttons queue
+        the sync instead (see action_manictime_sync_data).
+        """
         from datetime import datetime, timedelta
         
         self.ensure_one()
@@ -1118,79 +1145,24 @@ class ResUsers(models.Model):
         if not self._check_manictime_auth():
             return self._manictime_auth_expired_notification()
 
-        # Check if sync start date is provided in context (for incremental syncs)
-        if self.env.context.get('sync_since'):
-            sync_start = self.env.context.get('sync_since')
-            _logger.info(f"Using provided sync start date from context: {sync_start}")
-        else:
-            # Get configured sync interval from settings
-            if self.env.context.get('from_cron', False):
-                # For cron job execution, cap at 7 days max to avoid timeouts on initial sync
-                # For subsequent syncs, we'll use the last_sync time via sync_since parameter
-                sync_days = 7  # Cap at 7 days for Odoo.sh compatibility 
-                _logger.info(f"Using capped sync interval ({sync_days} days) for cron job execution")
-            else:
-                # For manual syncs, use the configured interval (default 7 days)
-                sync_days = int(self.env['ir.config_parameter'].sudo().get_param(
-                    'manictime_server.sync_interval', default='7'))
-                
-                # Safety cap at 7 days to avoid timeouts
-                if sync_days > 7:
-                    _logger.warning(f"Configured sync interval ({sync_days} days) exceeds recommended maximum (7 days). Capping at 7 days.")
-                    sync_days = 7
+        # Held until the refresh is committed below, so no job refreshes this user concurrently;
+        # the activities are then synced under the locks of their timelines
+        if not self.env['manictime.sync.lock'].try_lock_user(self.id):
+            return self._manictime_sync_running_notification()
 
-            # Calculate sync start time (X days ago, max 7 days)
-            sync_start = datetime.now() - timedelta(days=sync_days)
-            _logger.info(f"Syncing data from {sync_start} ({sync_days} days back)")
+        sync_start = self._get_manictime_sync_start()
 
-        # Create a savepoint to roll back to if something goes wrong
+        # Create a savepoint to roll back the tags and timelines refresh if something goes wrong
         savepoint_name = f"manictime_sync_{self.id}_{int(datetime.now().timestamp())}"
         self.env.cr.execute(f"SAVEPOINT {savepoint_name}")
 
         timelines_count = 0
         tag_combinations_count = 0
         total_activities = 0
+        refresh_committed = False
 
         try:
-            # Import ManicTime client libraries
-            import sys
-            import os
-            # Add the path to the manictime library
-            server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            manictime_path = os.path.join(server_path, 'manictime')
-            if manictime_path not in sys.path:
-                sys.path.append(manictime_path)
-
-            # Now import from manictime library
-            from client import ManicTimeClient, CachedManicTimeClient
-            from configuration import Config
-            from models import Activity, TagCombination
-
-            # Get the stored secret or use token
-            secret = self._get_manictime_secret()
-            server_url = self.get_manictime_server_url()
-
-            if self.manictime_auth_type == 'bearer':
-                # Get the access token from secure storage
-                access_token = self.env['manictime.token.storage'].get_secret(self.id, 'access_token')
-
-                config = Config(
-                    server_url=server_url,
-                    auth_type=self.manictime_auth_type,
-                    token=access_token,
-                    timeout=30
-                )
-            else:  # ntlm
-                config = Config(
-                    server_url=server_url,
-                    auth_type=self.manictime_auth_type,
-                    username=self.manictime_client_id_username,
-                    password=secret,
-                    timeout=30
-                )
-
-            # Use cached client for better performance
-            client = CachedManicTimeClient(config)
+            client = self._get_manictime_client()
 
             # Check if a specific timeline is specified in context
             active_timeline_id = self.env.context.get('active_timeline_id', False)
@@ -1233,202 +1205,23 @@ class ResUsers(models.Model):
                     self.env.cr.execute("ROLLBACK TO SAVEPOINT timeline_sync")
                     # Continue with activities sync
 
+            # The timelines are synced in transactions of their own, which must see the refresh
+            self.env.cr.execute(f"RELEASE SAVEPOINT {savepoint_name}")
+            self.env.cr.commit()
+            refresh_committed = True
+
             # 3. Sync activities for the selected timeline(s)
             if active_timeline_id:
                 # If a specific timeline was requested, only sync that one
                 timelines_to_sync = self.env['manictime.user.timeline'].browse(active_timeline_id)
                 single_timeline = True
             else:
-                # Otherwise get all timelines (not just selected ones)
-                timelines_to_sync = self.manictime_timeline_ids
+                # Otherwise the timelines selected for sync
+                timelines_to_sync = self.manictime_timeline_ids.filtered('is_selected')
                 single_timeline = False
 
-            # Sync each timeline
-            for timeline in timelines_to_sync:
-                try:
-                    # Start a new savepoint for each timeline's activities sync
-                    savepoint_timeline = f"timeline_activities_{timeline.id}"
-                    self.env.cr.execute(f"SAVEPOINT {savepoint_timeline}")
-
-                    _logger.info(f"Syncing timeline {timeline.name} from {sync_start}")
-
-                    # Use timeline_key as the primary identifier for API calls
-                    # This is more reliable and consistent with the API
-                    timeline_identifier = timeline.timeline_key
-
-                    # If timeline_key is not available (old records), fall back to timeline_id
-                    if not timeline_identifier:
-                        timeline_identifier = timeline.timeline_id
-                        _logger.warning(f"Using legacy timeline_id for timeline {timeline.name} - update recommended")
-
-                    # Get the activities URL from the link model
-                    activities_url = timeline.get_activities_url()
-
-                    # Add detailed logging about the timeline and its links
-                    _logger.info(f"Timeline {timeline.name} (ID: {timeline.id}):")
-                    _logger.info(f"  - timeline_key: {timeline.timeline_key}")
-                    _logger.info(f"  - timeline_id (legacy): {timeline.timeline_id}")
-                    _logger.info(f"  - schema: {timeline.schema_id.name if timeline.schema_id else 'None'}")
-                    _logger.info(f"  - environment: {timeline.environment_id.device_name if timeline.environment_id else 'None'}")
-                    _logger.info(f"  - link count: {len(timeline.link_ids)}")
-
-                    # Log the available links
-                    if timeline.link_ids:
-                        _logger.info("Available links:")
-                        for link in timeline.link_ids:
-                            formatted_url = timeline.get_link_url(link.rel)
-                            _logger.info(f"  - {link.rel}: {formatted_url} (pattern: {link.pattern})")
-
-                    _logger.info(f"Getting activities for timeline {timeline.name} using identifier {timeline_identifier} with URL {activities_url}")
-
-                    # Call the API to get activities for the given date range
-                    # Check if the client supports the activities_url parameter
-                    try:
-                        # First try with the activities_url parameter
-                        activities = client.get_activities_for_date_range(
-                            timeline_identifier,
-                            sync_start,
-                            datetime.now(),
-                            activities_url=activities_url
-                        )
-                    except TypeError as e:
-                        if "unexpected keyword argument 'activities_url'" in str(e):
-                            # If the client doesn't support the parameter, call without it
-                            _logger.info(f"Client doesn't support activities_url parameter, using default URL")
-                            activities = client.get_activities_for_date_range(
-                                timeline_identifier,
-                                sync_start,
-                                datetime.now()
-                            )
-                        else:
-                            # Re-raise any other TypeError
-                            raise
-                    
-                    # Handle raw API response that might need additional processing
-                    if isinstance(activities, list) and activities and isinstance(activities[0], dict):
-                        # This is likely raw API response format from the JSON rather than Activity objects
-                        _logger.info(f"Converting raw activity data to Activity objects")
-                        
-                        # Import the Activity model for conversion
-                        try:
-                            import sys, os
-                            server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                            manictime_path = os.path.join(server_path, 'manictime')
-                            if manictime_path not in sys.path:
-                                sys.path.append(manictime_path)
-                            from models import Activity
-                            
-                            # Convert raw dictionary data to Activity objects
-                            processed_activities = []
-                            for act_data in activities:
-                                # Check if we're dealing with the expected format
-                                if 'entityId' in act_data and 'values' in act_data:
-                                    try:
-                                        entity_id = act_data.get('entityId')
-                                        values = act_data.get('values', {})
-                                        
-                                        # Extract time interval info
-                                        time_interval = values.get('timeInterval', {})
-                                        start_time = None
-                                        end_time = None
-                                        
-                                        if time_interval:
-                                            start_str = time_interval.get('start')
-                                            duration = time_interval.get('duration', 0)
-                                            
-                                            if start_str:
-                                                # Parse start time, possibly with timezone
-                                                try:
-                                                    # Try to parse ISO format datetime
-                                                    from datetime import datetime, timedelta
-                                                    
-                                                    # Remove timezone part if present for parsing
-                                                    if '+' in start_str or ('-' in start_str and 'T' in start_str):
-                                                        import re
-                                                        match = re.match(r'(.+)(?:[+-][\d:]+)$', start_str)
-                                                        if match:
-                                                            start_str = match.group(1)
-                                                    
-                                                    # Parse the datetime
-                                                    if 'T' in start_str:
-                                                        start_time = datetime.fromisoformat(start_str.replace('T', ' '))
-                                                    else:
-                                                        start_time = datetime.fromisoformat(start_str)
-                                                    
-                                                    # Calculate end time from duration (in seconds)
-                                                    if duration:
-                                                        end_time = start_time + timedelta(seconds=duration)
-                                                    else:
-                                                        end_time = start_time + timedelta(minutes=1)  # Default to 1 minute
-                                                except Exception as dt_error:
-                                                    _logger.warning(f"Error parsing activity time: {str(dt_error)}")
-                                                    # Skip this activity if we can't parse the times
-                                                    continue
-                                        
-                                        # Create an Activity object
-                                        activity_obj = Activity(
-                                            id=entity_id,
-                                            title=values.get('name', 'Untitled'),
-                                            start=start_time,
-                                            end=end_time,
-                                            application=values.get('application', ''),
-                                            notes=values.get('notes', '')
-                                        )
-                                        
-                                        # Add to our list
-                                        processed_activities.append(activity_obj)
-                                    except Exception as conv_error:
-                                        _logger.warning(f"Error converting activity {act_data.get('entityId')}: {str(conv_error)}")
-                                        continue
-                            
-                            if processed_activities:
-                                _logger.info(f"Converted {len(processed_activities)} raw activities to Activity objects")
-                                activities = processed_activities
-                        except ImportError:
-                            _logger.warning("Failed to import Activity model, using raw data")
-                            # Continue with raw data, our processing method will handle it
-
-                    _logger.info(f"Retrieved {len(activities)} activities for timeline {timeline.name}")
-
-                    # Sync happens in a context that won't trigger validation errors
-                    sync_context = {'calling_method': 'manictime_sync'}
-
-                    # Process activities in smaller batches to avoid large transactions
-                    batch_size = 100
-                    for i in range(0, len(activities), batch_size):
-                        batch = activities[i:i+batch_size]
-
-                        # Create a savepoint for the batch
-                        batch_savepoint = f"activities_batch_{i}"
-                        self.env.cr.execute(f"SAVEPOINT {batch_savepoint}")
-
-                        try:
-                            # Process the batch
-                            for activity in batch:
-                                self.with_context(sync_context).sudo()._create_or_update_activity_from_object(timeline, activity)
-
-                            # Commit the batch
-                            self.env.cr.execute(f"RELEASE SAVEPOINT {batch_savepoint}")
-                        except Exception as batch_error:
-                            _logger.error(f"Error syncing batch of activities (offset {i}): {str(batch_error)}")
-                            # Roll back the batch
-                            self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {batch_savepoint}")
-
-                    # Update last sync time - in a separate transaction
-                    timeline.write({
-                        'last_sync': datetime.now(),
-                    })
-
-                    total_activities += len(activities)
-
-                    # Release the savepoint for this timeline
-                    self.env.cr.execute(f"RELEASE SAVEPOINT {savepoint_timeline}")
-
-                except Exception as timeline_error:
-                    _logger.error(f"Error syncing timeline {timeline.name}: {str(timeline_error)}")
-                    # Roll back to the timeline savepoint
-                    self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_timeline}")
-                    # Continue with other timelines even if one fails
+            activity_count, failures = self._sync_timeline_activities(client, timelines_to_sync, sync_start)
+            total_activities += activity_count
 
             # Update last sync time for the user - in a separate transaction to avoid rollbacks
             # affecting this important information
@@ -1440,9 +1233,6 @@ class ResUsers(models.Model):
             except Exception as write_error:
                 _logger.error(f"Error updating last sync time: {str(write_error)}")
 
-            # Release the main savepoint if everything succeeded
-            self.env.cr.execute(f"RELEASE SAVEPOINT {savepoint_name}")
-
             # Return a success notification with reload
             if single_timeline:
                 # Single timeline sync success message
@@ -1452,7 +1242,7 @@ class ResUsers(models.Model):
                     'params': {
                         'title': _('Timeline Sync Complete'),
                         'message': _('Successfully synced %s activities for timeline "%s"') %
-                                     (total_activities, timeline.name),
+                                     (total_activities, timelines_to_sync.name),
                         'type': 'success',
                         'next': {
                             'type': 'ir.actions.act_window_close',
@@ -1480,8 +1270,9 @@ class ResUsers(models.Model):
         except Exception as e:
             _logger.error(f"Error syncing ManicTime data: {str(e)}")
 
-            # Roll back to main savepoint
-            self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+            # Roll back to main savepoint, the timelines synced so far are committed already
+            if not refresh_committed:
+                self.env.cr.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name}")
 
             # Show error notification with reload
             return {
@@ -1498,9 +1289,375 @@ class ResUsers(models.Model):
                 }
             }
 
+    def _get_manictime_sync_start(self):
+        """Start of the initial sync window, for timelines without a watermark
+
+        Returns:
+            datetime: sync_since from the context, or the configured sync
+                      interval before now (capped at 7 days)
+        """
+        # Check if sync start date is provided in context (for incremental syncs)
+        if self.env.context.get('sync_since'):
+            sync_start = self.env.context.get('sync_since')
+            _logger.info(f"Using provided sync start date from context: {sync_start}")
+        else:
+            # Get configured sync interval from settings
+            if self.env.context.get('from_cron', False):
+                # For cron job execution, cap at 7 days max to avoid timeouts on initial sync
+                # For subsequent syncs, we'll use the last_sync time via sync_since parameter
+                sync_days = 7  # Cap at 7 days for Odoo.sh compatibility 
+                _logger.info(f"Using capped sync interval ({sync_days} days) for cron job execution")
+            else:
+                # For manual syncs, use the configured interval (default 7 days)
+                sync_days = int(self.env['ir.config_parameter'].sudo().get_param(
+                    'manictime_server.sync_interval', default='7'))
+                
+                # Safety cap at 7 days to avoid timeouts
+                if sync_days > 7:
+                    _logger.warning(f"Configured sync interval ({sync_days} days) exceeds recommended maximum (7 days). Capping at 7 days.")
+                    sync_days = 7
+
+            # Calculate sync start time (X days ago, max 7 days)
+            sync_start = datetime.now() - timedelta(days=sync_days)
+            _logger.info(f"Syncing data from {sync_start} ({sync_days} days back)")
+
+        return sync_start
+
+    def _sync_timeline_activities(self, client, timelines, sync_start):
+        """Fetch and ingest the activities of timelines, each one in its own transaction
+
+        Timelines are fetched concurrently and ingested while they stream in,
+        each one on a dedicated cursor that commits as soon as the timeline
+        is done. Progress is durable, locks are held for one timeline only,
+        and a failing timeline is rolled back without affecting the others.
+
+        The timelines must be committed: the timeline transactions do not see
+        the uncommitted changes of this cursor.
+
+        Returns:
+            tuple: (number of activities synced, {timeline id: error message})
+        """
+        total_activities = 0
+        failures = {}
+
+        # Resolve everything the fetch workers need while on the main thread
+        sync_plan = self.env['manictime.sync.planner'].plan_timelines(timelines, sync_start)
+        fetch_plans = [
+            self._prepare_timeline_fetch(entry['timeline'], entry['date_from'], entry['date_to'])
+            for entry in sync_plan
+        ]
+
+        # Fetch all timelines concurrently and ingest each one while it streams in
+        param = self.env['ir.config_parameter'].sudo()
+        fetch_concurrency = int(param.get_param(
+            'manictime_server.fetch_concurrency', default=DEFAULT_FETCH_CONCURRENCY))
+        pipeline_depth = int(param.get_param(
+            'manictime_server.pipeline_depth', default=DEFAULT_PIPELINE_DEPTH))
+        with closing(fetch_timelines(client, fetch_plans, fetch_concurrency, pipeline_depth)) as streams:
+            for stream in streams:
+                timeline_id = stream.plan['timeline_id']
+                try:
+                    activity_count = self._ingest_timeline_stream(stream)
+                except Exception as timeline_error:
+                    _logger.error(f"Error syncing timeline {stream.plan['name']}: {str(timeline_error)}")
+                    failures[timeline_id] = str(timeline_error)
+                    # Stop the fetch worker, the timeline transaction is rolled back
+                    stream.cancel()
+                    # Continue with other timelines even if one fails
+                    continue
+                if activity_count is None:
+                    failures[timeline_id] = _('Timeline %s is being synced by another process') % stream.plan['name']
+                    stream.cancel()
+                    continue
+                total_activities += activity_count
+
+        # The timelines were written by the timeline transactions
+        timelines.invalidate_recordset()
+        self.env['manictime.activity'].invalidate_model()
+        return total_activities, failures
+
+    def _ingest_timeline_stream(self, stream):
+        """Ingest a fetched timeline in a transaction of its own, on a dedicated cursor
+
+        The transaction commits when the timeline is done and rolls back if
+        it fails, so at most this timeline is lost.
+
+        Returns:
+            int: number of activities synced, None if another process syncs the timeline
+        """
+        with self.pool.cursor() as cr:
+            user = self.with_env(self.env(cr=cr))
+            # Held until this timeline is committed, so a cron run cannot sync it concurrently
+            if not user.env['manictime.sync.lock'].try_lock_timeline(stream.plan['timeline_id']):
+                return None
+            timeline = user.env['manictime.user.timeline'].browse(stream.plan['timeline_id'])
+
+            if stream.error:
+                raise stream.error
+
+            if stream.mode == 'changes':
+                activity_count = user._apply_timeline_changes(timeline, stream.changes)
+            else:
+                activity_count = user._apply_timeline_window(
+                    timeline, stream.plan, stream.chunks(), rejected=stream.rejected)
+            _logger.info(f"Timeline {timeline.name} pipeline: {stream.throughput()}")
+
+            # Update last sync time and the statistics the planner estimates from
+            timeline.write({
+                'last_sync': datetime.now(),
+                **timeline._prepare_sync_stats(stream),
+            })
+            return activity_count
+
+    def _prepare_timeline_fetch(self, timeline, date_from, date_to):
+        """Resolve the fetch plan of a timeline for the fetch workers
+
+        The plan is a plain dict, so it can be used from worker threads that
+        have no access to the environment.
+
+        Returns:
+            dict: timeline identifiers, links, window and change position
+        """
+        # Use timeline_key as the primary identifier for API calls
+        # This is more reliable and consistent with the API
+        timeline_identifier = timeline.timeline_key
+
+        # If timeline_key is not available (old records), fall back to timeline_id
+        if not timeline_identifier:
+            timeline_identifier = timeline.timeline_id
+            _logger.warning(f"Using legacy timeline_id for timeline {timeline.name} - update recommended")
+
+        # Get the activities URL from the link model
+        activities_url = timeline.get_activities_url()
+
+        # Add detailed logging about the timeline and its links
+        _logger.info(f"Timeline {timeline.name} (ID: {timeline.id}):")
+        _logger.info(f"  - timeline_key: {timeline.timeline_key}")
+        _logger.info(f"  - timeline_id (legacy): {timeline.timeline_id}")
+        _logger.info(f"  - schema: {timeline.schema_id.name if timeline.schema_id else 'None'}")
+        _logger.info(f"  - environment: {timeline.environment_id.device_name if timeline.environment_id else 'None'}")
+        _logger.info(f"  - link count: {len(timeline.link_ids)}")
+
+        # Log the available links
+        if timeline.link_ids:
+            _logger.info("Available links:")
+            for link in timeline.link_ids:
+                formatted_url = timeline.get_link_url(link.rel)
+                _logger.info(f"  - {link.rel}: {formatted_url} (pattern: {link.pattern})")
+
+        _logger.info(f"Getting activities for timeline {timeline.name} using identifier {timeline_identifier} with URL {activities_url}")
+
+        return {
+            'timeline_id': timeline.id,
+            'name': timeline.name,
+            'timeline_key': timeline_identifier,
+            'activities_url': activities_url,
+            'changes_url': timeline.get_changes_url(),
+            'sync_change_id': timeline.sync_change_id,
+            # The listing's change id is captured before fetching, so changes made
+            # during the fetch are replayed by the next change-feed sync
+            'server_change_id': timeline.last_change_id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'chunk_size': int(self.env['ir.config_parameter'].sudo().get_param(
+                'manictime_server.ingest_chunk_size', default=DEFAULT_CHUNK_SIZE)),
+        }
+
+    def _apply_timeline_changes(self, timeline, changes):
+        """Apply the changes fetched from a timeline's getchanges feed
+
+        Returns:
+            int: number of changes applied
+        """
+        upserts = changes['upserts']
+        deleted_ids = changes['deleted_ids']
+
+        ingest = self.env['manictime.activity.ingest'].sudo()
+        if upserts:
+            # The change id moves past rejected activities, keep them for a targeted retry
+            rejected = []
+            activities = self._convert_manictime_activities(upserts, rejected=rejected)
+            ingest_stats = ingest.ingest(timeline, activities, rejected=rejected)
+            _logger.info(f"Timeline {timeline.name} changes: {ingest_stats['inserted']} inserted, "
+                         f"{ingest_stats['updated']} updated, {ingest_stats['skipped']} skipped")
+            timeline._update_sync_watermark(ingest_stats['newest_start'])
+            if rejected:
+                self.env['manictime.dead.letter'].sudo().record_items(timeline, rejected)
+        if deleted_ids:
+            deleted = ingest.delete_entities(timeline, deleted_ids)
+            _logger.info(f"Timeline {timeline.name} changes: {deleted} deleted")
+
+        timeline.write({'sync_change_id': changes['change_id']})
+        return len(upserts) + len(deleted_ids)
+
+    def _apply_timeline_window(self, timeline, plan, chunks, rejected=None):
+        """Ingest the activities fetched for a timeline window
+
+        Args:
+            rejected: activities the fetch could not normalize, dead-lettered
+                      with the failed chunks (see ingest_chunks)
+
+        Returns:
+            int: number of activities retrieved
+        """
+        # Merge each chunk in one set-based statement
+        # and remove the activities of the window the server no longer has
+        ingest_stats = self.env['manictime.activity.ingest'].sudo().ingest_chunks(
+            timeline, chunks, window=(plan['date_from'], plan['date_to']), rejected=rejected)
+        _logger.info(f"Retrieved {ingest_stats['received']} activities for timeline {timeline.name}")
+        _logger.info(f"Timeline {timeline.name}: {ingest_stats['inserted']} inserted, "
+                     f"{ingest_stats['updated']} updated, {ingest_stats['skipped']} skipped, "
+                     f"{ingest_stats['invalid']} invalid, {ingest_stats['failed']} failed, "
+                     f"{ingest_stats['deleted']} deleted")
+        timeline._update_sync_watermark(ingest_stats['newest_start'])
+
+        # The window is now in sync with the server's change position
+        if plan['server_change_id']:
+            timeline.write({'sync_change_id': plan['server_change_id']})
+
+        return ingest_stats['received']
+
+    def _convert_manictime_activities(self, activities, rejected=None):
+        """Convert a raw activities API response into normalized activity records
+
+        Returns the original list unchanged if it is not in the raw format.
+        Activities that cannot be converted are appended to rejected.
+        """
+        # Handle raw API response that might need additional processing
+        if isinstance(activities, list) and activities and isinstance(activities[0], dict):
+            # This is likely raw API response format from the JSON rather than Activity objects
+            _logger.info(f"Converting raw activity data to activity records")
+            activities = list(normalize_activities(activities, rejected=rejected))
+
+        return activities
+
+    def manictime_backfill(self):
+        """Import history for the selected timelines with a pending backfill
+
+        Each timeline is fetched in day-sized slices from the newest to the
+        oldest. Every slice is ingested and its backfill cursor checkpointed
+        in a transaction of its own, on a dedicated cursor, so an interrupted
+        run resumes from the last committed slice. No new slice is started
+        after manictime_deadline (time.monotonic) from the context.
+
+        Returns:
+            int: number of activities imported
+        """
+        self.ensure_one()
+
+        timelines = self.manictime_timeline_ids.filtered(
+            lambda t: t.is_selected and t._is_backfill_pending()
+        )
+        if not timelines:
+            return 0
+
+        if not self._check_manictime_auth():
+            _logger.warning(f"Skipping backfill for user {self.name}: authentication required")
+            return 0
+
+        client = self._get_manictime_client()
+        deadline = self.env.context.get('manictime_deadline')
+        pipeline_depth = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.pipeline_depth', default=DEFAULT_PIPELINE_DEPTH))
+        total_activities = 0
+
+        for timeline in timelines:
+            plan = self._prepare_timeline_fetch(timeline, None, None)
+            # History is always fetched by window, never through the change feed
+            slice_plans = [
+                dict(plan, changes_url=None, date_from=slice_start, date_to=slice_end)
+                for slice_start, slice_end in timeline._get_backfill_slices()
+            ]
+
+            # A single fetch worker keeps the slices in order, and downloads the
+            # next slice while the current one is being merged
+            with closing(fetch_timelines(client, slice_plans, 1, pipeline_depth)) as streams:
+                for stream in streams:
+                    if deadline and time.monotonic() >= deadline:
+                        _logger.info(f"Backfill time budget used up, timeline {timeline.name} continues next run")
+                        break
+                    try:
+                        slice_activities = self._ingest_backfill_slice(stream)
+                    except Exception as slice_error:
+                        _logger.error(f"Error backfilling timeline {timeline.name} "
+                                      f"({stream.plan['date_from']} - {stream.plan['date_to']}): {str(slice_error)}")
+                        if self._record_backfill_failure(stream, slice_error):
+                            continue
+                        # Resume this timeline from the same slice next run
+                        break
+                    if slice_activities is None:
+                        _logger.info(f"Timeline {timeline.name} is being synced, backfill continues next run")
+                        break
+                    total_activities += slice_activities
+
+        # The slices were committed by their own transactions
+        timelines.invalidate_recordset()
+        self.env['manictime.activity'].invalidate_model()
+        return total_activities
+
+    def _ingest_backfill_slice(self, stream):
+        """Ingest a backfill slice and checkpoint it, in a transaction of its own
+
+        Returns:
+            int: number of activities received, None if another process syncs the timeline
+        """
+        slice_start = stream.plan['date_from']
+        slice_end = stream.plan['date_to']
+        with self.pool.cursor() as cr:
+            env = self.env(cr=cr)
+            # The lock ends with each committed slice, take it again for every slice
+            if not env['manictime.sync.lock'].try_lock_timeline(stream.plan['timeline_id']):
+                return None
+            timeline = env['manictime.user.timeline'].browse(stream.plan['timeline_id'])
+
+            _logger.info(f"Backfilling timeline {timeline.name} from {slice_start} to {slice_end}")
+            if stream.error:
+                raise stream.error
+            ingest_stats = env['manictime.activity.ingest'].sudo().ingest_chunks(
+                timeline, stream.chunks(), window=(slice_start, slice_end), rejected=stream.rejected)
+            timeline._update_sync_watermark(ingest_stats['newest_start'])
+            _logger.info(f"Timeline {timeline.name} backfill pipeline: {stream.throughput()}")
+
+            # Checkpoint: everything from slice_start onwards is imported
+            timeline.write({'backfill_cursor': slice_start, 'backfill_failures': 0})
+            return ingest_stats['received']
+
+    def _record_backfill_failure(self, stream, error):
+        """Count a failed backfill slice, in a transaction of its own
+
+        After manictime_server.backfill_max_slice_failures runs in a row, the
+        slice is recorded on the timeline as skipped and the backfill cursor
+        moves past it, so one bad day cannot block the older history.
+
+        Returns:
+            bool: True if the slice was skipped
+        """
+        slice_start = stream.plan['date_from']
+        slice_end = stream.plan['date_to']
+        max_failures = int(self.env['ir.config_parameter'].sudo().get_param(
+            'manictime_server.backfill_max_slice_failures', default='3'))
+        with self.pool.cursor() as cr:
+            env = self.env(cr=cr)
+            if not env['manictime.sync.lock'].try_lock_timeline(stream.plan['timeline_id']):
+                return False
+            timeline = env['manictime.user.timeline'].browse(stream.plan['timeline_id'])
+            failures = timeline.backfill_failures + 1
+            if failures < max_failures:
+                timeline.write({'backfill_failures': failures})
+                return False
+
+            _logger.error(f"Timeline {timeline.name}: backfill slice {slice_start} - {slice_end} failed "
+                          f"{failures} times, skipping it")
+            timeline.write({
+                'backfill_cursor': slice_start,
+                'backfill_failures': 0,
+                'backfill_skipped': f"{timeline.backfill_skipped or ''}{slice_start} - {slice_end}: {str(error)}\n",
+            })
+            return True
+
     def manictime_sync_activities(self):
-        """Legacy method, redirects to manictime_sync_data"""
-        return self.manictime_sync_data()
+        """Legacy method, queues the sync like the Sync All Data button"""
+        return self.action_manictime_sync_data()
 
     def _check_manictime_auth(self):
         """Check if authentication is valid and try to refresh if needed"""
@@ -1567,9 +1724,28 @@ class ResUsers(models.Model):
             }
         }
 
+    def _manictime_sync_running_notification(self):
+        """Return sync already running notification"""
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Sync In Progress'),
+                'message': _('A ManicTime sync is already running for this user, please try again later'),
+                'type': 'warning',
+                'next': {
+                    'type': 'ir.actions.act_window_close',
+                    'infos': {'effect': {'type': 'reload'}}
+                }
+            }
+        }
+
     def _sync_manictime_tags(self, client, force_response=None):
         """Sync tag combinations from ManicTime server
 
+        The refresh runs in a savepoint: on failure nothing of it is kept and
+        the transaction stays usable for the rest of the sync.
+
         Args:
             client: ManicTime client instance
             force_response: Optional pre-fetched tag combinations response
@@ -1579,337 +1755,197 @@ class ResUsers(models.Model):
             List of tag combination IDs that were created or updated
         """
         self.ensure_one()
-
         try:
-            # Use pre-fetched response if provided
-            if force_response is not None:
-                _logger.info("Using pre-fetched tag combinations response")
-                tag_combinations_response = force_response
-            else:
-                # Get tag combinations from ManicTime
-                # Check if user is a ManicTime manager - if so, try to get all tags
-                is_manager = self.env.user.has_group('manictime_server.group_manictime_manager')
-
-                # Use the new UI API endpoint that returns actual tag data
-                url = f"{client.config.server_url}/ui-api/analytics/timelines/tagEditorTags"
-                headers = {"Accept": "application/json"}
-                
-                try:
-                    _logger.info(f"Fetching tags from new UI API endpoint: {url}")
-                    tag_combinations_response = client._make_request(url, headers=headers)
-                except Exception as e:
-                    _logger.warning(f"Failed to get tags from UI API endpoint: {str(e)}. Falling back to legacy endpoint.")
-                    # Fall back to legacy endpoint if UI API fails
-                    if is_manager:
-                        # Manager can try to get all tags
-                        url = f"{client.config.server_url}/api/tagcombinationlist?getAll=true"
-                        headers = {"Accept": "application/vnd.manictime.v3+json"}
-                        try:
-                            _logger.info(f"Falling back to legacy endpoint with getAll=true: {url}")
-                            tag_combinations_response = client._make_request(url, headers=headers)
-                        except Exception as e2:
-                            _logger.warning(f"Failed to get all tags from legacy endpoint: {str(e2)}. Trying without getAll parameter.")
-                            # Try once more without getAll parameter
-                            url = f"{client.config.server_url}/api/tagcombinationlist"
-                            tag_combinations_response = client._make_request(url, headers=headers)
-                    else:
-                        # Regular user gets only their own tags
-                        url = f"{client.config.server_url}/api/tagcombinationlist"
-                        headers = {"Accept": "application/vnd.manictime.v3+json"}
-                        _logger.info(f"Falling back to legacy endpoint: {url}")
-                        tag_combinations_response = client._make_request(url, headers=headers)
-
-            # Verify response format and extract tag combinations
-            tag_combinations = []
-            
-            if not isinstance(tag_combinations_response, list):
-                _logger.info(f"Processing dictionary-style tag combinations response")
-                if isinstance(tag_combinations_response, dict):
-                    # First check for the UI API format with both tagCombinations and tags
-                    if 'tagCombinations' in tag_combinations_response and isinstance(tag_combinations_response['tagCombinations'], list):
-                        ui_api_tag_combinations = tag_combinations_response.get('tagCombinations', [])
-                        _logger.info(f"Found UI API 'tagCombinations' key with {len(ui_api_tag_combinations)} items")
-                        
-                        # Process the new format from /ui-api/analytics/timelines/tagEditorTags
-                        for tag_combo_data in ui_api_tag_combinations:
-                            if isinstance(tag_combo_data, dict) and 'tag' in tag_combo_data:
-                                tag_data = tag_combo_data.get('tag', {})
-                                
-                                # Check if it has the required fields
-                                if tag_data.get('key') and tag_data.get('tagCombination'):
-                                    # Create a standardized format for processing
-                                    processed_tag = {
-                                        'id': tag_data.get('key'),  # Use key as ID
-                                        'name': tag_data.get('tagCombination', ''),
-                                        'tags': [tag_data.get('tagCombination', '')],  # Use tagCombination as the tag
-                                        'color': tag_data.get('color', ''),
-                                        'description': '',  # No description in this format
-                                        'isBillable': tag_data.get('isBillable', False)
-                                    }
-                                    tag_combinations.append(processed_tag)
-                    
-                    # If we got tags from UI API, we're done
-                    if tag_combinations:
-                        _logger.info(f"Successfully processed {len(tag_combinations)} tags from UI API format")
-                    # If not, try the other formats
-                    else:
-                        # Process ManicTime API v3 format that returns {"tagCombinations": [...]}
-                        if 'tagCombinations' in tag_combinations_response:
-                            tag_combinations = tag_combinations_response.get('tagCombinations', [])
-                            _logger.info(f"Found regular API 'tagCombinations' key with {len(tag_combinations)} items")
-                        # Try other common formats
-                        elif 'tags' in tag_combinations_response:
-                            tag_combinations = tag_combinations_response.get('tags', [])
-                            _logger.info(f"Found 'tags' key with {len(tag_combinations)} items")
-                        elif 'combinations' in tag_combinations_response:
-                            tag_combinations = tag_combinations_response.get('combinations', [])
-                            _logger.info(f"Found 'combinations' key with {len(tag_combinations)} items")
-                        else:
-                            # Look for any list in the response
-                            list_keys = [k for k, v in tag_combinations_response.items() if isinstance(v, list)]
-                            if list_keys:
-                                first_list_key = list_keys[0]
-                                tag_combinations = tag_combinations_response.get(first_list_key, [])
-                                _logger.info(f"Found list under key '{first_list_key}' with {len(tag_combinations)} items")
-                            else:
-                                _logger.error("Could not extract tag combinations from response")
-                                _logger.error(f"Response keys: {list(tag_combinations_response.keys())}")
-                                return []
-                else:
-                    _logger.error(f"Unexpected response type: {type(tag_combinations_response)}")
-                    return []
-            else:
-                # Response is already a list
-                tag_combinations = tag_combinations_response
+            with self.env.cr.savepoint():
+                return self._refresh_manictime_tags(client, force_response=force_response)
+        except Exception as e:
+            _logger.error(f"Error syncing tag combinations: {str(e)}")
+            return []
 
-            _logger.info(f"Retrieved {len(tag_combinations)} tag combinations from ManicTime")
+    def _refresh_manictime_tags(self, client, force_response=None):
+        """Sync tag combinations from ManicTime server, errors are raised to _sync_manictime_tags
 
-            # Import necessary for TagCombination model
-            try:
-                import sys, os
-                server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                manictime_path = os.path.join(server_path, 'manictime')
-                if manictime_path not in sys.path:
-                    sys.path.append(manictime_path)
-                from models import TagCombination
-            except ImportError as e:
-                _logger.error(f"Could not import TagCombination model: {str(e)}")
-                # Continue with original implementation if import fails
+        Args:
+            client: ManicTime client instance
+            force_response: Optional pre-fetched tag combinations response
+                           (useful for cases where we need to use custom parameters)
 
-            # Sync happens in a context that won't trigger validation errors
-            sync_context = {'calling_method': 'manictime_sync'}
+        Returns:
+            List of tag combination IDs that were created or updated
+        """
+        self.ensure_one()
+        Validator = self.env['manictime.http.validator'].sudo()
+        Capability = self.env['manictime.server.capability'].sudo()
+        validator_url = validators = endpoint = None
+        # Shapes of pre-fetched responses are not recorded, they may come from other endpoints
+        capability = Capability
+
+        # Use pre-fetched response if provided
+        if force_response is not None:
+            _logger.info("Using pre-fetched tag combinations response")
+            tag_combinations_response = force_response
+        else:
+            # Get tag combinations from ManicTime
+            # Check if user is a ManicTime manager - if so, try to get all tags
+            is_manager = self.env.user.has_group('manictime_server.group_manictime_manager')
 
-            result = []
+            existing_tags = self.env['manictime.tag.combination'].search([('user_id', '=', self.id)])
+            capability = Capability._for_server(client.config.server_url)
 
-            # Create or update tag combinations
-            for tag_data in tag_combinations:
+            # Endpoints known to be missing on this server are not probed again
+            endpoints = capability._tag_endpoints(client.config.server_url, is_manager)
+            for index, (endpoint, url, headers) in enumerate(endpoints):
+                capability_field = endpoint if endpoint in ('ui_api_tags', 'tag_list_get_all') else None
                 try:
-                    # Try to use TagCombination model for robust parsing
-                    if 'TagCombination' in locals():
-                        tag_obj = TagCombination.from_dict(tag_data)
-                        name = tag_obj.name
-                        tags = tag_obj.tags
-                        description = tag_obj.description or ''
-                        color = tag_obj.color or ''
-                    else:
-                        # Fall back to manual parsing
-                        # Check if tag_data is a dictionary, convert if not
-                        if not isinstance(tag_data, dict):
-                            if isinstance(tag_data, str):
-                                # Simple string tag
-                                tag_data = {'name': tag_data, 'tags': [tag_data]}
-                            else:
-                                _logger.warning(f"Unexpected tag combination format: {type(tag_data)}, skipping.")
-                                continue
-
-                        name = tag_data.get('name', 'Unnamed Tag')
-
-                        # Get tags from the combination - ensure it's a list
-                        tags = tag_data.get('tags', [])
-                        if not isinstance(tags, list):
-                            tags = [str(tags)] if tags else []
-
-                        description = tag_data.get('description', '')
-                        color = tag_data.get('color', '')
-
-                    # Get the ID from the tag combination
-                    external_id = str(tag_data.get('id') or tag_data.get('tagId', ''))
-                    if not external_id:
-                        _logger.warning(f"Tag combination missing ID, generating a random one")
-                        external_id = f"generated_{uuid.uuid4()}"
+                    _logger.info(f"Fetching tags from {url}")
+                    tag_combinations_response, validators = Validator.fetch(
+                        self, client, url, headers=headers, conditional=bool(existing_tags))
+                except Exception as e:
+                    if capability_field and is_unsupported_error(e):
+                        capability._update({capability_field: 'unsupported'})
+                    if index == len(endpoints) - 1:
+                        raise
+                    _logger.warning(f"Failed to get tags from {url}: {str(e)}. Falling back to the next endpoint.")
+                    continue
+                capability._note_version(validators.get('server'))
+                if capability_field:
+                    capability._update({capability_field: 'supported'})
+                break
+            if tag_combinations_response is NOT_MODIFIED:
+                return existing_tags.ids
+            validator_url = url
+
+        # Verify response format and extract tag combinations, in the shape known for the endpoint if any
+        tag_combinations = None
+        if endpoint == 'ui_api_tags':
+            # UI API items always need converting to the legacy format
+            tag_combinations = ui_api_tag_combinations(tag_combinations_response) or None
+        if tag_combinations is None:
+            tag_combinations = extract_by_shape(tag_combinations_response, capability._get_shape(endpoint))
+        if tag_combinations is None:
+            tag_combinations, shape = detect_tags_shape(tag_combinations_response)
+            if tag_combinations is None:
+                return []
+            # An empty listing tells nothing about the shape of a full one
+            if tag_combinations and endpoint:
+                capability._set_shape(endpoint, shape)
 
-                    # Create tags string
-                    tags_string = ','.join(tags) if tags else ''
+        _logger.info(f"Retrieved {len(tag_combinations)} tag combinations from ManicTime")
 
-                    # Look for existing record
-                    tag_record = self.env['manictime.tag.combination'].search([
-                        ('user_id', '=', self.id),
-                        ('entity_id', '=', external_id)
-                    ], limit=1)
+        # Import necessary for TagCombination model
+        try:
+            import sys, os
+            server_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            manictime_path = os.path.join(server_path, 'manictime')
+            if manictime_path not in sys.path:
+                sys.path.append(manictime_path)
+            from models import TagCombination
+        except ImportError as e:
+            _logger.error(f"Could not import TagCombination model: {str(e)}")
+            # Continue with original implementation if import fails
 
-                    if tag_record:
-                        # Update existing record
-                        # Get billable status if available
-                        is_billable = False
-                        if isinstance(tag_data, dict):
-                            is_billable = tag_data.get('isBillable', False)
-                        
-                        tag_record.with_context(sync_context).write({
-                            'name': name,
-                            'tags': tags_string,
-                            'description': description,
-                            'color': color,
-                            'is_billable': is_billable
-                        })
-                        result.append(tag_record.id)
-                    else:
-                        # Get billable status if available
-                        is_billable = False
-                        if isinstance(tag_data, dict):
-                            is_billable = tag_data.get('isBillable', False)
-                            
-                        # Create new record
-                        new_tag = self.env['manictime.tag.combination'].with_context(sync_context).create({
-                            'user_id': self.id,
-                            'entity_id': external_id,
-                            'name': name,
-                            'tags': tags_string,
-                            'description': description,
-                            'color': color,
-                            'is_billable': is_billable
-                        })
-                        result.append(new_tag.id)
-                except Exception as tag_error:
-                    _logger.error(f"Error processing tag combination: {str(tag_error)}")
-                    # Continue with other tag combinations
-
-            # Log success
-            _logger.info(f"Successfully synchronized {len(result)} tag combinations")
-            return result
+        # Sync happens in a context that won't trigger validation errors
+        sync_context = {'calling_method': 'manictime_sync'}
 
-        except Exception as e:
-            _logger.error(f"Error syncing tag combinations: {str(e)}")
-            return []
+        result = []
 
-    def _create_or_update_activity_from_object(self, timeline, activity):
-        """Create or update an activity record from Activity object"""
-        try:
-            # Validate activity object to ensure it has necessary attributes
-            if not hasattr(activity, 'id') or not activity.id:
-                # Log more details to help diagnose the issue
-                _logger.warning(f"Activity missing ID, skipping. Activity attrs: {dir(activity)}")
-                if hasattr(activity, '__dict__'):
-                    _logger.warning(f"Activity dict content: {activity.__dict__}")
-                return
-
-            if not hasattr(activity, 'start') or not hasattr(activity, 'end'):
-                _logger.warning(f"Activity {activity.id} missing start/end time, skipping")
-                return
-
-            # Find existing activity
-            activity_record = self.env['manictime.activity'].sudo().search([
-                ('user_id', '=', self.id),
-                ('timeline_id', '=', timeline.id),
-                ('entity_id', '=', activity.id),
-            ], limit=1)
-
-            # Process tags
-            activity_tags = []
-            if hasattr(activity, 'tags'):
-                if isinstance(activity.tags, list):
-                    activity_tags = activity.tags
-                elif isinstance(activity.tags, str):
-                    # Split string by commas if it's a string
-                    activity_tags = [tag.strip() for tag in activity.tags.split(',') if tag.strip()]
+        # Create or update tag combinations
+        for tag_data in tag_combinations:
+            try:
+                # Try to use TagCombination model for robust parsing
+                if 'TagCombination' in locals():
+                    tag_obj = TagCombination.from_dict(tag_data)
+                    name = tag_obj.name
+                    tags = tag_obj.tags
+                    description = tag_obj.description or ''
+                    color = tag_obj.color or ''
                 else:
-                    # For any other type, try to convert to string
-                    activity_tags = [str(activity.tags)]
-
-            # Create a clean, comma-separated string of tags
-            tags_string = ','.join(tag for tag in activity_tags if tag)
-
-            # Create a better title if needed
-            title = getattr(activity, 'title', '') or 'Untitled'
-            application = getattr(activity, 'application', '') or ''
-
-            # Add application to title if it's not already included
-            if application and application not in title:
-                title = f"{application} - {title}"
-
-            # Process start and end times - handle timezone information
-            from datetime import datetime
-            import pytz
-            import re
-            
-            start_time = activity.start
-            end_time = activity.end
-            
-            # Helper function to convert tzinfo-aware datetime to naive UTC
-            def make_naive_datetime(dt):
-                if not dt:
-                    return dt
-                    
-                if isinstance(dt, str):
-                    # Check if it's a timezone-aware ISO string (e.g., "2024-09-02T07:52:30-04:00")
-                    if ('+' in dt or '-' in dt and 'T' in dt) or 'Z' in dt:
-                        try:
-                            # First, extract the datetime part without timezone to parse it
-                            match = re.match(r'(.+?)(?:[+-][\d:]+|Z)$', dt)
-                            if match:
-                                dt_part = match.group(1)
-                                # Parse as datetime - handle T separator
-                                if 'T' in dt_part:
-                                    dt_part = dt_part.replace('T', ' ')
-                                return datetime.fromisoformat(dt_part)
-                        except Exception as e:
-                            _logger.warning(f"Failed to parse timezone string {dt}: {str(e)}")
-                            return dt
-                    return dt
-                
-                # For datetime objects with tzinfo
-                if hasattr(dt, 'tzinfo') and dt.tzinfo:
-                    try:
-                        # Convert to UTC and remove timezone info
-                        if hasattr(pytz, 'UTC'):
-                            # Using pytz if available (Odoo standard way)
-                            utc_dt = dt.astimezone(pytz.UTC)
-                            return utc_dt.replace(tzinfo=None)
+                    # Fall back to manual parsing
+                    # Check if tag_data is a dictionary, convert if not
+                    if not isinstance(tag_data, dict):
+                        if isinstance(tag_data, str):
+                            # Simple string tag
+                            tag_data = {'name': tag_data, 'tags': [tag_data]}
                         else:
-                            # Fallback to standard datetime
-                            utc_dt = dt.astimezone(datetime.timezone.utc)
-                            return utc_dt.replace(tzinfo=None)
-                    except Exception as e:
-                        _logger.warning(f"Error converting datetime timezone: {str(e)}")
-                
-                return dt
-            
-            # Convert times to naive UTC
-            start_time = make_naive_datetime(start_time)
-            end_time = make_naive_datetime(end_time)
-            
-            # Prepare activity data
-            activity_data = {
-                'user_id': self.id,
-                'timeline_id': timeline.id,
-                'entity_id': activity.id,
-                'name': title,
-                'start_time': start_time,
-                'end_time': end_time,
-                'application': application,
-                'tags': tags_string,
-                'notes': getattr(activity, 'notes', '') or ''
-            }
+                            _logger.warning(f"Unexpected tag combination format: {type(tag_data)}, skipping.")
+                            continue
+
+                    name = tag_data.get('name', 'Unnamed Tag')
+
+                    # Get tags from the combination - ensure it's a list
+                    tags = tag_data.get('tags', [])
+                    if not isinstance(tags, list):
+                        tags = [str(tags)] if tags else []
+
+                    description = tag_data.get('description', '')
+                    color = tag_data.get('color', '')
+
+                # Get the ID from the tag combination
+                external_id = str(tag_data.get('id') or tag_data.get('tagId', ''))
+                if not external_id:
+                    _logger.warning(f"Tag combination missing ID, generating a random one")
+                    external_id = f"generated_{uuid.uuid4()}"
+
+                # Create tags string
+                tags_string = ','.join(tags) if tags else ''
+
+                # Look for existing record
+                tag_record = self.env['manictime.tag.combination'].search([
+                    ('user_id', '=', self.id),
+                    ('entity_id', '=', external_id)
+                ], limit=1)
+
+                if tag_record:
+                    # Update existing record
+                    # Get billable status if available
+                    is_billable = False
+                    if isinstance(tag_data, dict):
+                        is_billable = tag_data.get('isBillable', False)
+                    
+                    tag_record.with_context(sync_context).write({
+                        'name': name,
+                        'tags': tags_string,
+                        'description': description,
+                        'color': color,
+                        'is_billable': is_billable
+                    })
+                    result.append(tag_record.id)
+                else:
+                    # Get billable status if available
+                    is_billable = False
+                    if isinstance(tag_data, dict):
+                        is_billable = tag_data.get('isBillable', False)
+                        
+                    # Create new record
+                    new_tag = self.env['manictime.tag.combination'].with_context(sync_context).create({
+                        'user_id': self.id,
+                        'entity_id': external_id,
+                        'name': name,
+                        'tags': tags_string,
+                        'description': description,
+                        'color': color,
+                        'is_billable': is_billable
+                    })
+                    result.append(new_tag.id)
+            except Exception as tag_error:
+                _logger.error(f"Error processing tag combination: {str(tag_error)}")
+                # The tags must be downloaded again next time, not answered with 304
+                validators = None
+                # Continue with other tag combinations
 
-            # Ensure context for preventing validation errors
-            sync_context = {'calling_method': 'manictime_sync'}
+        # Log success
+        _logger.info(f"Successfully synchronized {len(result)} tag combinations")
+        if validator_url and validators is not None:
+            Validator.save(self, validator_url, validators)
+        return result
 
-            if activity_record:
-                # Update existing record
-                activity_record.sudo().with_context(**sync_context).write(activity_data)
-            else:
-                # Create new record
-                self.env['manictime.activity'].sudo().with_context(**sync_context).create(activity_data)
+    def _create_or_update_activity_from_object(self, timeline, activity):
+        """Create or update an activity record from Activity object
 
+        Kept for backward compatibility, bulk syncs go through manictime.activity.ingest
+        """
+        try:
+            self.env['manictime.activity.ingest'].sudo().ingest(timeline, [activity])
         except Exception as e:
             _logger.error(f"Error creating/updating activity {getattr(activity, 'id', 'unknown')}: {str(e)}")
             # Continue with other activities
@@ -1937,44 +1973,85 @@ class ResUsers(models.Model):
         return users
 
     @api.model
-    def cron_sync_manictime_activities(self):
-        """Cron job method to sync ManicTime data for all active users
-        
-        This method implements idempotent sync strategies:
-        1. For initial sync: Cap at configured interval (max 7 days from current date)
-        2. For subsequent syncs: Only sync since the last successful sync
+    def cron_sync_manictime_activities(self, time_budget=None):
+        """Cron job method to sync ManicTime data for the users due for a poll
+
+        Polling is adaptive (see manictime.config._schedule_next_poll): every
+        due user gets a timelines and tags refresh job, which enqueues an
+        activity sync job only for the timelines whose lastChangeId or
+        lastUpdate changed (see manictime.sync.job). Busy users are polled
+        often, idle ones back off. The jobs run within the time budget
+        (seconds, default manictime_server.cron_time_budget) and each one
+        commits on its own: a timeline job resumes from the timeline's own
+        watermark, new timelines start from the capped initial window.
+
+        When the budget runs out, the cron triggers itself, and the next run
+        continues with the jobs left along with the newly due users.
+
+        With several sync partitions (manictime_server.sync_partitions), the
+        jobs are left to the partition crons, which run in parallel.
         """
-        from datetime import timedelta
-        
-        # Find all users with valid ManicTime authentication based on config
-        configs = self.env['manictime.config'].search([
-            ('token_expiry', '>', fields.Datetime.now())
+        Job = self.env['manictime.sync.job'].sudo()
+        Config = self.env['manictime.config'].sudo()
+        # Users with an open refresh job are not enqueued again (see enqueue), jobs left by
+        # a previous run, in backoff or paused never hold back the poll of the other users
+        now = fields.Datetime.now()
+        configs = Config.search([
+            ('token_expiry', '>', now),
+            '|', ('next_poll', '=', False), ('next_poll', '<=', now),
         ])
-        users = self.browse([config.user_id.id for config in configs])
+        users = self.browse([config.user_id.id for config in configs]).filtered('manictime_enabled')
+
+        created = Job.enqueue(users, priority=5)
+        _logger.info(f"Enqueued {created} ManicTime refresh jobs for {len(users)} due users")
+        Job._gc_done_jobs()
+        self.env['manictime.push.batch'].sudo()._gc_push_batches()
+
+        # Wake up again when the next user is due, whatever the cron interval
+        next_due = Config.search([
+            ('token_expiry', '>', fields.Datetime.now()),
+            ('next_poll', '>', fields.Datetime.now()),
+        ], order='next_poll', limit=1)
+        if next_due:
+            self.env.ref('manictime_server.ir_cron_sync_manictime_user_data')._trigger(at=next_due.next_poll)
+
+        if Job._get_partition_count() > 1:
+            # The partition crons sync disjoint sets of users in parallel
+            Job._trigger_partition_crons()
+            return True
+
+        Job.process_queue(time_budget=time_budget, cron=self.env.ref('manictime_server.ir_cron_sync_manictime_user_data'))
+        return True
 
-        for user in users:
-            try:
-                # Get user's configuration
-                config = self.env['manictime.config'].sudo().search([('user_id', '=', user.id)], limit=1)
-                if not config:
-                    _logger.warning(f"No ManicTime configuration found for user {user.name}, skipping sync")
-                    continue
-                
-                # Check if this is an initial sync or subsequent sync
-                if config.last_sync:
-                    # Subsequent sync: Use the last sync time as the start date
-                    _logger.info(f"Performing incremental sync for user {user.name} since {config.last_sync}")
-                    # Add a small buffer (1 hour) to catch any activities that might have been missed
-                    sync_since = config.last_sync - timedelta(hours=1)
-                    user.with_user(user).with_context(from_cron=True, sync_since=sync_since).manictime_sync_data()
-                else:
-                    # Initial sync: Cap at max 7 days from current date 
-                    _logger.info(f"Performing initial sync for user {user.name} (capped at 7 days)")
-                    # We use from_cron=True which already limits the sync to proper intervals
-                    user.with_user(user).with_context(from_cron=True).manictime_sync_data()
+    @api.model
+    def cron_manictime_backfill(self, time_budget=None):
+        """Cron job method to continue pending historical backfills
 
+        Slices are committed one by one. When the time budget (seconds,
+        default manictime_server.cron_time_budget) runs out, the cron
+        triggers itself to continue from the backfill cursors.
+        """
+        if time_budget is None:
+            time_budget = int(self.env['ir.config_parameter'].sudo().get_param(
+                'manictime_server.cron_time_budget', default=DEFAULT_TIME_BUDGET))
+        deadline = time.monotonic() + time_budget if time_budget and time_budget > 0 else None
+
+        timelines = self.env['manictime.user.timeline'].search([
+            ('is_selected', '=', True),
+            ('backfill_target', '!=', False),
+        ]).filtered(lambda t: t._is_backfill_pending())
+
+        for user in timelines.user_id:
+            if deadline and time.monotonic() >= deadline:
+                break
+            try:
+                _logger.info(f"Continuing ManicTime backfill for user {user.name}")
+                user.with_user(user).with_context(manictime_deadline=deadline).manictime_backfill()
             except Exception as e:
-                _logger.error(f"Error syncing ManicTime for user {user.name}: {str(e)}")
+                _logger.error(f"Error backfilling ManicTime for user {user.name}: {str(e)}")
                 continue
 
+        if deadline and time.monotonic() >= deadline:
+            _logger.info(f"Backfill time budget of {time_budget}s used up, continuing")
+            self.env.ref('manictime_server.ir_cron_manictime_backfill')._trigger()
         return True
@@ -0,0 +1,9 @@
+from . import test_activity_ingest
+from . import test_timestamps
+from . import test_sync_job
+from . import test_sync_planner
+from . import test_push_controller
+from . import test_response_cache
+from . import test_http_validator
+from . import test_server_health
+from . import test_server_capability
@@ -0,0 +1,126 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from odoo.tests.common import TransactionCase
+
+
+class TestActivityIngest(TransactionCase):
+    """Test the set-based activity ingest engine"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = cls.env['res.users'].create({
+            'name': 'ManicTime Ingest User',
+            'login': 'manictime_ingest_user',
+        })
+        cls.timeline = cls.env['manictime.user.timeline'].create({
+            'user_id': cls.user.id,
+            'timeline_key': 'ingest-test-timeline',
+        })
+        cls.ingest = cls.env['manictime.activity.ingest']
+
+    def _activity(self, entity_id, title='Editing', start='2024-09-02T07:00:00', end='2024-09-02T08:30:00'):
+        return SimpleNamespace(id=entity_id, title=title, start=start, end=end,
+                               application='Code', tags='038,Dev', notes='')
+
+    def test_insert_update_skip(self):
+        """Test that the merge reports inserted, updated and skipped rows"""
+        stats = self.ingest.ingest(self.timeline, [self._activity('a1'), self._activity('a2')])
+        self.assertEqual(stats['inserted'], 2)
+        self.assertEqual(stats['updated'], 0)
+
+        activity = self.env['manictime.activity'].search([
+            ('timeline_id', '=', self.timeline.id),
+            ('entity_id', '=', 'a1'),
+        ])
+        self.assertEqual(activity.name, 'Code - Editing')
+        self.assertEqual(activity.start_time, datetime(2024, 9, 2, 7, 0))
+        self.assertEqual(activity.duration, 1.5)
+
+        stats = self.ingest.ingest(self.timeline, [
+            self._activity('a1'),
+            self._activity('a2', end='2024-09-02T09:00:00'),
+            self._activity(None),
+        ])
+        self.assertEqual(stats['inserted'], 0)
+        self.assertEqual(stats['updated'], 1)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(stats['invalid'], 1)
+
+    def test_duplicate_entities_in_batch(self):
+        """Test that the last occurrence of a duplicated entity wins"""
+        stats = self.ingest.ingest(self.timeline, [
+            self._activity('dup', title='First'),
+            self._activity('dup', title='Second'),
+        ])
+        self.assertEqual(stats['inserted'], 1)
+        activity = self.env['manictime.activity'].search([('entity_id', '=', 'dup')])
+        self.assertEqual(activity.name, 'Code - Second')
+
+    def test_reconcile_window(self):
+        """Test that a fully fetched window removes activities missing on the server"""
+        self.ingest.ingest(self.timeline, [
+            self._activity('keep'),
+            self._activity('gone'),
+            self._activity('outside', start='2024-09-01T07:00:00', end='2024-09-01T08:00:00'),
+        ])
+        window = (datetime(2024, 9, 2), datetime(2024, 9, 3))
+
+        stats = self.ingest.ingest_chunks(self.timeline, [[self._activity('keep')]], window=window)
+        self.assertEqual(stats['deleted'], 1)
+        remaining = self.env['manictime.activity'].search([('timeline_id', '=', self.timeline.id)])
+        self.assertEqual(sorted(remaining.mapped('entity_id')), ['keep', 'outside'])
+
+        # An empty fetch is not trusted as a deletion of everything
+        stats = self.ingest.ingest_chunks(self.timeline, [], window=window)
+        self.assertEqual(stats['deleted'], 0)
+
+    def test_rejected_activity_dead_letter(self):
+        """Test that a rejected activity is kept and can be re-applied on its own"""
+        stats = self.ingest.ingest_chunks(self.timeline, [[
+            self._activity('dl1'),
+            self._activity('dl2', end='not a time'),
+        ]])
+        self.assertEqual(stats['inserted'], 1)
+        self.assertEqual(stats['invalid'], 1)
+
+        letter = self.env['manictime.dead.letter'].search([('timeline_id', '=', self.timeline.id)])
+        self.assertEqual(letter.kind, 'activity')
+        self.assertEqual(letter.item_count, 1)
+
+        # Still rejected: the letter stays pending
+        self.assertFalse(letter.retry())
+        self.assertEqual(letter.state, 'pending')
+
+        # Once the cause is fixed, only the kept activity is ingested
+        letter.payload = letter.payload.replace('not a time', '2024-09-02T08:30:00')
+        self.assertEqual(letter.retry(), 1)
+        self.assertEqual(letter.state, 'resolved')
+        self.assertTrue(self.env['manictime.activity'].search([('entity_id', '=', 'dl2')]))
+
+    def test_dead_letter_superseded(self):
+        """Test that letters never replay values or entities outdated by a later sync"""
+        DeadLetter = self.env['manictime.dead.letter']
+        window = (datetime(2024, 9, 2), datetime(2024, 9, 3))
+        covered = DeadLetter.record_batch(self.timeline, [self._activity('s1', title='Old')], 'merge failed',
+                                          window=window)
+        deleted = DeadLetter.record_batch(self.timeline, [self._activity('s2')], 'merge failed')
+
+        # A later full fetch of the window resolves its letter without replaying it
+        self.ingest.ingest_chunks(self.timeline, [[self._activity('s1', title='New')]], window=window)
+        self.assertEqual(covered.state, 'resolved')
+
+        # An entity deleted on the server is dropped from the letters
+        self.ingest.delete_entities(self.timeline, ['s2'])
+        self.assertEqual(deleted.state, 'resolved')
+        self.assertFalse(self.env['manictime.activity'].search([('entity_id', '=', 's2')]))
+
+        # An activity stored after the letter was recorded keeps its newer values
+        stale = DeadLetter.record_batch(self.timeline, [self._activity('s1', title='Stale')], 'merge failed')
+        self.env.cr.execute("UPDATE manictime_dead_letter SET create_date = create_date - interval '1 hour' "
+                            "WHERE id = %s", [stale.id])
+        stale.invalidate_recordset()
+        self.assertEqual(stale.retry(), 1)
+        activity = self.env['manictime.activity'].search([('entity_id', '=', 's1')])
+        self.assertEqual(activity.name, 'Code - New')
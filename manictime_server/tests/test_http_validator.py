@@ -0,0 +1,77 @@
+from odoo.tests.common import TransactionCase
+
+
+class FakeHTTPError(Exception):
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise FakeHTTPError(self)
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+class FakeConfig:
+    server_url = 'https://manictime.example.com'
+    timeout = 30
+
+
+class FakeClient:
+    config = FakeConfig()
+
+    def __init__(self, responses):
+        self.session = FakeSession(responses)
+
+
+class TestHttpValidator(TransactionCase):
+    """Test the conditional refresh of the tag listing"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = cls.env['res.users'].create({'name': 'ManicTime Tag User', 'login': 'manictime_tag_user'})
+
+    def test_not_modified_skips_tag_sync(self):
+        """Test that a 304 answer keeps the tags and sends the stored validators"""
+        tags = {'tagCombinations': [{'tag': {'key': 'tag-1', 'tagCombination': 'Project, Design'}}]}
+        client = FakeClient([
+            FakeResponse(200, tags, {'ETag': '"v1"', 'Last-Modified': 'Mon, 02 Sep 2024 07:00:00 GMT'}),
+            FakeResponse(304),
+        ])
+
+        first = self.user._sync_manictime_tags(client)
+        self.assertEqual(len(first), 1)
+        self.assertNotIn('If-None-Match', client.session.requests[0])
+        validator = self.env['manictime.http.validator'].search([('user_id', '=', self.user.id)])
+        self.assertEqual(validator.etag, '"v1"')
+
+        tag = self.env['manictime.tag.combination'].browse(first)
+        tag.name = 'Renamed locally'
+        second = self.user._sync_manictime_tags(client)
+        self.assertEqual(second, first)
+        self.assertEqual(client.session.requests[1]['If-None-Match'], '"v1"')
+        self.assertEqual(tag.name, 'Renamed locally')
+        self.assertEqual(validator.not_modified_count, 1)
@@ -0,0 +1,77 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestPushController(HttpCase):
+    """Test the push ingestion endpoint, with this test as the relay"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = cls.env['res.users'].create({
+            'name': 'ManicTime Push User',
+            'login': 'manictime_push_user',
+            'groups_id': [(6, 0, [cls.env.ref('base.group_user').id])],
+        })
+        cls.timeline = cls.env['manictime.user.timeline'].create({
+            'user_id': cls.user.id,
+            'timeline_key': 'push-timeline',
+        })
+        cls.api_key = cls.env['res.users.apikeys'].with_user(cls.user)._generate(
+            None, 'ManicTime relay', fields.Datetime.now() + timedelta(days=1))
+
+    def _raw(self, entity_id, start='2024-09-02T07:00:00-04:00'):
+        return {'entityId': entity_id, 'values': {
+            'name': 'Editing',
+            'timeInterval': {'start': start, 'duration': 600},
+        }}
+
+    def _push(self, body, key, content_type='application/x-ndjson'):
+        return self.url_open('/manictime/push/push-timeline', data=body, headers={
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': content_type,
+            'Idempotency-Key': key,
+        })
+
+    def test_push_ndjson_is_idempotent(self):
+        """Test that an NDJSON batch is ingested once per idempotency key"""
+        body = '\n'.join(json.dumps(self._raw(entity_id)) for entity_id in ('p1', 'p2')) + '\n'
+        response = self._push(body, 'batch-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['inserted'], 2)
+
+        response = self._push(body, 'batch-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['replayed'])
+        self.assertEqual(self.env['manictime.activity'].search_count([('timeline_id', '=', self.timeline.id)]), 2)
+
+    def test_push_json_array(self):
+        """Test that a JSON array batch is accepted, and a batch without key refused"""
+        body = json.dumps([self._raw('p3'), self._raw('p4', start='not a time')])
+        response = self._push(body, 'batch-2', content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['inserted'], 1)
+        self.assertEqual(response.json()['invalid'], 1)
+
+        self.assertEqual(self._push(body, '').status_code, 400)
+
+    def test_concurrent_duplicate_push(self):
+        """Test that a key taken by a concurrent push is answered 409 without ingesting"""
+        Batch = self.env['manictime.push.batch']
+        body = json.dumps(self._raw('p5')) + '\n'
+        # The concurrent push committed the key after this request's snapshot
+        with patch.object(type(Batch), '_claim_key', return_value=Batch):
+            response = self._push(body, 'batch-3')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers['Retry-After'], '30')
+        self.assertFalse(self.env['manictime.activity'].search_count([('timeline_id', '=', self.timeline.id)]))
+
+        self.assertEqual(self._push(body, 'batch-3').status_code, 201)
+        self.assertEqual(self._push(body, 'batch-3').status_code, 200)
+        # A key is never claimed twice
+        self.assertFalse(Batch._claim_key(self.timeline, 'batch-3'))
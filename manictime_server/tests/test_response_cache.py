@@ -0,0 +1,129 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from odoo.tests.common import BaseCase
+
+from ..tools.http_pool import NOT_MODIFIED
+from ..tools.response_cache import MISS, CachedManicTimeClient, ResponseCache, cache_key
+from . import test_http_validator as fakes
+
+
+class FakeConfig:
+    server_url = 'https://manictime.example.com'
+
+
+class FakeClient:
+    config = FakeConfig()
+
+    def __init__(self):
+        self.requests = []
+
+    def _make_request(self, url, headers=None):
+        self.requests.append(url)
+        return {'url': url, 'items': [1, 2, 3]}
+
+    def get_timelines(self):
+        self.requests.append('timelines')
+        return {'timelines': [{'timelineKey': 'abc'}]}
+
+
+class TestResponseCache(BaseCase):
+    """Test the bounded LRU + TTL response cache"""
+
+    def test_lru_eviction_keeps_byte_bound(self):
+        """Test that the least recently used entries are evicted past the byte bound"""
+        cache = ResponseCache(max_bytes=60)
+        cache.put('a', 'x' * 20, 60)
+        cache.put('b', 'y' * 20, 60)
+        cache.get('a')
+        cache.put('c', 'z' * 20, 60)
+        self.assertIs(cache.get('b'), MISS)
+        self.assertEqual(cache.get('a'), 'x' * 20)
+        self.assertEqual(cache.get('c'), 'z' * 20)
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 60)
+        self.assertEqual(stats['evictions'], 1)
+
+        cache.put('d', 'w' * 100, 60)
+        self.assertIs(cache.get('d'), MISS)
+        self.assertEqual(cache.stats()['oversize'], 1)
+
+    def test_disk_tier_keeps_byte_bound(self):
+        """Test that the file tier evicts the least recently used rows past the byte bound"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'responses.sqlite')
+            cache = ResponseCache(max_bytes=60, disk_path=path)
+            for key in ('a', 'b', 'c'):
+                cache.put(key, key * 20, 60)
+            size = cache._disk.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+            self.assertLessEqual(size, 60)
+            self.assertEqual(cache.stats()['disk_evictions'], 1)
+
+            # A new process only finds what the bound kept
+            restarted = ResponseCache(max_bytes=60, disk_path=path)
+            self.assertIs(restarted.get('a'), MISS)
+            self.assertEqual(restarted.get('c'), 'c' * 20)
+            cache._disk.close()
+            restarted._disk.close()
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are missed and zero TTLs are not stored"""
+        cache = ResponseCache()
+        with patch('odoo.addons.manictime_server.tools.response_cache.time.time', return_value=1000):
+            cache.put('a', {'v': 1}, 10)
+            cache.put('b', {'v': 2}, 0)
+        with patch('odoo.addons.manictime_server.tools.response_cache.time.time', return_value=1005):
+            self.assertEqual(cache.get('a'), {'v': 1})
+        with patch('odoo.addons.manictime_server.tools.response_cache.time.time', return_value=1011):
+            self.assertIs(cache.get('a'), MISS)
+        self.assertIs(cache.get('b'), MISS)
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_client_caches_listings_only(self):
+        """Test that tags and timelines are cached per identity, activities never"""
+        cache = ResponseCache()
+        client = FakeClient()
+        cached = CachedManicTimeClient(client, cache, identity='server|1')
+        tags_url = f'{FakeConfig.server_url}/api/tagcombinationlist'
+        activities_url = f'{FakeConfig.server_url}/api/timelines/abc/activities?fromTime=2024-09-02'
+
+        first = cached._make_request(tags_url, headers={'Accept': 'application/json'})
+        first['items'].append(4)
+        self.assertEqual(cached._make_request(tags_url, headers={'Accept': 'application/json'})['items'], [1, 2, 3])
+        cached._make_request(activities_url)
+        cached._make_request(activities_url)
+        cached.get_timelines()
+        cached.get_timelines()
+        self.assertEqual(client.requests, [tags_url, activities_url, activities_url, 'timelines'])
+
+        other_user = CachedManicTimeClient(client, cache, identity='server|2')
+        other_user._make_request(tags_url, headers={'Accept': 'application/json'})
+        self.assertEqual(client.requests.count(tags_url), 2)
+        self.assertNotEqual(cache_key('GET', tags_url, identity='server|1'),
+                            cache_key('GET', tags_url, identity='server|2'))
+        self.assertIs(cached.config, client.config)
+
+    def test_conditional_listing_is_revalidated(self):
+        """Test that a fresh listing is not requested and an expired one is revalidated"""
+        tags_url = f'{FakeConfig.server_url}/api/tagcombinationlist'
+        tags = [{'id': 'tag-1', 'name': 'Project'}]
+        client = fakes.FakeClient([
+            fakes.FakeResponse(200, tags, {'ETag': '"v1"'}),
+            fakes.FakeResponse(304),
+        ])
+        cached = CachedManicTimeClient(client, ResponseCache(), identity='server|1')
+        time_path = 'odoo.addons.manictime_server.tools.response_cache.time.time'
+
+        with patch(time_path, return_value=1000):
+            response, validators = cached.conditional_get(tags_url)
+            self.assertEqual((response, validators['etag']), (tags, '"v1"'))
+            # The processed listing is not modified, records without it get the cached body
+            self.assertIs(cached.conditional_get(tags_url, validators=validators)[0], NOT_MODIFIED)
+            self.assertEqual(cached.conditional_get(tags_url)[0], tags)
+        self.assertEqual(len(client.session.requests), 1)
+
+        with patch(time_path, return_value=1000 + 3601):
+            self.assertEqual(cached.conditional_get(tags_url)[0], tags)
+        self.assertEqual(client.session.requests[1]['If-None-Match'], '"v1"')
+        self.assertEqual(cached.cache_stats()['stale'], 1)
@@ -0,0 +1,66 @@
+from odoo.tests.common import BaseCase, TransactionCase
+
+from ..tools.response_shape import detect_timelines_shape, extract_by_shape
+from .test_http_validator import FakeClient, FakeConfig, FakeResponse
+
+
+class TestResponseShape(BaseCase):
+    """Test the listing shape detection"""
+
+    def test_detected_shape_unwraps_later_responses(self):
+        """Test that a detected shape extracts the same items directly"""
+        response = {'timelines': [{'timelineKey': 'abc'}], 'total': 1}
+        timelines, shape = detect_timelines_shape(response)
+        self.assertEqual(shape, 'timelines')
+        self.assertEqual(extract_by_shape(response, shape), timelines)
+        self.assertEqual(extract_by_shape({'timeline': {'id': 1}}, 'single:timeline'), [{'id': 1}])
+        # A response of another shape is not unwrapped, it is detected again
+        self.assertIsNone(extract_by_shape([{'timelineKey': 'abc'}], shape))
+
+
+class TestServerCapability(TransactionCase):
+    """Test the endpoint capability cache of the tag sync"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = cls.env['res.users'].create({'name': 'ManicTime Legacy User', 'login': 'manictime_legacy_user'})
+
+    def test_missing_endpoint_is_not_probed_again(self):
+        """Test that a server without the UI API tags endpoint is asked the legacy one directly"""
+        legacy_tags = [{'id': 'tag-1', 'name': 'Project', 'tags': ['Project']}]
+        client = FakeClient([
+            FakeResponse(404),
+            FakeResponse(200, legacy_tags, {'Server': 'ManicTime/2024'}),
+            FakeResponse(200, legacy_tags, {'Server': 'ManicTime/2024'}),
+        ])
+
+        self.assertEqual(len(self.user._sync_manictime_tags(client)), 1)
+        capability = self.env['manictime.server.capability'].search([('server_url', '=', FakeConfig.server_url)])
+        self.assertEqual(capability.ui_api_tags, 'unsupported')
+        self.assertEqual(capability._get_shape('tag_list'), 'list')
+        self.assertIsNone(capability._get_shape('ui_api_tags'))
+        self.assertEqual(capability.server_version, 'ManicTime/2024')
+
+        self.assertEqual(len(self.user._sync_manictime_tags(client)), 1)
+        self.assertFalse(client.session.responses)
+        self.assertEqual(len(client.session.requests), 3)
+
+        capability.action_redetect()
+        self.assertEqual(capability.ui_api_tags, 'unknown')
+
+    def test_empty_listing_records_no_shape(self):
+        """Test that UI API tags are converted first and an empty answer records no shape"""
+        ui_tags = {'tagCombinations': [{'tag': {'key': 'tag-1', 'tagCombination': 'Project'}}]}
+        client = FakeClient([
+            FakeResponse(200, {'tagCombinations': []}),
+            FakeResponse(200, ui_tags),
+        ])
+
+        self.assertEqual(self.user._sync_manictime_tags(client), [])
+        capability = self.env['manictime.server.capability'].search([('server_url', '=', FakeConfig.server_url)])
+        self.assertFalse(capability.response_shapes)
+
+        tag_ids = self.user._sync_manictime_tags(client)
+        self.assertEqual(self.env['manictime.tag.combination'].browse(tag_ids).entity_id, 'tag-1')
+        self.assertFalse(capability.response_shapes)
@@ -0,0 +1,142 @@
+import time
+
+from odoo.tests.common import BaseCase
+
+from ..models.manictime_sync_job import _find_unavailable_error
+from ..tools.http_pool import PooledSession, get_shared_session
+from ..tools.server_health import (
+    MIN_SAMPLES, OPEN_BASE_SECONDS, CircuitOpenError, ServerHealth, backoff_delay,
+)
+from ..tools.timeline_fetch import fetch_changes
+from .test_http_validator import FakeConfig, FakeHTTPError, FakeResponse
+
+
+class BrokenSession:
+
+    def request(self, method, url, **kwargs):
+        raise ValueError("Invalid URL")
+
+
+class FailingChangesClient:
+    config = FakeConfig()
+
+    def __init__(self, error):
+        self.error = error
+
+    def _make_request(self, url, headers=None):
+        raise self.error
+
+
+class TestServerHealth(BaseCase):
+    """Test the AIMD limit and the circuit breaker of a server"""
+
+    def test_limit_grows_and_halves(self):
+        """Test additive increase on fast answers and multiplicative decrease on slow ones"""
+        health = ServerHealth('test', max_limit=8, slow_seconds=5)
+        self.assertEqual(health.stats()['limit'], 4)
+        for _index in range(50):
+            health.acquire()
+            health.release(0.1, ok=True)
+        self.assertEqual(health.stats()['limit'], 8)
+        health.acquire()
+        health.release(6, ok=True)
+        self.assertEqual(health.stats()['limit'], 4)
+        self.assertEqual(health.stats()['state'], 'closed')
+
+    def test_circuit_opens_and_probes(self):
+        """Test that errors open the circuit and a successful probe closes it"""
+        health = ServerHealth('test', max_limit=4)
+        for _index in range(MIN_SAMPLES):
+            health.acquire()
+            health.release(1, ok=False)
+        self.assertTrue(health.is_open())
+        with self.assertRaises(CircuitOpenError) as error:
+            health.acquire()
+        self.assertIsNotNone(error.exception.retry_at)
+
+        # Cool-down over: one probe is let through, the others still wait
+        health.open_until = 0
+        health.acquire()
+        with self.assertRaises(CircuitOpenError):
+            health.acquire()
+        health.release(0.2, ok=True)
+        self.assertEqual(health.stats()['state'], 'closed')
+        health.acquire()
+        health.release(0.2, ok=True)
+
+    def test_failed_probe_doubles_cooldown(self):
+        """Test that a failed probe opens the circuit again for longer"""
+        health = ServerHealth('test', max_limit=4)
+        for _index in range(MIN_SAMPLES):
+            health.acquire()
+            health.release(1, ok=False)
+        health.open_until = 0
+        health.acquire()
+        health.release(1, ok=False)
+        self.assertTrue(health.is_open())
+        self.assertEqual(health.open_count, 2)
+        self.assertGreater(health.open_until - time.monotonic(), OPEN_BASE_SECONDS)
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test that backoff delays stay between half and all of the capped delay"""
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=1, cap=30)
+            expected = min(30, 2 ** attempt)
+            self.assertGreaterEqual(delay, expected / 2)
+            self.assertLessEqual(delay, expected)
+
+    def test_unexpected_error_releases_probe(self):
+        """Test that a request failing outside the network errors frees its slot and the probe"""
+        health = ServerHealth('test', max_limit=4)
+        for _index in range(MIN_SAMPLES):
+            health.acquire()
+            health.release(1, ok=False)
+        health.open_until = 0
+        session = PooledSession(BrokenSession(), health=health)
+        with self.assertRaises(ValueError):
+            session.get('https://manictime.example.com/api/timelines')
+        self.assertEqual(health.in_flight, 0)
+        self.assertFalse(health.probing)
+
+    def test_retry_at_after_cooldown(self):
+        """Test that an open circuit past its cool-down no longer reports a retry time"""
+        health = ServerHealth('test', max_limit=4)
+        for _index in range(MIN_SAMPLES):
+            health.acquire()
+            health.release(1, ok=False)
+        self.assertIsNotNone(health.retry_at())
+        health.open_until = 0
+        self.assertIsNone(health.retry_at())
+        self.assertFalse(health.is_open())
+
+    def test_only_unavailable_errors_pause(self):
+        """Test that a wrapped ServerUnavailableError is found, and other errors are not"""
+        try:
+            try:
+                raise CircuitOpenError("paused", retry_at=1)
+            except CircuitOpenError as e:
+                raise RuntimeError("sync failed") from e
+        except RuntimeError as wrapped:
+            self.assertIsInstance(_find_unavailable_error(wrapped), CircuitOpenError)
+        self.assertIsNone(_find_unavailable_error(KeyError('timeline')))
+
+    def test_resized_pool_keeps_session(self):
+        """Test that a new connection limit resizes the shared session and closes the old pool"""
+        session = get_shared_session('https://resize.manictime.example.com', max_connections=2)
+        previous = session.adapters['https://']
+        closed = []
+        previous.close = lambda: closed.append(previous)
+
+        self.assertIs(get_shared_session('https://resize.manictime.example.com', max_connections=4), session)
+        self.assertEqual(session.adapters['https://']._pool_maxsize, 4)
+        self.assertIs(session.adapters['http://'], session.adapters['https://'])
+        self.assertEqual(closed, [previous])
+
+    def test_change_feed_falls_back_on_rejection_only(self):
+        """Test that only a rejected change id leads to a window fetch, server errors are raised"""
+        plan = {'name': 'Computer', 'changes_url': '/api/timelines/abc/getchanges', 'sync_change_id': '42'}
+        rejected = FailingChangesClient(FakeHTTPError(FakeResponse(410)))
+        self.assertIsNone(fetch_changes(rejected, plan))
+        for error in (FakeHTTPError(FakeResponse(503)), CircuitOpenError("paused"), TimeoutError("timed out")):
+            with self.assertRaises(type(error)):
+                fetch_changes(FailingChangesClient(error), plan)
@@ -0,0 +1,110 @@
+from odoo.sql_db import db_connect
+from odoo.tests.common import TransactionCase
+
+from ..models.manictime_sync_lock import LOCK_NAMESPACE_CLAIM
+
+
+class TestSyncJob(TransactionCase):
+    """Test the sync job queue"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Job = cls.env['manictime.sync.job']
+        cls.busy_user, cls.quiet_user = cls.env['res.users'].create([
+            {'name': 'ManicTime Busy User', 'login': 'manictime_busy_user'},
+            {'name': 'ManicTime Quiet User', 'login': 'manictime_quiet_user'},
+        ])
+        cls.busy_timelines = cls.env['manictime.user.timeline'].create([
+            {'user_id': cls.busy_user.id, 'timeline_key': f'busy-timeline-{index}'}
+            for index in range(3)
+        ])
+        cls.quiet_timeline = cls.env['manictime.user.timeline'].create({
+            'user_id': cls.quiet_user.id,
+            'timeline_key': 'quiet-timeline',
+        })
+
+    def test_enqueue_is_idempotent(self):
+        """Test that open jobs are not enqueued twice"""
+        self.assertEqual(self.Job.enqueue(self.busy_user, timelines=self.busy_timelines), 4)
+        self.assertEqual(self.Job.enqueue(self.busy_user, timelines=self.busy_timelines), 0)
+
+    def test_claim_is_fair(self):
+        """Test that every user gets a job before any user gets a second one"""
+        self.Job.enqueue(self.env['res.users'], timelines=self.busy_timelines)
+        self.Job.enqueue(self.env['res.users'], timelines=self.quiet_timeline)
+
+        claimed = self.Job._claim('test-worker', limit=2)
+        self.assertEqual(claimed.user_id, self.busy_user | self.quiet_user)
+        self.assertEqual(set(claimed.mapped('state')), {'running'})
+
+        # Both users now have a running job, nothing else may be claimed
+        self.assertFalse(self.Job._claim('test-worker'))
+
+    def test_concurrent_claim_skips_user(self):
+        """Test that a user being claimed in another transaction is not claimed twice"""
+        self.Job.enqueue(self.env['res.users'], timelines=self.busy_timelines)
+        self.Job.enqueue(self.env['res.users'], timelines=self.quiet_timeline)
+
+        # A second connection plays the worker whose claim of the busy user is not committed yet
+        with db_connect(self.env.cr.dbname).cursor() as other_cr:
+            other_cr.execute("SELECT pg_advisory_xact_lock(%s, %s)", (LOCK_NAMESPACE_CLAIM, self.busy_user.id))
+            claimed = self.Job._claim('test-worker', limit=2)
+            self.assertEqual(claimed.user_id, self.quiet_user)
+            other_cr.rollback()
+
+        claimed = self.Job._claim('test-worker', limit=2)
+        self.assertEqual(claimed.user_id, self.busy_user)
+        self.assertEqual(len(claimed), 1)
+
+    def test_failed_job_is_retried_later(self):
+        """Test that a failed attempt is rescheduled with a backoff"""
+        self.Job.enqueue(self.env['res.users'], timelines=self.quiet_timeline)
+        job = self.Job._claim('test-worker')
+        job._mark_failed('Server unavailable')
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(self.Job._claim('test-worker'))
+
+    def test_claim_partition(self):
+        """Test that a partition only claims the jobs of its own users"""
+        self.env['ir.config_parameter'].sudo().set_param('manictime_server.sync_partitions', '2')
+        self.Job.enqueue(self.busy_user | self.quiet_user)
+
+        claimed = self.Job
+        for partition in (0, 1):
+            jobs = self.Job._claim('test-worker', limit=2, partition=partition, partitions=2)
+            self.assertLessEqual(len(jobs), 2)
+            self.assertFalse(jobs & claimed)
+            claimed |= jobs
+        self.assertEqual(claimed.user_id, self.busy_user | self.quiet_user)
+
+    def test_unchanged_timeline_is_skipped(self):
+        """Test that the listing's change id decides whether a timeline needs a sync"""
+        timeline = self.quiet_timeline
+        self.assertTrue(timeline._has_pending_changes())
+
+        timeline.write({'last_sync': '2024-09-02 08:00:00', 'last_change_id': '42', 'sync_change_id': '42'})
+        self.assertFalse(timeline._has_pending_changes())
+
+        timeline.write({'last_change_id': '43'})
+        self.assertTrue(timeline._has_pending_changes())
+
+    def test_manual_sync_is_coalesced(self):
+        """Test that a repeated click joins the queued job and moves it up"""
+        self.Job.enqueue(self.env['res.users'], timelines=self.quiet_timeline, priority=10)
+        job = self.Job.search([('timeline_id', '=', self.quiet_timeline.id)])
+        self.assertFalse(job.notify)
+
+        self.assertEqual(self.Job.enqueue(self.env['res.users'], timelines=self.quiet_timeline,
+                                          priority=0, notify=True), 0)
+        job.invalidate_recordset()
+        self.assertEqual(self.Job.search([('timeline_id', '=', self.quiet_timeline.id)]), job)
+        self.assertTrue(job.notify)
+        self.assertEqual(job.priority, 0)
+
+    def test_job_types_are_separate(self):
+        """Test that a tags job does not collide with the refresh job of the same user"""
+        self.assertEqual(self.Job.enqueue(self.quiet_user), 1)
+        self.assertEqual(self.Job.enqueue(self.quiet_user, job_type='tags'), 1)
+        self.assertEqual(self.Job.enqueue(self.quiet_user, job_type='tags'), 0)
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from odoo.tests.common import TransactionCase
+
+
+class TestSyncPlanner(TransactionCase):
+    """Test the sync planner and its cost estimate"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Planner = cls.env['manictime.sync.planner']
+        cls.user = cls.env['res.users'].create({
+            'name': 'ManicTime Planned User',
+            'login': 'manictime_planned_user',
+        })
+        cls.selected, cls.deselected = cls.env['manictime.user.timeline'].create([
+            {'user_id': cls.user.id, 'timeline_key': 'planned-timeline', 'is_selected': True},
+            {'user_id': cls.user.id, 'timeline_key': 'skipped-timeline', 'is_selected': False},
+        ])
+
+    def test_plan_honors_selection(self):
+        """Test that only the selected timelines are planned"""
+        entries = self.Planner.plan_users(self.user)
+        self.assertEqual([entry['timeline'] for entry in entries], [self.selected])
+        self.assertEqual(entries[0]['mode'], 'window')
+
+    def test_plan_resumes_from_watermark(self):
+        """Test that the window starts at the watermark minus the policy overlap"""
+        watermark = datetime(2024, 9, 2, 8, 0)
+        self.selected.sync_watermark = watermark
+        entry = self.Planner.plan_timelines(self.selected, datetime(2024, 8, 1))[0]
+        self.assertEqual(entry['date_from'], watermark - entry['overlap'])
+
+    def test_estimate_from_stats(self):
+        """Test that the estimate uses the sync statistics of the timeline"""
+        self.selected.write({
+            'stat_rows_per_day': 1000.0,
+            'stat_rows_per_second': 500.0,
+            'stat_request_seconds': 1.0,
+        })
+        sync_end = datetime(2024, 9, 3)
+        entries = self.Planner.plan_timelines(self.selected, sync_end - timedelta(days=2), sync_end)
+        estimate = self.Planner.estimate(entries)
+
+        self.assertEqual(estimate['entries'][0]['rows'], 2000)
+        self.assertAlmostEqual(estimate['entries'][0]['seconds'], 5.0)
+        # One activity request, plus the tags and timelines listing of the user
+        self.assertEqual(estimate['requests'], 3)
+        self.assertEqual(estimate['rows'], 2000)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+from odoo.tests.common import BaseCase
+
+from ..tools.timestamps import INVALID, api_window, format_api_time, to_naive_utc, to_naive_utc_batch
+
+
+class TestTimestamps(BaseCase):
+    """Test the UTC timestamp normalizer"""
+
+    def test_offsets_are_converted_to_utc(self):
+        """Test that offset and Z timestamps are converted, not stripped"""
+        self.assertEqual(to_naive_utc('2024-09-02T07:52:30-04:00'), datetime(2024, 9, 2, 11, 52, 30))
+        self.assertEqual(to_naive_utc('2024-09-02T23:30:00+05:30'), datetime(2024, 9, 2, 18, 0))
+        self.assertEqual(to_naive_utc('2024-09-02T07:52:30Z'), datetime(2024, 9, 2, 7, 52, 30))
+        self.assertEqual(to_naive_utc('2024-09-02T07:52:30'), datetime(2024, 9, 2, 7, 52, 30))
+
+    def test_fallback_formats(self):
+        """Test .NET 7-digit fractions and compact offsets"""
+        self.assertEqual(to_naive_utc('2024-09-02T07:52:30.1234567+02:00'),
+                         datetime(2024, 9, 2, 5, 52, 30, 123456))
+        self.assertEqual(to_naive_utc('2024-09-02T07:52:30.5z'), datetime(2024, 9, 2, 7, 52, 30, 500000))
+
+    def test_datetime_values(self):
+        """Test that aware datetimes are converted and naive ones kept"""
+        aware = datetime(2024, 9, 2, 7, 0, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual(to_naive_utc(aware), datetime(2024, 9, 2, 5, 0))
+        self.assertEqual(to_naive_utc(datetime(2024, 9, 2, 7, 0)), datetime(2024, 9, 2, 7, 0))
+        self.assertIsNone(to_naive_utc(None))
+        with self.assertRaises(ValueError):
+            to_naive_utc('yesterday')
+
+    def test_batch(self):
+        """Test that a bad value does not abort the batch"""
+        self.assertEqual(
+            to_naive_utc_batch(['2024-09-02T07:00:00+01:00', None, 'bad', '2024-09-02T07:00:00Z']),
+            [datetime(2024, 9, 2, 6, 0), None, INVALID, datetime(2024, 9, 2, 7, 0)],
+        )
+
+    def test_api_window(self):
+        """Test that the requested window is whole UTC seconds with a Z designator"""
+        date_from, date_to = api_window(
+            datetime(2024, 9, 2, 7, 0, 0, 500000),
+            datetime(2024, 9, 2, 8, 0, tzinfo=timezone(timedelta(hours=2))),
+        )
+        self.assertEqual((date_from, date_to), (datetime(2024, 9, 2, 7, 0), datetime(2024, 9, 2, 6, 0)))
+        self.assertEqual(format_api_time(date_from), '2024-09-02T07:00:00Z')
+        self.assertEqual(api_window(None, date_to), (None, date_to))
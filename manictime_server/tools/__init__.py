@@ -0,0 +1,7 @@
+from . import timestamps
+from . import activity_stream
+from . import timeline_fetch
+from . import response_cache
+from . import http_pool
+from . import server_health
+from . import response_shape
@@ -0,0 +1,320 @@
+"""Streaming, bounded-memory reading of ManicTime activity responses
+
+The activities endpoint returns one JSON document per window, which can be
+hundreds of MB for a busy Web timeline. Instead of materializing it, the
+response body is decoded incrementally and normalized activity records are
+yielded in fixed-size chunks, so peak memory depends on the chunk size only.
+"""
+import codecs
+import json
+import logging
+import re
+from datetime import timedelta
+from itertools import islice
+
+from .timestamps import INVALID, api_window, format_api_time, to_naive_utc, to_naive_utc_batch
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Top-level keys that may hold the activity list in a response object
+ACTIVITY_LIST_KEYS = ('entities', 'activities', 'items', 'data')
+
+_WHITESPACE = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+
+class ActivityRecord:
+    """Normalized activity, as consumed by manictime.activity.ingest"""
+    __slots__ = ('id', 'title', 'start', 'end', 'application', 'notes', 'tags')
+
+    def __init__(self, id, title, start, end, application='', notes='', tags=None):
+        self.id = id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.application = application
+        self.notes = notes
+        self.tags = tags
+
+
+def record_to_payload(record):
+    """JSON-serializable dict of an activity record, e.g. for the dead-letter store"""
+    payload = {}
+    for attribute in ActivityRecord.__slots__:
+        value = getattr(record, attribute, None)
+        payload[attribute] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return payload
+
+
+def record_from_payload(payload):
+    """Rebuild an ActivityRecord from record_to_payload output
+
+    Start and end stay ISO strings, the ingest converts them to naive UTC.
+    """
+    return ActivityRecord(**{attribute: payload.get(attribute) for attribute in ActivityRecord.__slots__})
+
+
+def _raw_start(act_data):
+    """Start time string of a raw API activity, or None"""
+    if not isinstance(act_data, dict):
+        return None
+    values = act_data.get('values') or {}
+    return (values.get('timeInterval') or {}).get('start')
+
+
+def _build_record(act_data, start_time):
+    """Build an ActivityRecord from a raw API activity and its normalized start time"""
+    if not isinstance(act_data, dict) or 'entityId' not in act_data or 'values' not in act_data:
+        return None
+
+    values = act_data.get('values') or {}
+    end_time = None
+    if start_time:
+        # Calculate end time from duration (in seconds), default to 1 minute
+        duration = (values.get('timeInterval') or {}).get('duration', 0)
+        end_time = start_time + (timedelta(seconds=duration) if duration else timedelta(minutes=1))
+
+    return ActivityRecord(
+        id=act_data.get('entityId'),
+        title=values.get('name', 'Untitled'),
+        start=start_time,
+        end=end_time,
+        application=values.get('application', ''),
+        notes=values.get('notes', ''),
+    )
+
+
+def normalize_activity(act_data):
+    """Convert one raw API activity ({'entityId': ..., 'values': {...}}) to an ActivityRecord
+
+    Start and end times are converted to naive UTC.
+
+    Returns:
+        ActivityRecord or None if the activity is not in the expected format
+    """
+    return _build_record(act_data, to_naive_utc(_raw_start(act_data)))
+
+
+def normalize_activities(raw_activities, batch_size=DEFAULT_CHUNK_SIZE, rejected=None):
+    """Normalize raw API activities, skipping the ones that cannot be parsed
+
+    Activities are consumed in batches of batch_size so their timestamps
+    are converted in one pass.
+
+    Args:
+        rejected: optional list, the skipped activities are appended to it
+                  as {'raw': activity, 'error': reason} dicts
+
+    Yields:
+        ActivityRecord
+    """
+    def reject(act_data, reason):
+        entity_id = act_data.get('entityId') if isinstance(act_data, dict) else None
+        _logger.warning(f"Error converting activity {entity_id}: {reason}")
+        if rejected is not None:
+            rejected.append({'raw': act_data, 'error': reason})
+
+    raw_iter = iter(raw_activities)
+    while True:
+        batch = list(islice(raw_iter, batch_size))
+        if not batch:
+            return
+        start_times = to_naive_utc_batch([_raw_start(act_data) for act_data in batch])
+        for act_data, start_time in zip(batch, start_times):
+            if start_time is INVALID:
+                reject(act_data, f"invalid start time {_raw_start(act_data)!r}")
+                continue
+            try:
+                record = _build_record(act_data, start_time)
+            except (ValueError, TypeError) as e:
+                reject(act_data, str(e))
+                continue
+            if record is None:
+                reject(act_data, "not in the expected activity format")
+                continue
+            yield record
+
+
+def iter_json_array(chunks, list_keys=ACTIVITY_LIST_KEYS):
+    """Incrementally yield the items of the activity array of a JSON document
+
+    The document is either a top-level array or an object holding the array
+    under one of list_keys. Only the current item (and small sibling values)
+    is ever held in memory.
+
+    Args:
+        chunks: iterable of bytes (or str) fragments of the document
+        list_keys: object keys that may hold the array
+
+    Yields:
+        the decoded array items
+    """
+    chunk_iter = iter(chunks)
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    state = {'buffer': '', 'pos': 0, 'eof': False}
+
+    def fill():
+        """Read the next chunk, compacting the consumed part of the buffer"""
+        if state['eof']:
+            return False
+        try:
+            chunk = next(chunk_iter)
+        except StopIteration:
+            state['eof'] = True
+            state['buffer'] = state['buffer'][state['pos']:] + utf8.decode(b'', final=True)
+            state['pos'] = 0
+            return True
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        state['buffer'] = state['buffer'][state['pos']:] + chunk
+        state['pos'] = 0
+        return True
+
+    def peek():
+        """Skip whitespace and return the next character ('' at the end)"""
+        while True:
+            state['pos'] = _WHITESPACE.match(state['buffer'], state['pos']).end()
+            if state['pos'] < len(state['buffer']):
+                return state['buffer'][state['pos']]
+            if not fill():
+                return ''
+
+    def decode():
+        """Decode the next complete JSON value, reading more input as needed"""
+        peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(state['buffer'], state['pos'])
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(state['buffer']) and not state['eof'] and fill():
+                continue
+            state['pos'] = end
+            return value
+
+    def expect(char):
+        if peek() != char:
+            raise ValueError(f"Malformed activities response: expected {char!r} at offset {state['pos']}")
+        state['pos'] += 1
+
+    first = peek()
+    if first == '{':
+        state['pos'] += 1
+        while True:
+            if peek() == '}':
+                return
+            key = decode()
+            expect(':')
+            if key in list_keys and peek() == '[':
+                break
+            # Not the activity list, decode and discard the value
+            decode()
+            if peek() == ',':
+                state['pos'] += 1
+    elif first != '[':
+        if first:
+            raise ValueError(f"Malformed activities response: unexpected {first!r}")
+        return
+
+    expect('[')
+    if peek() == ']':
+        return
+    while True:
+        yield decode()
+        separator = peek()
+        state['pos'] += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Malformed activities response: unexpected {separator!r} in array")
+
+
+def iter_ndjson(chunks):
+    """Incrementally yield the values of a newline-delimited JSON document
+
+    Blank lines are skipped. Only the current line is held in memory.
+
+    Args:
+        chunks: iterable of bytes (or str) fragments of the document
+
+    Yields:
+        the decoded values, one per line
+    """
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    line_number = 0
+    for chunk in chunks:
+        pending += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Malformed NDJSON at line {line_number}: {e.msg}") from e
+    pending += utf8.decode(b'', final=True)
+    if pending.strip():
+        try:
+            yield json.loads(pending)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Malformed NDJSON at line {line_number + 1}: {e.msg}") from e
+
+
+def iter_chunks(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Group an iterable into lists of at most chunk_size items"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_activity_chunks(client, timeline_key, date_from, date_to, activities_url=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE, rejected=None):
+    """Stream the activities of a timeline window as chunks of ActivityRecord
+
+    The response is requested with stream=True on the client's HTTP session
+    and decoded incrementally. Clients without a session fall back to
+    get_activities_for_date_range, which materializes the response.
+    Activities that cannot be normalized are appended to rejected (see
+    normalize_activities).
+
+    Yields:
+        list: at most chunk_size ActivityRecord objects
+    """
+    # The server applies whole UTC seconds, reconciliation uses the same window (see api_window)
+    date_from, date_to = api_window(date_from, date_to)
+    session = getattr(client, 'session', None)
+    if session is None:
+        activities = client.get_activities_for_date_range(timeline_key, date_from, date_to)
+        if activities and isinstance(activities[0], dict):
+            activities = normalize_activities(activities, rejected=rejected)
+        yield from iter_chunks(activities, chunk_size)
+        return
+
+    server_url = client.config.server_url.rstrip('/')
+    if not activities_url:
+        activities_url = f"{server_url}/api/timelines/{timeline_key}/activities"
+    elif activities_url.startswith('/'):
+        activities_url = f"{server_url}{activities_url}"
+
+    params = {
+        'fromTime': format_api_time(date_from),
+        'toTime': format_api_time(date_to),
+    }
+    headers = {"Accept": "application/vnd.manictime.v3+json"}
+    timeout = getattr(client.config, 'timeout', 30)
+
+    with session.get(activities_url, params=params, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        raw_activities = iter_json_array(response.iter_content(chunk_size=64 * 1024))
+        yield from iter_chunks(normalize_activities(raw_activities, rejected=rejected), chunk_size)
@@ -0,0 +1,274 @@
+"""Shared HTTP connection pools for the ManicTime clients
+
+Every ManicTimeClient used to open its own requests session, so a cron pass
+over hundreds of users paid a TCP/TLS handshake per user against the same
+host. Clients now share one keep-alive session per server and process; the
+credentials of each user stay on a lightweight per-client session and are
+applied per request.
+
+NTLM authenticates the connection rather than the request, so NTLM clients
+get a pool per server and account and never reuse a connection that another
+account authenticated. Cookies are never stored on the shared sessions.
+
+Requests are admitted by the ServerHealth of their server (see
+server_health), and idempotent requests that fail on the network or with an
+unhealthy status are retried with a jittered exponential backoff.
+"""
+import http.cookiejar
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .server_health import UNHEALTHY_STATUSES, backoff_delay, get_server_health
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 10
+
+# Retries of idempotent requests after a network error or an unhealthy status
+DEFAULT_MAX_RETRIES = 3
+# Longest wait between two attempts, seconds
+MAX_RETRY_DELAY = 30
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def pool_key(server_url, account=None):
+    """Key of the pool of a server: scheme, host and port, plus the account for NTLM"""
+    parts = urlsplit(server_url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return (parts.scheme, (parts.hostname or '').lower(), port, account or '')
+
+
+def _mount_adapter(session, max_connections):
+    """Mount a connection pool of max_connections on a session
+
+    Returns:
+        the adapter it replaces, or None
+    """
+    previous = session.adapters.get('https://')
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return previous
+
+
+def _new_session(max_connections):
+    session = requests.Session()
+    _mount_adapter(session, max_connections)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    # Responses of one user must never send cookies along with another user's requests
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_shared_session(server_url, max_connections=DEFAULT_MAX_CONNECTIONS, account=None):
+    """Process-wide keep-alive session of a server
+
+    At most max_connections connections are open to the server; requests
+    beyond that wait for a free connection instead of opening more.
+    """
+    key = pool_key(server_url, account)
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry is None:
+            entry = _sessions[key] = (max_connections, _new_session(max_connections))
+            _logger.debug(f"Opened ManicTime connection pool {key[1]}:{key[2]} ({max_connections} connections)")
+        elif entry[0] != max_connections:
+            # The session is resized in place, the clients holding it use the new pool for their next request
+            session = entry[1]
+            previous = _mount_adapter(session, max_connections)
+            if previous is not None:
+                # Idle connections are closed now, the ones of requests in flight when they are released
+                previous.close()
+            entry = _sessions[key] = (max_connections, session)
+            _logger.debug(f"Resized ManicTime connection pool {key[1]}:{key[2]} ({max_connections} connections)")
+        return entry[1]
+
+
+def close_shared_sessions():
+    """Close every pooled connection of this process, e.g. before forking"""
+    with _sessions_lock:
+        for _max_connections, session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class PooledSession:
+    """Per-client session sending its requests over a shared pooled session
+
+    It keeps the headers (e.g. the Authorization header set by the client),
+    auth, params and verify of one client and merges them into every request,
+    so it can replace the requests session of a ManicTimeClient.
+    """
+
+    def __init__(self, shared, headers=None, auth=None, params=None, verify=True,
+                 health=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.shared = shared
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.auth = auth
+        self.params = dict(params or {})
+        self.verify = verify
+        self.health = health
+        self.max_retries = max_retries
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        merged_headers = CaseInsensitiveDict(self.headers)
+        merged_headers.update(headers or {})
+        if isinstance(params, dict) or params is None:
+            params = dict(self.params, **(params or {})) or None
+        kwargs.setdefault('auth', self.auth)
+        kwargs.setdefault('verify', self.verify)
+        if self.health is None:
+            return self.shared.request(method, url, params=params, headers=merged_headers, **kwargs)
+
+        timeout = kwargs.get('timeout')
+        slot_timeout = timeout[0] if isinstance(timeout, tuple) else timeout
+        attempts = 1 + (self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            self.health.acquire(timeout=slot_timeout)
+            started = time.monotonic()
+            try:
+                response = self.shared.request(method, url, params=params, headers=merged_headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.health.release(time.monotonic() - started, ok=False)
+                if last_attempt:
+                    raise
+                delay = backoff_delay(attempt, cap=MAX_RETRY_DELAY)
+                _logger.warning(f"{method} {url} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Every acquired slot is released, a leaked probe would keep the circuit half open for good
+                self.health.release(time.monotonic() - started, ok=False)
+                raise
+
+            healthy = response.status_code not in UNHEALTHY_STATUSES
+            self.health.release(time.monotonic() - started, ok=healthy)
+            if healthy or last_attempt:
+                return response
+            delay = self._retry_after(response) or backoff_delay(attempt, cap=MAX_RETRY_DELAY)
+            _logger.warning(f"{method} {url} answered {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+
+    @staticmethod
+    def _retry_after(response):
+        """Delay asked by the server in seconds (Retry-After), capped, or None"""
+        try:
+            return min(float(response.headers.get('Retry-After')), MAX_RETRY_DELAY)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def close(self):
+        """The pooled connections outlive the client, nothing to close"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def use_shared_session(client, max_connections=DEFAULT_MAX_CONNECTIONS, max_retries=DEFAULT_MAX_RETRIES):
+    """Move a ManicTimeClient onto the shared pool of its server
+
+    The client's own session is closed and replaced by a PooledSession that
+    keeps its headers and auth, and sends its requests through the health
+    controller of the server. Call it before the client authenticates, so
+    the token it obtains is stored on the PooledSession.
+
+    Returns:
+        the client
+    """
+    own_session = getattr(client, 'session', None)
+    if own_session is None or isinstance(own_session, PooledSession):
+        return client
+    config = client.config
+    account = getattr(config, 'username', None) if getattr(config, 'auth_type', None) == 'ntlm' else None
+    shared = get_shared_session(config.server_url, max_connections=max_connections, account=account)
+    # Health is tracked per server, whatever the account
+    health = get_server_health(pool_key(config.server_url), max_connections)
+    # The library's default headers (e.g. User-Agent) are kept, the pool's own encoding headers win
+    headers = CaseInsensitiveDict(own_session.headers)
+    headers.pop('Accept-Encoding', None)
+    headers.pop('Connection', None)
+    client.session = PooledSession(
+        shared,
+        headers=headers,
+        auth=own_session.auth,
+        params=own_session.params,
+        verify=own_session.verify,
+        health=health,
+        max_retries=max_retries,
+    )
+    own_session.close()
+    return client
+
+
+NOT_MODIFIED = object()
+
+
+def conditional_get(client, url, headers=None, validators=None):
+    """GET a JSON document, conditionally on the validators of the last response
+
+    Args:
+        client: ManicTime client, its session sends the request
+        url: absolute URL
+        headers: request headers
+        validators: {'etag': ..., 'last_modified': ...} of the last response, or None
+
+    Returns:
+        tuple: (NOT_MODIFIED, validators) when the server answered 304,
+               otherwise (decoded response, validators of the response,
+               with the Server header as 'server').
+               Clients without a session always get the full response.
+    """
+    session = getattr(client, 'session', None)
+    if session is None:
+        return client._make_request(url, headers=headers), {}
+
+    request_headers = dict(headers or {})
+    validators = validators or {}
+    if validators.get('etag'):
+        request_headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        request_headers['If-Modified-Since'] = validators['last_modified']
+
+    timeout = getattr(client.config, 'timeout', 30)
+    response = session.get(url, headers=request_headers, timeout=timeout)
+    if response.status_code == 304:
+        return NOT_MODIFIED, validators
+    response.raise_for_status()
+    return response.json(), {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'server': response.headers.get('Server'),
+    }
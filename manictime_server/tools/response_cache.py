@@ -0,0 +1,383 @@
+"""Bounded response cache for the ManicTime client
+
+Responses are cached per process in memory, keyed by method, URL, query
+parameters, Accept header and client identity (server and Odoo user), with
+a time to live per endpoint. The memory tier is bounded in bytes (size of the
+JSON-encoded response) and evicts the least recently used entries. An
+optional SQLite file tier, shared by the worker processes of a machine, lets
+the cache survive worker restarts; it holds the same byte bound, enforced
+after every store by dropping expired rows, then the least recently used.
+
+Only idempotent, slowly changing endpoints are cached (timelines listing,
+tag lists). Activities and change feeds are never cached.
+
+Listings fetched with conditional requests (see http_pool.conditional_get)
+are cached along with their validators: a fresh entry is answered without a
+request, an expired one is revalidated with its own validators, and a 304
+answer serves the cached body for another time to live.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .http_pool import NOT_MODIFIED, conditional_get
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds responses are kept, per kind of endpoint
+DEFAULT_TTLS = {
+    'timelines': 300,
+    'tags': 3600,
+}
+
+# URL patterns of the cacheable endpoints and their kind, first match wins
+ENDPOINT_KINDS = (
+    (re.compile(r'/ui-api/analytics/timelines/tagEditorTags(\?|$)'), 'tags'),
+    (re.compile(r'/api/tagcombinationlist(\?|$)'), 'tags'),
+    (re.compile(r'/api/timelines/?(\?|$)'), 'timelines'),
+)
+
+MISS = object()
+
+
+def endpoint_kind(url):
+    """Kind of a cacheable endpoint ('timelines', 'tags'), or None"""
+    for pattern, kind in ENDPOINT_KINDS:
+        if pattern.search(url):
+            return kind
+    return None
+
+
+def cache_key(method, url, params=None, accept=None, identity=None):
+    """Stable string key of a request"""
+    return json.dumps(
+        [method.upper(), url, sorted((params or {}).items()), accept or '', identity or ''],
+        default=str,
+    )
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache of decoded JSON responses, bounded in bytes"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_path=None):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = None
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'stale': 0,
+                         'stores': 0, 'evictions': 0, 'oversize': 0, 'disk_evictions': 0, 'disk_errors': 0}
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path):
+        try:
+            os.makedirs(os.path.dirname(disk_path) or '.', exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in self._disk.execute("PRAGMA table_info(responses)")}
+            if columns and 'accessed' not in columns:
+                # File of an older layout without sizes, it is only a cache
+                self._disk.execute("DROP TABLE responses")
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    value BLOB NOT NULL
+                )
+            """)
+            self._disk.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._disk.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        except sqlite3.Error as e:
+            _logger.warning(f"ManicTime response cache: disk tier {disk_path} unavailable: {str(e)}")
+            self._disk = None
+
+    @staticmethod
+    def _disk_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _evict_disk(self, now):
+        """Drop expired rows, then least recently used ones until the byte bound holds (lock held)
+
+        Expired rows are kept while there is room, they can still be revalidated.
+        """
+        total = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._disk.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        excess = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self._disk.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        self._disk.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+        self.counters['disk_evictions'] += len(keys)
+
+    def _evict(self):
+        """Drop least recently used entries until the byte bound holds (lock held)"""
+        while self._bytes > self.max_bytes and self._entries:
+            _key, (_expires, value) = self._entries.popitem(last=False)
+            self._bytes -= len(value)
+            self.counters['evictions'] += 1
+
+    def _store_memory(self, key, expires, value):
+        """Store an encoded entry in memory (lock held)"""
+        previous = self._entries.pop(key, None)
+        if previous:
+            self._bytes -= len(previous[1])
+        if len(value) > self.max_bytes:
+            self.counters['oversize'] += 1
+            return
+        self._entries[key] = (expires, value)
+        self._bytes += len(value)
+        self._evict()
+
+    def _lookup(self, key, stale):
+        """Cached response of a key and whether it is fresh, expired ones too if stale is set"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires, value = entry
+                if expires > now or stale:
+                    self._entries.move_to_end(key)
+                    self.counters['hits' if expires > now else 'stale'] += 1
+                    return json.loads(value), expires > now
+                del self._entries[key]
+                self._bytes -= len(value)
+                self.counters['expired'] += 1
+
+            if self._disk is not None:
+                try:
+                    row = self._disk.execute(
+                        "SELECT expires, value FROM responses WHERE key = ? AND expires > ?",
+                        (self._disk_key(key), float('-inf') if stale else now),
+                    ).fetchone()
+                except sqlite3.Error:
+                    self.counters['disk_errors'] += 1
+                    row = None
+                if row:
+                    try:
+                        self._disk.execute("UPDATE responses SET accessed = ? WHERE key = ?",
+                                           (now, self._disk_key(key)))
+                    except sqlite3.Error:
+                        self.counters['disk_errors'] += 1
+                    self._store_memory(key, row[0], bytes(row[1]))
+                    self.counters['disk_hits' if row[0] > now else 'stale'] += 1
+                    return json.loads(row[1]), row[0] > now
+
+            self.counters['misses'] += 1
+            return MISS, False
+
+    def get(self, key):
+        """Cached response of a key, or MISS"""
+        return self._lookup(key, stale=False)[0]
+
+    def get_stale(self, key):
+        """Cached response of a key, even expired, for revalidation
+
+        Returns:
+            tuple: (response or MISS, whether it is still fresh)
+        """
+        return self._lookup(key, stale=True)
+
+    def put(self, key, response, ttl):
+        """Cache a JSON-serializable response for ttl seconds"""
+        if not ttl or ttl <= 0:
+            return
+        try:
+            value = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        except (TypeError, ValueError):
+            return
+        now = time.time()
+        expires = now + ttl
+        with self._lock:
+            self.counters['stores'] += 1
+            self._store_memory(key, expires, value)
+            if self._disk is not None and len(value) <= self.max_bytes:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO responses (key, expires, accessed, size, value) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (self._disk_key(key), expires, now, len(value), value),
+                    )
+                    self._evict_disk(now)
+                except sqlite3.Error:
+                    self.counters['disk_errors'] += 1
+
+    def invalidate(self, key):
+        """Forget the cached response of a key"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._bytes -= len(entry[1])
+            if self._disk is not None:
+                try:
+                    self._disk.execute("DELETE FROM responses WHERE key = ?", (self._disk_key(key),))
+                except sqlite3.Error:
+                    self.counters['disk_errors'] += 1
+
+    def clear(self):
+        """Forget every cached response and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for counter in self.counters:
+                self.counters[counter] = 0
+            if self._disk is not None:
+                try:
+                    self._disk.execute("DELETE FROM responses")
+                except sqlite3.Error:
+                    self.counters['disk_errors'] += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+            if self._disk is not None:
+                try:
+                    self._evict_disk(time.time())
+                except sqlite3.Error:
+                    self.counters['disk_errors'] += 1
+
+    def stats(self):
+        """Counters, size and hit ratio of the cache in this process"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk': bool(self._disk),
+            })
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(max_bytes=DEFAULT_MAX_BYTES, disk_path=None):
+    """Process-wide response cache, one per disk path"""
+    with _caches_lock:
+        cache = _caches.get(disk_path)
+        if cache is None:
+            cache = _caches[disk_path] = ResponseCache(max_bytes=max_bytes, disk_path=disk_path)
+        elif cache.max_bytes != max_bytes:
+            cache.resize(max_bytes)
+        return cache
+
+
+def _same_validators(last, current):
+    """Whether two sets of validators describe the same response"""
+    if not last or not current:
+        return False
+    etag, last_modified = last.get('etag'), last.get('last_modified')
+    if not etag and not last_modified:
+        return False
+    return (etag or None) == (current.get('etag') or None) \
+        and (last_modified or None) == (current.get('last_modified') or None)
+
+
+class CachedManicTimeClient:
+    """ManicTime client wrapper answering cacheable GET requests from a ResponseCache
+
+    Every other attribute is delegated to the wrapped client, so it can be
+    used wherever a ManicTimeClient is expected.
+    """
+
+    def __init__(self, client, cache, identity=None, ttls=None):
+        self._client = client
+        self._cache = cache
+        self._identity = identity
+        self._ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _cached(self, method, url, params, headers, fetch):
+        kind = endpoint_kind(url) if method.upper() == 'GET' else None
+        ttl = self._ttls.get(kind, 0) if kind else 0
+        if not ttl:
+            return fetch()
+        key = cache_key(method, url, params, (headers or {}).get('Accept'), self._identity)
+        response = self._cache.get(key)
+        if response is MISS:
+            response = fetch()
+            self._cache.put(key, response, ttl)
+        return response
+
+    def _make_request(self, url, *args, **kwargs):
+        method = kwargs.get('method') or (args[0] if args and isinstance(args[0], str) else 'GET')
+        return self._cached(
+            method, url, kwargs.get('params'), kwargs.get('headers'),
+            lambda: self._client._make_request(url, *args, **kwargs),
+        )
+
+    def conditional_get(self, url, headers=None, validators=None):
+        """conditional_get of a listing, answered from the cache while it is fresh
+
+        An expired entry is revalidated with the validators it was stored
+        with, whatever the caller passed. The result is NOT_MODIFIED when the
+        cached response is the one the caller's validators describe, i.e. the
+        response the caller already processed.
+
+        Returns:
+            tuple: (NOT_MODIFIED or the decoded response, validators of the response)
+        """
+        kind = endpoint_kind(url)
+        ttl = self._ttls.get(kind, 0) if kind else 0
+        if not ttl:
+            return conditional_get(self._client, url, headers=headers, validators=validators)
+
+        # Stored apart from the plain responses of the URL, along with their validators
+        key = cache_key('GET', url, {'validated': True}, (headers or {}).get('Accept'), self._identity)
+        cached, fresh = self._cache.get_stale(key)
+        if cached is MISS:
+            response, new_validators = conditional_get(self._client, url, headers=headers, validators=validators)
+            if response is NOT_MODIFIED:
+                # The caller has the body, there is nothing to cache
+                return response, new_validators
+        elif fresh:
+            response, new_validators = cached['response'], cached['validators']
+        else:
+            response, new_validators = conditional_get(
+                self._client, url, headers=headers, validators=cached['validators'])
+            if response is NOT_MODIFIED:
+                response, new_validators = cached['response'], cached['validators']
+        self._cache.put(key, {'response': response, 'validators': new_validators}, ttl)
+
+        if _same_validators(validators, new_validators):
+            return NOT_MODIFIED, new_validators
+        return response, new_validators
+
+    def get_timelines(self, *args, **kwargs):
+        url = f"{self._client.config.server_url.rstrip('/')}/api/timelines"
+        if args or kwargs:
+            return self._client.get_timelines(*args, **kwargs)
+        return self._cached('GET', url, None, None, self._client.get_timelines)
+
+    def invalidate_timelines(self):
+        """Forget the cached timelines listing, e.g. after changing a timeline on the server"""
+        url = f"{self._client.config.server_url.rstrip('/')}/api/timelines"
+        self._cache.invalidate(cache_key('GET', url, None, None, self._identity))
+
+    def cache_stats(self):
+        return self._cache.stats()
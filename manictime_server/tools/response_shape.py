@@ -0,0 +1,161 @@
+"""Response shapes of the ManicTime listings
+
+ManicTime servers of different versions wrap their listings differently: a
+bare list, a list under 'timelines', 'items', 'data' or another key, or a
+single object. The shape a server answered with is recorded (see
+manictime.server.capability) and later responses are unwrapped directly with
+extract_by_shape, without probing every known layout again.
+
+Shapes:
+    'list': the response is the list
+    'single': the response is a single object
+    'single:<key>': the single object is under <key>
+    'ui_api': tag combinations of the UI API (tagEditorTags)
+    any other string: the list is under that key
+"""
+import logging
+import pprint
+
+_logger = logging.getLogger(__name__)
+
+
+def extract_by_shape(response, shape):
+    """Unwrap a listing response of a known shape
+
+    Returns:
+        list or None: the items, None when the response does not have that shape
+    """
+    if not shape:
+        return None
+    if shape == 'list':
+        return response if isinstance(response, list) else None
+    if not isinstance(response, dict):
+        return None
+    if shape == 'ui_api':
+        return ui_api_tag_combinations(response) or None
+    if shape == 'single':
+        return [response] if ('timelineId' in response or 'id' in response) else None
+    if shape.startswith('single:'):
+        value = response.get(shape[len('single:'):])
+        return [value] if isinstance(value, dict) else None
+    value = response.get(shape)
+    return value if isinstance(value, list) else None
+
+
+def ui_api_tag_combinations(response):
+    """Tag combinations of a /ui-api/analytics/timelines/tagEditorTags response
+
+    Every {'tag': {'key', 'tagCombination', ...}} item is converted to the
+    tag combination format of the legacy API.
+    """
+    combinations = response.get('tagCombinations') if isinstance(response, dict) else None
+    if not isinstance(combinations, list):
+        return []
+    result = []
+    for tag_combo_data in combinations:
+        if not isinstance(tag_combo_data, dict) or 'tag' not in tag_combo_data:
+            continue
+        tag_data = tag_combo_data.get('tag', {})
+        # Check if it has the required fields
+        if tag_data.get('key') and tag_data.get('tagCombination'):
+            result.append({
+                'id': tag_data.get('key'),  # Use key as ID
+                'name': tag_data.get('tagCombination', ''),
+                'tags': [tag_data.get('tagCombination', '')],  # Use tagCombination as the tag
+                'color': tag_data.get('color', ''),
+                'description': '',  # No description in this format
+                'isBillable': tag_data.get('isBillable', False),
+            })
+    return result
+
+
+def detect_tags_shape(response):
+    """Find the tag combinations in a response of unknown shape
+
+    Returns:
+        tuple: (tag combinations, shape), or (None, None) when none were found
+    """
+    if isinstance(response, list):
+        return response, 'list'
+    if not isinstance(response, dict):
+        _logger.error(f"Unexpected response type: {type(response)}")
+        return None, None
+
+    # First check for the UI API format with both tagCombinations and tags
+    tag_combinations = ui_api_tag_combinations(response)
+    if tag_combinations:
+        _logger.info(f"Successfully processed {len(tag_combinations)} tags from UI API format")
+        return tag_combinations, 'ui_api'
+
+    # ManicTime API v3 format that returns {"tagCombinations": [...]}, then other common formats
+    for key in ('tagCombinations', 'tags', 'combinations'):
+        if key in response:
+            _logger.info(f"Found '{key}' key with {len(response.get(key) or [])} items")
+            return response.get(key) or [], key
+
+    # Look for any list in the response
+    list_keys = [key for key, value in response.items() if isinstance(value, list)]
+    if list_keys:
+        _logger.info(f"Found list under key '{list_keys[0]}' with {len(response[list_keys[0]])} items")
+        return response[list_keys[0]], list_keys[0]
+
+    _logger.error("Could not extract tag combinations from response")
+    _logger.error(f"Response keys: {list(response.keys())}")
+    return None, None
+
+
+def detect_timelines_shape(response):
+    """Find the timelines in a response of unknown shape
+
+    Returns:
+        tuple: (timelines, shape), or (None, None) when none were found
+    """
+    if isinstance(response, list):
+        return response, 'list'
+    if not isinstance(response, dict):
+        _logger.warning(f"Expected list of timelines, got {type(response)}")
+        return None, None
+
+    _logger.info(f"Timeline response is a dictionary with keys: {list(response.keys())}")
+    # Log the first few top-level values, limited to prevent log overflow
+    for key in list(response.keys())[:3]:
+        value = response[key]
+        _logger.info(f"Key: '{key}', Type: {type(value)}")
+        if isinstance(value, (dict, list)) and value:
+            _logger.info(f"Value sample for key '{key}': {pprint.pformat(value)[:500]}...")
+
+    # Handle common response patterns
+    for key in ('timelines', 'items', 'data'):
+        if key in response:
+            _logger.info(f"Found '{key}' key: {type(response[key])}")
+            return response.get(key, []), key
+
+    # Handle response with embedded list in a key that isn't one of the standard options
+    list_key = next((key for key, value in response.items() if isinstance(value, list) and value), None)
+    if list_key:
+        _logger.info(f"Using list from non-standard key: '{list_key}'")
+        return response[list_key], list_key
+
+    # If we find any object with a timeline ID, try to use that
+    if 'timelineId' in response or 'id' in response:
+        _logger.info("Using dict itself as a single timeline object")
+        return [response], 'single'
+
+    # Other common response patterns - scan for common timeline-related terms
+    timeline_key = next((key for key in response.keys() if 'timeline' in key.lower()), None)
+    if timeline_key:
+        _logger.info(f"Found timeline-related key: '{timeline_key}'")
+        value = response.get(timeline_key)
+        if isinstance(value, list):
+            return value, timeline_key
+        if isinstance(value, dict):
+            return [value], f'single:{timeline_key}'
+        _logger.warning(f"Timeline key '{timeline_key}' doesn't contain list or dict")
+        return None, None
+
+    _logger.warning("Could not extract timeline data from response")
+    # For diagnostic purposes, log which keys look like potential candidates
+    for key, value in response.items():
+        if isinstance(value, (list, dict)):
+            _logger.info(f"Potential candidate key: '{key}' of type {type(value)}")
+    return None, None
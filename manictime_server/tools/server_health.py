@@ -0,0 +1,208 @@
+"""Adaptive concurrency and circuit breaking per ManicTime server
+
+Every request to a server goes through its ServerHealth, which measures
+latency and errors:
+
+- the number of requests allowed in flight grows by one per window of fast
+  successes and is halved on an error or a slow answer (AIMD), so a slow
+  server gets fewer parallel requests instead of every user's sync timing
+  out against it;
+- when most recent requests failed, the circuit opens and requests fail at
+  once with CircuitOpenError, until a cool-down passes; then one probe
+  request is let through, which closes the circuit or opens it again for
+  twice as long.
+
+The state is kept per process, every Odoo worker learns the server's health
+on its own.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+# Answers slower than this count as congestion, seconds
+DEFAULT_SLOW_SECONDS = 10
+
+# Outcomes the error rate is computed over
+HEALTH_WINDOW = 20
+# Minimum outcomes in the window before the circuit may open
+MIN_SAMPLES = 5
+# Error rate above which the circuit opens
+ERROR_THRESHOLD = 0.5
+
+# Cool-down of an open circuit, doubled every time the probe fails, capped
+OPEN_BASE_SECONDS = 30
+OPEN_MAX_SECONDS = 15 * 60
+
+# Statuses that mean the server is unhealthy rather than the request wrong
+UNHEALTHY_STATUSES = (429, 500, 502, 503, 504)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff delay with jitter, for retry number attempt (0 based)
+
+    The delay is drawn between half and all of base * 2 ** attempt (capped),
+    so clients failing together do not retry together.
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ServerUnavailableError(Exception):
+    """The server cannot be sent requests right now"""
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        # Wall clock time (time.time) after which requests may be sent again
+        self.retry_at = retry_at
+
+
+class CircuitOpenError(ServerUnavailableError):
+    """The circuit of the server is open"""
+
+
+class ServerHealth:
+    """Latency and error tracking, AIMD limit and circuit breaker of one server"""
+
+    def __init__(self, name, max_limit, slow_seconds=DEFAULT_SLOW_SECONDS):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.slow_seconds = slow_seconds
+        self.limit = float(max(1, self.max_limit // 2))
+        self.in_flight = 0
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.open_count = 0
+        self.probing = False
+        self.last_decrease = 0.0
+        self.latency = None
+        self._condition = threading.Condition()
+
+    def _open(self, now):
+        """Open the circuit (condition held)"""
+        cooldown = min(OPEN_MAX_SECONDS, OPEN_BASE_SECONDS * 2 ** self.open_count)
+        self.open_count += 1
+        self.state = OPEN
+        self.open_until = now + cooldown
+        self.probing = False
+        _logger.warning(f"ManicTime server {self.name} unhealthy, pausing requests for {cooldown}s")
+
+    def retry_at(self):
+        """Wall clock time after which the open circuit lets a probe through, None once it may"""
+        with self._condition:
+            remaining = self.open_until - time.monotonic()
+            if self.state != OPEN or remaining <= 0:
+                return None
+            return time.time() + remaining
+
+    def is_open(self):
+        with self._condition:
+            return self.state == OPEN and time.monotonic() < self.open_until
+
+    def acquire(self, timeout=None):
+        """Wait for a request slot
+
+        Raises:
+            CircuitOpenError: the circuit is open, or a probe is in flight
+            ServerUnavailableError: no slot freed up within timeout seconds
+        """
+        wait_until = time.monotonic() + timeout if timeout else None
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.state == OPEN:
+                    if now < self.open_until:
+                        raise CircuitOpenError(
+                            f"ManicTime server {self.name} is paused after repeated errors",
+                            retry_at=time.time() + self.open_until - now)
+                    self.state = HALF_OPEN
+                if self.state == HALF_OPEN:
+                    if self.probing:
+                        raise CircuitOpenError(
+                            f"ManicTime server {self.name} is being probed after repeated errors",
+                            retry_at=time.time() + OPEN_BASE_SECONDS)
+                    self.probing = True
+                    self.in_flight += 1
+                    return
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                remaining = wait_until - now if wait_until else None
+                if remaining is not None and remaining <= 0:
+                    raise ServerUnavailableError(
+                        f"ManicTime server {self.name}: no request slot within {timeout}s "
+                        f"({self.in_flight} requests in flight)")
+                self._condition.wait(remaining)
+
+    def release(self, latency, ok):
+        """Record the outcome of a request and free its slot
+
+        Args:
+            latency: seconds until the answer (or the error)
+            ok: False on connection errors, timeouts and unhealthy statuses
+        """
+        with self._condition:
+            now = time.monotonic()
+            self.in_flight = max(0, self.in_flight - 1)
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            healthy = ok and latency < self.slow_seconds
+            self.outcomes.append(ok)
+
+            if self.state == HALF_OPEN and self.probing:
+                self.probing = False
+                if ok:
+                    _logger.info(f"ManicTime server {self.name} recovered, resuming requests")
+                    self.state = CLOSED
+                    self.open_count = 0
+                    self.outcomes.clear()
+                    self.limit = 1.0
+                else:
+                    self._open(now)
+            elif healthy:
+                # Additive increase: about one more slot per window of successes
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif now - self.last_decrease > max(latency, 1.0):
+                # Multiplicative decrease, once per round trip of congestion
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = now
+
+            if self.state == CLOSED and len(self.outcomes) >= MIN_SAMPLES:
+                errors = self.outcomes.count(False)
+                if errors / len(self.outcomes) >= ERROR_THRESHOLD:
+                    self._open(now)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'state': self.state,
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'latency': self.latency,
+                'error_rate': self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0,
+            }
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_server_health(key, max_limit, slow_seconds=DEFAULT_SLOW_SECONDS):
+    """Process-wide ServerHealth of a server key"""
+    with _servers_lock:
+        health = _servers.get(key)
+        if health is None:
+            name = f"{key[1]}:{key[2]}" if isinstance(key, tuple) else str(key)
+            health = _servers[key] = ServerHealth(name, max_limit, slow_seconds=slow_seconds)
+        else:
+            with health._condition:
+                health.max_limit = max(1, max_limit)
+                health.limit = min(health.limit, health.max_limit)
+                health.slow_seconds = slow_seconds
+        return health
@@ -0,0 +1,270 @@
+"""Concurrent fetching of the timelines of one user
+
+The HTTP round trips for a user's timelines are independent, so they are
+issued from a thread pool. Workers only talk to the ManicTime server and
+never touch the Odoo environment: everything they need is resolved up front
+into a plain dict (a fetch plan), and their results are handed back to the
+calling thread, which does all database writes on its own cursor.
+
+Fetching and writing are pipelined: each timeline streams its chunks through
+a small bounded queue, so the next chunk downloads while the previous one is
+merged, and a worker blocks (backpressure) when the database falls behind.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from .activity_stream import DEFAULT_CHUNK_SIZE, iter_activity_chunks
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH_CONCURRENCY = 4
+
+# Chunks buffered per timeline between the fetch and the ingest stage
+DEFAULT_PIPELINE_DEPTH = 4
+
+# How often a blocked producer checks whether its stream was cancelled
+_PUT_POLL_SECONDS = 0.5
+
+# Change types reported by the getchanges feed for removed entities
+DELETE_CHANGE_TYPES = ('delete', 'deleted', 'remove', 'removed')
+
+# Answers refusing the change id (unknown, expired or invalid), a window fetch replaces the feed
+REJECTED_CHANGE_STATUSES = (400, 404, 409, 410)
+
+
+def parse_changes(response):
+    """Split a getchanges response into upserts and deleted entity ids
+
+    Returns:
+        dict: 'upserts' (raw activity dicts), 'deleted_ids' and 'change_id',
+              or None if the response cannot be read
+    """
+    if not isinstance(response, dict):
+        return None
+
+    change_id = (
+        response.get('lastChangeId') or
+        response.get('newChangeId') or
+        response.get('changeId')
+    )
+    changes = next((response[key] for key in ('changes', 'entities', 'activities')
+                    if isinstance(response.get(key), list)), None)
+    if changes is None or not change_id:
+        return None
+
+    upserts = []
+    deleted_ids = []
+    for change in changes:
+        if not isinstance(change, dict) or not change.get('entityId'):
+            continue
+        change_type = str(
+            change.get('changeType') or change.get('type') or change.get('operation') or ''
+        ).lower()
+        if change.get('isDeleted') or change_type in DELETE_CHANGE_TYPES:
+            deleted_ids.append(str(change['entityId']))
+        elif 'values' in change:
+            upserts.append(change)
+
+    return {'upserts': upserts, 'deleted_ids': deleted_ids, 'change_id': str(change_id)}
+
+
+def fetch_changes(client, plan):
+    """Fetch the changes of a timeline since the change id of the plan
+
+    Returns:
+        dict: the parsed changes (see parse_changes), or None when the change
+              feed cannot be used and a windowed fetch is needed instead
+
+    Raises:
+        network errors, 5xx answers and ServerUnavailableError: the server
+        is struggling, the sync is retried later rather than switched to
+        the heavier window fetch
+    """
+    changes_url = plan.get('changes_url')
+    if not changes_url or not plan.get('sync_change_id'):
+        return None
+
+    if changes_url.startswith('/'):
+        changes_url = f"{client.config.server_url.rstrip('/')}{changes_url}"
+    separator = '&' if '?' in changes_url else '?'
+    url = f"{changes_url}{separator}{urlencode({'lastChangeId': plan['sync_change_id']})}"
+    headers = {"Accept": "application/vnd.manictime.v3+json"}
+
+    try:
+        _logger.info(f"Fetching changes for timeline {plan['name']} since change {plan['sync_change_id']}")
+        response = client._make_request(url, headers=headers)
+    except Exception as e:
+        response = getattr(e, 'response', None)
+        if getattr(response, 'status_code', None) not in REJECTED_CHANGE_STATUSES:
+            raise
+        _logger.warning(f"Change id {plan['sync_change_id']} rejected for timeline {plan['name']}: {str(e)}. "
+                        f"Falling back to windowed sync.")
+        return None
+
+    changes = parse_changes(response)
+    if changes is None:
+        keys = list(response.keys()) if isinstance(response, dict) else type(response)
+        _logger.warning(f"Could not read changes from getchanges response for timeline {plan['name']}: {keys}")
+    return changes
+
+
+def iter_window_chunks(client, plan, rejected=None):
+    """Stream the activities of the window of a plan, in chunks"""
+    return iter_activity_chunks(
+        client,
+        plan['timeline_key'],
+        plan['date_from'],
+        plan['date_to'],
+        activities_url=plan.get('activities_url'),
+        chunk_size=plan.get('chunk_size') or DEFAULT_CHUNK_SIZE,
+        rejected=rejected,
+    )
+
+
+class FetchCancelled(Exception):
+    """Raised in a fetch worker when the consumer abandoned its stream"""
+
+
+class TimelineStream:
+    """Bounded hand-off of one timeline's fetch results to the consumer
+
+    The fetch worker fills it, the consumer iterates over chunks(). Both
+    sides account the time they spend working and waiting on each other,
+    which gives the per-stage throughput of the pipeline.
+    """
+    _CLOSED = object()
+
+    def __init__(self, plan, depth=DEFAULT_PIPELINE_DEPTH, ready=None):
+        self.plan = plan
+        self.mode = None
+        self.changes = None
+        self.error = None
+        self.records = 0
+        # Activities the fetch could not normalize, complete once the stream is closed
+        self.rejected = []
+        self.fetch_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.ingest_seconds = 0.0
+        self.starved_seconds = 0.0
+        self._queue = queue.Queue(maxsize=max(1, int(depth or 1)))
+        self._ready = ready
+        self._announced = False
+        self._cancelled = threading.Event()
+
+    def _announce(self):
+        if not self._announced and self._ready is not None:
+            self._announced = True
+            self._ready.put(self)
+
+    def put(self, chunk):
+        """Hand a chunk to the consumer, blocking while the queue is full"""
+        self._announce()
+        started = time.monotonic()
+        while True:
+            if self._cancelled.is_set():
+                raise FetchCancelled()
+            try:
+                self._queue.put(chunk, timeout=_PUT_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self.blocked_seconds += time.monotonic() - started
+        self.records += len(chunk)
+
+    def close(self, error=None):
+        """Mark the end of the stream, optionally with the error that ended it"""
+        self.error = error
+        self._announce()
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(self._CLOSED, timeout=_PUT_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+
+    def cancel(self):
+        """Abandon the stream, unblocking its producer"""
+        self._cancelled.set()
+
+    def chunks(self):
+        """Iterate over the fetched chunks, re-raising the fetch error if any"""
+        while True:
+            started = time.monotonic()
+            chunk = self._queue.get()
+            self.starved_seconds += time.monotonic() - started
+            if chunk is self._CLOSED:
+                break
+            started = time.monotonic()
+            yield chunk
+            self.ingest_seconds += time.monotonic() - started
+        if self.error:
+            raise self.error
+
+    def throughput(self):
+        """Per-stage throughput summary for logging"""
+        def rate(seconds):
+            return self.records / seconds if seconds > 0 else 0.0
+        return (f"fetch {self.records} records in {self.fetch_seconds:.2f}s "
+                f"({rate(self.fetch_seconds):.0f}/s, {self.blocked_seconds:.2f}s blocked by ingest), "
+                f"ingest in {self.ingest_seconds:.2f}s "
+                f"({rate(self.ingest_seconds):.0f}/s, {self.starved_seconds:.2f}s waiting for fetch)")
+
+
+def produce_timeline(client, stream):
+    """Fetch one timeline into its stream, preferring the change feed over the full window"""
+    plan = stream.plan
+    started = time.monotonic()
+    try:
+        changes = fetch_changes(client, plan)
+        if changes is not None:
+            stream.mode = 'changes'
+            stream.changes = changes
+            stream.records = len(changes['upserts']) + len(changes['deleted_ids'])
+        else:
+            stream.mode = 'window'
+            _logger.info(f"Fetching timeline {plan['name']} from {plan['date_from']} to {plan['date_to']}")
+            for chunk in iter_window_chunks(client, plan, rejected=stream.rejected):
+                stream.put(chunk)
+        error = None
+    except FetchCancelled:
+        error = None
+    except Exception as e:
+        error = e
+    stream.fetch_seconds = time.monotonic() - started - stream.blocked_seconds
+    stream.close(error)
+
+
+def fetch_timelines(client, plans, max_workers=DEFAULT_FETCH_CONCURRENCY, depth=DEFAULT_PIPELINE_DEPTH):
+    """Fetch several timelines concurrently, streaming them to the caller
+
+    Streams are yielded as soon as their first chunk (or their change set) is
+    available, and must be consumed before the next one is requested. While
+    the caller ingests one timeline, the others keep downloading until their
+    queue is full. A failing fetch does not affect the others, its exception
+    is raised at the end of its stream's chunks() (or set on stream.error).
+
+    Yields:
+        TimelineStream: one per plan, in readiness order
+    """
+    if not plans:
+        return
+
+    max_workers = max(1, min(int(max_workers or 1), len(plans)))
+    ready = queue.Queue()
+    streams = [TimelineStream(plan, depth=depth, ready=ready) for plan in plans]
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='manictime_fetch')
+    try:
+        for stream in streams:
+            executor.submit(produce_timeline, client, stream)
+        for _ in streams:
+            yield ready.get()
+    finally:
+        # Unblock producers of streams the caller did not (fully) consume
+        for stream in streams:
+            stream.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,133 @@
+"""UTC normalization of ManicTime timestamps
+
+ManicTime reports times as ISO-8601 strings with a UTC offset (local time of
+the device, e.g. "2024-09-02T07:52:30-04:00") or with a Z suffix, while Odoo
+stores naive UTC datetimes. Values are converted to UTC, not merely stripped
+of their offset.
+
+Parsing is done by datetime.fromisoformat (implemented in C), with a
+precompiled regular expression as fallback for forms it rejects on older
+Pythons (Z suffix, 7-digit .NET fractions).
+"""
+import re
+from datetime import date, datetime, timedelta
+
+# Marker returned by to_naive_utc_batch for values that cannot be parsed
+INVALID = object()
+
+# Format of the fromTime / toTime parameters: whole seconds, explicitly UTC
+API_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+_ISO_RE = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?'
+    r'\s*(?:(Z)|([+-])(\d{2}):?(\d{2})?)?$',
+    re.IGNORECASE,
+)
+
+_ZERO = timedelta(0)
+
+
+def _parse_fallback(value):
+    """Parse an ISO-8601 string with the precompiled expression
+
+    Returns:
+        tuple: (naive datetime, UTC offset timedelta)
+    """
+    match = _ISO_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid ISO-8601 timestamp: {value!r}")
+    year, month, day, hour, minute, second, fraction, zulu, sign, off_hours, off_minutes = match.groups()
+    naive = datetime(
+        int(year), int(month), int(day), int(hour), int(minute), int(second or 0),
+        int((fraction or '0')[:6].ljust(6, '0')),
+    )
+    if zulu or not sign:
+        return naive, _ZERO
+    offset = timedelta(hours=int(off_hours), minutes=int(off_minutes or 0))
+    return naive, (-offset if sign == '-' else offset)
+
+
+def to_naive_utc(value):
+    """Convert a timestamp to a naive UTC datetime
+
+    Args:
+        value: ISO-8601 string (with or without offset / Z), datetime or date.
+               Naive values are taken to be UTC already.
+
+    Returns:
+        datetime: naive UTC datetime, or None for empty values
+
+    Raises:
+        ValueError, TypeError: if the value cannot be interpreted
+    """
+    if not value:
+        return None
+
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            naive, offset = _parse_fallback(value)
+            return naive - offset if offset else naive
+        value = parsed
+    elif not isinstance(value, datetime):
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        raise TypeError(f"Cannot convert {type(value).__name__} to a datetime")
+
+    offset = value.utcoffset()
+    if offset is None:
+        return value
+    return value.replace(tzinfo=None) - offset
+
+
+def to_naive_utc_batch(values):
+    """Convert a batch of timestamps to naive UTC datetimes in one pass
+
+    Empty values become None, unparseable ones INVALID, so one bad value
+    does not abort the batch.
+
+    Returns:
+        list: the converted values, in input order
+    """
+    fromisoformat = datetime.fromisoformat
+    results = []
+    append = results.append
+    for value in values:
+        if not value:
+            append(None)
+            continue
+        try:
+            if type(value) is str:
+                parsed = fromisoformat(value)
+                offset = parsed.utcoffset()
+                append(parsed if offset is None else parsed.replace(tzinfo=None) - offset)
+            else:
+                append(to_naive_utc(value))
+        except (ValueError, TypeError):
+            try:
+                append(to_naive_utc(value))
+            except (ValueError, TypeError):
+                append(INVALID)
+    return results
+
+
+def api_window(date_from, date_to):
+    """Window the activities endpoint applies when asked for date_from - date_to
+
+    The API takes whole seconds, so both bounds are converted to naive UTC
+    and truncated. Requesting and reconciling a window both go through it,
+    so they always cover the same activities.
+
+    Returns:
+        tuple: (date_from, date_to) naive UTC datetimes, empty bounds kept as None
+    """
+    return tuple(
+        to_naive_utc(value).replace(microsecond=0) if value else None
+        for value in (date_from, date_to)
+    )
+
+
+def format_api_time(value):
+    """Timestamp of a fromTime / toTime parameter, with the Z designator"""
+    return to_naive_utc(value).strftime(API_TIME_FORMAT)